@@ -22,10 +22,83 @@ class Dev(BaseModel):
     enable_template_check: bool = True
 
 
+class Cache(BaseModel):
+    persistent: bool = True
+    max_memory_size: int = 64 * 1024 * 1024
+    stale_while_revalidate: bool = False
+    stale_grace: float = 300.0
+
+
+class RenderCache(BaseModel):
+    enabled: bool = True
+    persistent: bool = True
+    max_memory_size: int = 32 * 1024 * 1024
+    ttl: float = 600.0
+
+
+class RateLimit(BaseModel):
+    rate: float = 1.0
+    burst: int = 1
+
+
+class HttpClient(BaseModel):
+    http2: bool = False
+    max_connections: int = 10
+    max_keepalive_connections: int = 10
+    keepalive_expiry: float = 30.0
+
+
+class Failover(BaseModel):
+    hedged: bool = False
+    hedge_delay: float = 1.0
+
+
+class Breaker(BaseModel):
+    failure_threshold: int = 5
+    cooldown: float = 30.0
+    max_cooldown: float = 600.0
+
+
+class Cloudflare(BaseModel):
+    refresh_before: float = 300.0
+
+
+class Retention(BaseModel):
+    enabled: bool = False
+    dry_run: bool = False
+    full_days: int = Field(default=30, ge=1)
+    daily_days: int = Field(default=180, ge=1)
+
+
+class HistoricalQueue(BaseModel):
+    max_batch: int = Field(default=32, ge=1)
+    flush_interval: float = 5.0
+
+
+class Screenshot(BaseModel):
+    pages: int = 4
+    browsers: int = 1
+    queue_size: int = 32
+    client_side_render: bool = False
+
+
 class ScopedConfig(BaseModel):
     request_timeout: float = 30.0
     screenshot_quality: float = 2
+    screenshot: Screenshot = Field(default_factory=Screenshot)
     proxy: Proxy = Field(default_factory=Proxy)
+    http_client: HttpClient = Field(default_factory=HttpClient)
+    failover: Failover = Field(default_factory=Failover)
+    breaker: Breaker = Field(default_factory=Breaker)
+    cloudflare: Cloudflare = Field(default_factory=Cloudflare)
+    cache: Cache = Field(default_factory=Cache)
+    render_cache: RenderCache = Field(default_factory=RenderCache)
+    retention: Retention = Field(default_factory=Retention)
+    league_entry_days: int = Field(default=30, ge=1)
+    historical_queue: HistoricalQueue = Field(default_factory=HistoricalQueue)
+    rate_limit: dict[str, RateLimit] = Field(
+        default_factory=lambda: {'ch.tetr.io': RateLimit(), 'tetr.io': RateLimit()}
+    )
     dev: Dev = Field(default_factory=Dev)
 
 
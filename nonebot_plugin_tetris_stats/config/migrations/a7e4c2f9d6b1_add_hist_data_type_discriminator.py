@@ -0,0 +1,90 @@
+"""add hist data type discriminator
+
+迁移 ID: a7e4c2f9d6b1
+父迁移: f1c7d3a9b5e2
+创建时间: 2026-10-18 22:05:17.842630
+
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import sqlalchemy as sa
+from alembic import op
+from nonebot.log import logger
+from sqlalchemy.dialects.postgresql import JSONB
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from sqlalchemy import ColumnElement
+
+revision: str = 'a7e4c2f9d6b1'
+down_revision: str | Sequence[str] | None = 'f1c7d3a9b5e2'
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+DISCRIMINATOR = '__type__'
+
+# api_type 到模型类型标识 (模型类上的 __type_key__, 见 db.models.model_key) 的映射
+TYPES: dict[str, dict[str, str]] = {
+    'nb_t_io_hist_data': {
+        'User Info': 'tetrio.user_info',
+        '40l': 'tetrio.summaries.solo',
+        'blitz': 'tetrio.summaries.solo',
+        'zenith': 'tetrio.summaries.zenith',
+        'zenithex': 'tetrio.summaries.zenith',
+        'league': 'tetrio.summaries.league',
+        'zen': 'tetrio.summaries.zen',
+        'achievements': 'tetrio.summaries.achievements',
+        **{
+            f'{mode}_{record}': 'tetrio.records.solo'
+            for mode in ('40l', 'blitz')
+            for record in ('top', 'recent', 'progression')
+        },
+    },
+    'nb_t_tos_hist_data': {
+        'User Info': 'tos.user_info',
+        'User Profile': 'tos.user_profile',
+    },
+}
+
+
+def set_type(dialect: str, data: ColumnElement, key: ColumnElement) -> ColumnElement:
+    if dialect == 'postgresql':
+        return sa.cast(
+            sa.cast(data, JSONB).op('||')(sa.func.jsonb_build_object(DISCRIMINATOR, key)),
+            sa.JSON,
+        )
+    return sa.func.json_set(data, f'$.{DISCRIMINATOR}', key)
+
+
+def remove_type(dialect: str, data: ColumnElement) -> ColumnElement:
+    if dialect == 'postgresql':
+        return sa.cast(sa.cast(data, JSONB).op('-')(DISCRIMINATOR), sa.JSON)
+    return sa.func.json_remove(data, f'$.{DISCRIMINATOR}')
+
+
+def upgrade(name: str = '') -> None:
+    if name:
+        return
+    conn = op.get_bind()
+    logger.warning('tetris_stats: 正在为历史数据写入模型类型, 请不要关闭程序...')
+    for table_name, types in TYPES.items():
+        table = sa.table(table_name, sa.column('api_type', sa.String), sa.column('data', sa.JSON))
+        key = sa.case(types, value=table.c.api_type)
+        conn.execute(
+            sa.update(table)
+            .where(table.c.api_type.in_(types))
+            .values(data=set_type(conn.dialect.name, table.c.data, key))
+        )
+
+
+def downgrade(name: str = '') -> None:
+    if name:
+        return
+    conn = op.get_bind()
+    for table_name in TYPES:
+        table = sa.table(table_name, sa.column('data', sa.JSON))
+        conn.execute(sa.update(table).values(data=remove_type(conn.dialect.name, table.c.data)))
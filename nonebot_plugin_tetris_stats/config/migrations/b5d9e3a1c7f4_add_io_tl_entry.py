@@ -0,0 +1,258 @@
+"""add io tl entry
+
+迁移 ID: b5d9e3a1c7f4
+父迁移: a7e4c2f9d6b1
+创建时间: 2026-10-18 23:12:47.608214
+
+"""
+
+from __future__ import annotations
+
+from math import isnan
+from struct import Struct
+from typing import TYPE_CHECKING, Any
+from zlib import decompress
+
+import sqlalchemy as sa
+from alembic import op
+from nonebot.log import logger
+from sqlalchemy import text
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator, Sequence
+
+    from sqlalchemy import Connection
+
+revision: str = 'b5d9e3a1c7f4'
+down_revision: str | Sequence[str] | None = 'a7e4c2f9d6b1'
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+CHUNK_SIZE = 5000
+PAGE_CHUNK_SIZE = 50
+PG_CHUNK_SIZE = 20000
+FIELDS = ('tr', 'pps', 'apm', 'vs', 'rank')
+
+# 与 games/tetrio/snapshot.py 中的快照格式一致
+SNAPSHOT_HEADER = Struct('<4sHxxQ')
+SNAPSHOT_MAGIC = b'TLSN'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_COLUMNS = ('tr', 'glicko', 'rd', 'pps', 'apm', 'vs')
+SNAPSHOT_RANKS = (
+    'x+',
+    'x',
+    'u',
+    'ss',
+    's+',
+    's',
+    's-',
+    'a+',
+    'a',
+    'a-',
+    'b+',
+    'b',
+    'b-',
+    'c+',
+    'c',
+    'c-',
+    'd+',
+    'd',
+    'z',
+)
+
+hist = sa.table(
+    'nb_t_io_tl_hist',
+    sa.column('id', sa.Integer),
+    sa.column('stats_id', sa.Integer),
+    sa.column('data', sa.JSON),
+    sa.column('update_time', sa.DateTime),
+)
+user_map = sa.table(
+    'nb_t_io_tl_map',
+    sa.column('hist_id', sa.Integer),
+    sa.column('entry_index', sa.Integer),
+    sa.column('uid_id', sa.Integer),
+)
+snapshot = sa.table(
+    'nb_t_io_tl_snap',
+    sa.column('stats_id', sa.Integer),
+    sa.column('data', sa.LargeBinary),
+    sa.column('update_time', sa.DateTime),
+)
+entry = sa.table(
+    'nb_t_io_tl_entry',
+    sa.column('stats_id', sa.Integer),
+    sa.column('uid_id', sa.Integer),
+    sa.column('update_time', sa.DateTime),
+    *(sa.column(field) for field in FIELDS),
+)
+
+
+def _insert(conn: Connection, values: list[dict[str, Any]]) -> int:
+    for i in range(0, len(values), CHUNK_SIZE):
+        conn.execute(sa.insert(entry), values[i : i + CHUNK_SIZE])
+    return len(values)
+
+
+def _backfill_pages_postgresql(conn: Connection) -> int:
+    result = conn.execute(text('SELECT min(id), max(id) FROM nb_t_io_tl_hist')).one()
+    if result[0] is None or result[1] is None:
+        return 0
+    min_id, max_id = result
+    total = 0
+    for start_id in range(min_id, max_id + 1, PG_CHUNK_SIZE):
+        total += conn.execute(
+            text(
+                """
+                INSERT INTO nb_t_io_tl_entry (stats_id, uid_id, update_time, tr, pps, apm, vs, rank)
+                SELECT
+                    h.stats_id,
+                    m.uid_id,
+                    h.update_time,
+                    (l.league->>'tr')::double precision,
+                    (l.league->>'pps')::double precision,
+                    (l.league->>'apm')::double precision,
+                    (l.league->>'vs')::double precision,
+                    l.league->>'rank'
+                FROM nb_t_io_tl_map m
+                JOIN nb_t_io_tl_hist h ON h.id = m.hist_id
+                CROSS JOIN LATERAL (
+                    SELECT h.data::jsonb->'data'->'entries'->m.entry_index->'league' AS league
+                ) l
+                WHERE h.id BETWEEN :start_id AND :end_id AND l.league IS NOT NULL
+                """
+            ),
+            {'start_id': start_id, 'end_id': start_id + PG_CHUNK_SIZE - 1},
+        ).rowcount
+    return total
+
+
+def _backfill_pages_generic(conn: Connection) -> int:
+    last_id = 0
+    total = 0
+    while True:
+        pages = conn.execute(
+            sa.select(hist.c.id, hist.c.stats_id, hist.c.data, hist.c.update_time)
+            .where(hist.c.id > last_id)
+            .order_by(hist.c.id)
+            .limit(PAGE_CHUNK_SIZE)
+        ).all()
+        if not pages:
+            break
+        uid_ids: dict[tuple[int, int], int] = {
+            (hist_id, entry_index): uid_id
+            for hist_id, entry_index, uid_id in conn.execute(
+                sa.select(user_map.c.hist_id, user_map.c.entry_index, user_map.c.uid_id).where(
+                    user_map.c.hist_id.in_([i.id for i in pages])
+                )
+            )
+        }
+        values = []
+        for hist_id, stats_id, data, update_time in pages:
+            entries = data.get('data', {}).get('entries', []) if isinstance(data, dict) else []
+            for index, item in enumerate(entries):
+                league = item.get('league') if isinstance(item, dict) else None
+                if not isinstance(league, dict) or (uid_id := uid_ids.get((hist_id, index))) is None:
+                    continue
+                values.append(
+                    {
+                        'stats_id': stats_id,
+                        'uid_id': uid_id,
+                        'update_time': update_time,
+                        **{field: league.get(field) for field in FIELDS},
+                    }
+                )
+        total += _insert(conn, values)
+        last_id = pages[-1][0]
+    return total
+
+
+def _decode_snapshot(data: bytes) -> Iterator[dict[str, Any]]:
+    buffer = memoryview(decompress(data))
+    magic, version, count = SNAPSHOT_HEADER.unpack_from(buffer)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        logger.warning(f'tetris_stats: 跳过不支持的快照格式: {magic!r} v{version}')
+        return
+    offset = SNAPSHOT_HEADER.size
+    columns: dict[str, memoryview] = {}
+    for column in SNAPSHOT_COLUMNS:
+        columns[column] = buffer[offset : offset + count * 8].cast('d')
+        offset += count * 8
+    uid_ids = buffer[offset : offset + count * 4].cast('I')
+    offset += count * 4
+    rank_codes = buffer[offset : offset + count].cast('b')
+    for i in range(count):
+        values = {column: columns[column][i] for column in ('tr', 'pps', 'apm', 'vs')}
+        yield {
+            'uid_id': uid_ids[i],
+            **{column: None if isnan(value) else value for column, value in values.items()},
+            'rank': SNAPSHOT_RANKS[rank_codes[i]],
+        }
+
+
+def _backfill_snapshots(conn: Connection) -> int:
+    """原始页面已经被压缩删除的抓取只剩下快照, 这些抓取的玩家数值从快照中恢复"""
+    total = 0
+    stats_ids = conn.scalars(
+        sa.select(snapshot.c.stats_id)
+        .where(~sa.exists().where(hist.c.stats_id == snapshot.c.stats_id))
+        .order_by(snapshot.c.stats_id)
+    ).all()
+    for stats_id in stats_ids:
+        data, update_time = conn.execute(
+            sa.select(snapshot.c.data, snapshot.c.update_time).where(snapshot.c.stats_id == stats_id)
+        ).one()
+        total += _insert(
+            conn,
+            [{'stats_id': stats_id, 'update_time': update_time, **row} for row in _decode_snapshot(data)],
+        )
+    return total
+
+
+def backfill(conn: Connection) -> None:
+    logger.warning('tetris_stats: 正在生成 TETR.IO 段位玩家数值, 请不要关闭程序...')
+    backfill_pages = _backfill_pages_postgresql if conn.dialect.name == 'postgresql' else _backfill_pages_generic
+    total = backfill_pages(conn) + _backfill_snapshots(conn)
+    logger.success(f'tetris_stats: 已生成 {total} 条段位玩家数值')
+
+
+def upgrade(name: str = '') -> None:
+    if name:
+        return
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_table(
+        'nb_t_io_tl_entry',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('stats_id', sa.Integer(), nullable=False),
+        sa.Column('uid_id', sa.Integer(), nullable=False),
+        sa.Column('update_time', sa.DateTime(), nullable=False),
+        sa.Column('tr', sa.Float(), nullable=False),
+        sa.Column('pps', sa.Float(), nullable=True),
+        sa.Column('apm', sa.Float(), nullable=True),
+        sa.Column('vs', sa.Float(), nullable=True),
+        sa.Column('rank', sa.String(length=2), nullable=False),
+        sa.ForeignKeyConstraint(
+            ['stats_id'], ['nb_t_io_tl_stats.id'], name=op.f('fk_nb_t_io_tl_entry_stats_id_nb_t_io_tl_stats')
+        ),
+        sa.ForeignKeyConstraint(['uid_id'], ['nb_t_io_uid.id'], name=op.f('fk_nb_t_io_tl_entry_uid_id_nb_t_io_uid')),
+        sa.PrimaryKeyConstraint('id', name=op.f('pk_nb_t_io_tl_entry')),
+        info={'bind_key': 'nonebot_plugin_tetris_stats'},
+    )
+    backfill(op.get_bind())
+    with op.batch_alter_table('nb_t_io_tl_entry', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_nb_t_io_tl_entry_stats_id'), ['stats_id'], unique=False)
+        batch_op.create_index('ix_nb_t_io_tl_entry_lookup', ['uid_id', 'update_time'], unique=False)
+
+    # ### end Alembic commands ###
+
+
+def downgrade(name: str = '') -> None:
+    if name:
+        return
+    # ### commands auto generated by Alembic - please adjust! ###
+    with op.batch_alter_table('nb_t_io_tl_entry', schema=None) as batch_op:
+        batch_op.drop_index('ix_nb_t_io_tl_entry_lookup')
+        batch_op.drop_index(batch_op.f('ix_nb_t_io_tl_entry_stats_id'))
+
+    op.drop_table('nb_t_io_tl_entry')
+    # ### end Alembic commands ###
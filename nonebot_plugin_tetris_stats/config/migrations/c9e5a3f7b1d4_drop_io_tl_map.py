@@ -0,0 +1,125 @@
+"""drop io tl map
+
+迁移 ID: c9e5a3f7b1d4
+父迁移: b5d9e3a1c7f4
+创建时间: 2026-10-19 10:04:52.381957
+
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import sqlalchemy as sa
+from alembic import op
+from nonebot.log import logger
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from sqlalchemy import Connection
+
+revision: str = 'c9e5a3f7b1d4'
+down_revision: str | Sequence[str] | None = 'b5d9e3a1c7f4'
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+PAGE_CHUNK_SIZE = 50
+
+
+def backfill(conn: Connection) -> None:
+    """从剩余的原始页面重新生成玩家映射"""
+    hist = sa.table(
+        'nb_t_io_tl_hist',
+        sa.column('id', sa.Integer),
+        sa.column('stats_id', sa.Integer),
+        sa.column('data', sa.JSON),
+    )
+    uid = sa.table(
+        'nb_t_io_uid',
+        sa.column('id', sa.Integer),
+        sa.column('user_unique_identifier', sa.String),
+    )
+    user_map = sa.table(
+        'nb_t_io_tl_map',
+        sa.column('stats_id', sa.Integer),
+        sa.column('uid_id', sa.Integer),
+        sa.column('hist_id', sa.Integer),
+        sa.column('entry_index', sa.Integer),
+    )
+    logger.warning('tetris_stats: 正在从原始页面重新生成 TETR.IO 玩家分页索引, 请不要关闭程序...')
+    last_id = 0
+    while True:
+        pages = conn.execute(
+            sa.select(hist.c.id, hist.c.stats_id, hist.c.data)
+            .where(hist.c.id > last_id)
+            .order_by(hist.c.id)
+            .limit(PAGE_CHUNK_SIZE)
+        ).all()
+        if not pages:
+            break
+        entries = [
+            (hist_id, stats_id, index, item.get('_id'))
+            for hist_id, stats_id, data in pages
+            for index, item in enumerate(data.get('data', {}).get('entries', []) if isinstance(data, dict) else [])
+            if isinstance(item, dict)
+        ]
+        uid_ids = dict(
+            conn.execute(
+                sa.select(uid.c.user_unique_identifier, uid.c.id).where(
+                    uid.c.user_unique_identifier.in_({i[3] for i in entries})
+                )
+            )
+            .tuples()
+            .all()
+        )
+        values = [
+            {'stats_id': stats_id, 'uid_id': uid_ids[unique_identifier], 'hist_id': hist_id, 'entry_index': index}
+            for hist_id, stats_id, index, unique_identifier in entries
+            if unique_identifier in uid_ids
+        ]
+        if values:
+            conn.execute(sa.insert(user_map), values)
+        last_id = pages[-1][0]
+
+
+def upgrade(name: str = '') -> None:
+    if name:
+        return
+    # ### commands auto generated by Alembic - please adjust! ###
+    with op.batch_alter_table('nb_t_io_tl_map', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_nb_t_io_tl_map_uid_id'))
+        batch_op.drop_index(batch_op.f('ix_nb_t_io_tl_map_stats_id'))
+
+    op.drop_table('nb_t_io_tl_map')
+    # ### end Alembic commands ###
+
+
+def downgrade(name: str = '') -> None:
+    if name:
+        return
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_table(
+        'nb_t_io_tl_map',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('stats_id', sa.Integer(), nullable=False),
+        sa.Column('uid_id', sa.Integer(), nullable=False),
+        sa.Column('hist_id', sa.Integer(), nullable=False),
+        sa.Column('entry_index', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ['stats_id'], ['nb_t_io_tl_stats.id'], name=op.f('fk_nb_t_io_tl_map_stats_id_nb_t_io_tl_stats')
+        ),
+        sa.ForeignKeyConstraint(['uid_id'], ['nb_t_io_uid.id'], name=op.f('fk_nb_t_io_tl_map_uid_id_nb_t_io_uid')),
+        sa.ForeignKeyConstraint(
+            ['hist_id'], ['nb_t_io_tl_hist.id'], name=op.f('fk_nb_t_io_tl_map_hist_id_nb_t_io_tl_hist')
+        ),
+        sa.PrimaryKeyConstraint('id', name=op.f('pk_nb_t_io_tl_map')),
+        sa.UniqueConstraint('uid_id', 'hist_id', name='uq_nb_t_io_tl_map_uid_hist'),
+        info={'bind_key': 'nonebot_plugin_tetris_stats'},
+    )
+    backfill(op.get_bind())
+    with op.batch_alter_table('nb_t_io_tl_map', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_nb_t_io_tl_map_stats_id'), ['stats_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_nb_t_io_tl_map_uid_id'), ['uid_id'], unique=False)
+
+    # ### end Alembic commands ###
@@ -0,0 +1,114 @@
+"""add io league metrics
+
+迁移 ID: f1c7d3a9b5e2
+父迁移: e3b9f6a2c8d1
+创建时间: 2026-10-18 20:41:26.315087
+
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import sqlalchemy as sa
+from alembic import op
+from nonebot.log import logger
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from sqlalchemy import Connection
+
+revision: str = 'f1c7d3a9b5e2'
+down_revision: str | Sequence[str] | None = 'e3b9f6a2c8d1'
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+CHUNK_SIZE = 1000
+FIELDS = ('tr', 'glicko', 'rd', 'pps', 'apm', 'vs', 'rank')
+
+
+def backfill(conn: Connection) -> None:
+    hist = sa.table(
+        'nb_t_io_hist_data',
+        sa.column('id', sa.Integer),
+        sa.column('user_unique_identifier', sa.String),
+        sa.column('api_type', sa.String),
+        sa.column('data', sa.JSON),
+        sa.column('update_time', sa.DateTime),
+    )
+    metrics = sa.table(
+        'nb_t_io_lg_metrics',
+        sa.column('hist_id', sa.Integer),
+        sa.column('user_unique_identifier', sa.String),
+        sa.column('update_time', sa.DateTime),
+        *(sa.column(field) for field in FIELDS),
+    )
+    logger.warning('tetris_stats: 正在从历史数据中提取 TETR.IO 段位数值, 请不要关闭程序...')
+    last_id = 0
+    total = 0
+    while True:
+        rows = conn.execute(
+            sa.select(hist.c.id, hist.c.user_unique_identifier, hist.c.data, hist.c.update_time)
+            .where(hist.c.api_type == 'league', hist.c.id > last_id)
+            .order_by(hist.c.id)
+            .limit(CHUNK_SIZE)
+        ).all()
+        if not rows:
+            break
+        values = []
+        for hist_id, unique_identifier, data, update_time in rows:
+            league = data.get('data') if isinstance(data, dict) else None
+            if not isinstance(league, dict):
+                league = {}
+            values.append(
+                {
+                    'hist_id': hist_id,
+                    'user_unique_identifier': unique_identifier,
+                    'update_time': update_time,
+                    **{field: league.get(field) for field in FIELDS},
+                }
+            )
+        conn.execute(sa.insert(metrics), values)
+        last_id = rows[-1][0]
+        total += len(rows)
+    logger.success(f'tetris_stats: 已提取 {total} 条段位数值')
+
+
+def upgrade(name: str = '') -> None:
+    if name:
+        return
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_table(
+        'nb_t_io_lg_metrics',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('hist_id', sa.Integer(), nullable=False),
+        sa.Column('user_unique_identifier', sa.String(length=24), nullable=False),
+        sa.Column('update_time', sa.DateTime(), nullable=False),
+        sa.Column('tr', sa.Float(), nullable=True),
+        sa.Column('glicko', sa.Float(), nullable=True),
+        sa.Column('rd', sa.Float(), nullable=True),
+        sa.Column('pps', sa.Float(), nullable=True),
+        sa.Column('apm', sa.Float(), nullable=True),
+        sa.Column('vs', sa.Float(), nullable=True),
+        sa.Column('rank', sa.String(length=2), nullable=True),
+        sa.PrimaryKeyConstraint('id', name=op.f('pk_nb_t_io_lg_metrics')),
+        sa.UniqueConstraint('hist_id', name=op.f('uq_nb_t_io_lg_metrics_hist_id')),
+        info={'bind_key': 'nonebot_plugin_tetris_stats'},
+    )
+    backfill(op.get_bind())
+    with op.batch_alter_table('nb_t_io_lg_metrics', schema=None) as batch_op:
+        batch_op.create_index('ix_nb_t_io_lg_metrics_lookup', ['user_unique_identifier', 'update_time'], unique=False)
+
+    # ### end Alembic commands ###
+
+
+def downgrade(name: str = '') -> None:
+    if name:
+        return
+    # ### commands auto generated by Alembic - please adjust! ###
+    with op.batch_alter_table('nb_t_io_lg_metrics', schema=None) as batch_op:
+        batch_op.drop_index('ix_nb_t_io_lg_metrics_lookup')
+
+    op.drop_table('nb_t_io_lg_metrics')
+    # ### end Alembic commands ###
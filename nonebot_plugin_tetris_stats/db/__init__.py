@@ -1,22 +1,32 @@
-from asyncio import Lock
-from collections.abc import AsyncGenerator
+from asyncio import Lock, Task, create_task, sleep
+from collections import defaultdict
+from collections.abc import AsyncGenerator, Sequence
 from contextlib import asynccontextmanager
 from datetime import datetime, timedelta, timezone
 from enum import Enum, auto
-from typing import TYPE_CHECKING, Literal, TypeVar, overload
+from hashlib import sha256
+from typing import TYPE_CHECKING, Any, ClassVar, Literal, TypeVar, overload
 
+from nonebot import get_driver
+from nonebot.compat import PYDANTIC_V2
 from nonebot.exception import FinishedException
 from nonebot.log import logger
 from nonebot_plugin_orm import AsyncSession, get_session
 from nonebot_plugin_user import User
-from sqlalchemy import select
+from pydantic import BaseModel
+from sqlalchemy import ColumnElement, Row, select, union_all
+from sqlalchemy.orm import InstrumentedAttribute
 
+from ..config.config import config
 from ..utils.duration import DEFAULT_COMPARE_DELTA
+from ..utils.timezone import ensure_utc_datetime
 from ..utils.typedefs import AllCommandType, BaseCommandType, GameType, TETRIOCommandType
 from .models import Bind, TriggerHistoricalDataV2
 
 UTC = timezone.utc
 
+driver = get_driver()
+
 if TYPE_CHECKING:
     from ..games.tetrio.api.models import TETRIOHistoricalData
     from ..games.tetrio.models import TETRIOUserConfig
@@ -90,26 +100,187 @@ async def remove_bind(
 
 T_HistoricalData = TypeVar('T_HistoricalData', 'TETRIOHistoricalData', 'TOPHistoricalData', 'TOSHistoricalData')
 
-lock = Lock()
+HistoricalData = 'TETRIOHistoricalData | TOPHistoricalData | TOSHistoricalData'
+
+HistoricalKey = tuple[type[HistoricalData], str, str, datetime]
+"""(模型, user_unique_identifier, api_type, update_time)"""
+
+
+@driver.on_shutdown
+async def _():
+    await HistoricalQueue.close()
+
+
+def content_hash(data: BaseModel) -> str:
+    """与入库时相同的序列化结果的 sha256"""
+    if PYDANTIC_V2:
+        return sha256(data.model_dump_json(by_alias=True).encode()).hexdigest()
+    return sha256(data.json(by_alias=True).encode()).hexdigest()
+
+
+class HistoricalQueue:
+    """历史数据的批量写入队列
+
+    数据先在内存中按 (key, content_hash) 去重, 达到 max_batch 条或等待 flush_interval 秒后在同一个 session 中写入
+    写入前只查询同一 key 下已有数据的 content_hash, 不需要反序列化 JSON
+    没有 content_hash 的旧数据仍然通过完整比较去重
+    """
+
+    _pending: ClassVar[dict[tuple[HistoricalKey, str], HistoricalData]] = {}
+    _timer: ClassVar[Task[None] | None] = None
+    _lock: ClassVar[Lock] = Lock()
+
+    @classmethod
+    async def add(cls, model: T_HistoricalData) -> None:
+        model.content_hash = content_hash(model.data)
+        cls._pending.setdefault((cls.key(model), model.content_hash), model)
+        if len(cls._pending) >= config.tetris.historical_queue.max_batch:
+            await cls.flush()
+        elif cls._timer is None:
+            cls._timer = create_task(cls._flush_later())
+
+    @classmethod
+    async def _flush_later(cls) -> None:
+        await sleep(config.tetris.historical_queue.flush_interval)
+        cls._timer = None
+        try:
+            await cls.flush()
+        except Exception:  # noqa: BLE001
+            logger.exception('历史数据写入失败')
+
+    @classmethod
+    async def flush(cls) -> None:
+        """立即写入队列中的所有数据, 查询历史数据前需要先调用以读取到还在队列中的数据
+
+        写入失败时数据会放回队列, 等待下一次写入
+        """
+        async with cls._lock:
+            pending, cls._pending = cls._pending, {}
+            if not pending:
+                return
+            try:
+                async with get_session() as session:
+                    existing = await cls.existing(session, {key for key, _ in pending})
+                    models = [model for (key, hash_), model in pending.items() if hash_ not in existing[key]]
+                    session.add_all(models)
+                    await session.commit()
+            except Exception:
+                # 不覆盖失败期间新加入的数据
+                for item, model in pending.items():
+                    cls._pending.setdefault(item, model)
+                if cls._timer is None:
+                    cls._timer = create_task(cls._flush_later())
+                raise
+            if skipped := len(pending) - len(models):
+                logger.debug(f'Anti duplicate successfully: {skipped}')
+
+    @classmethod
+    async def close(cls) -> None:
+        """取消定时器并写入剩余的数据"""
+        if cls._timer is not None:
+            cls._timer.cancel()
+            cls._timer = None
+        await cls.flush()
+
+    @staticmethod
+    def key(model: T_HistoricalData) -> HistoricalKey:
+        return model.__class__, model.user_unique_identifier, model.api_type, model.update_time
+
+    @staticmethod
+    async def existing(session: AsyncSession, keys: set[HistoricalKey]) -> defaultdict[HistoricalKey, set[str]]:
+        """keys 下已有数据的 content_hash, 每个 (模型, update_time) 只需要一次查询
+
+        没有 content_hash 的旧数据会读取 data 计算
+        """
+        groups: defaultdict[tuple[type[HistoricalData], datetime], set[str]] = defaultdict(set)
+        for cls, unique_identifier, _, update_time in keys:
+            groups[cls, update_time].add(unique_identifier)
+        hashes: defaultdict[HistoricalKey, set[str]] = defaultdict(set)
+        for (cls, update_time), unique_identifiers in groups.items():
+            same_time = (cls.update_time == update_time) & cls.user_unique_identifier.in_(unique_identifiers)
+            legacy = False
+            for unique_identifier, api_type, hash_ in await session.execute(
+                select(cls.user_unique_identifier, cls.api_type, cls.content_hash).where(same_time)
+            ):
+                if hash_ is None:
+                    legacy = True
+                else:
+                    hashes[cls, unique_identifier, api_type, update_time].add(hash_)
+            if legacy:
+                for unique_identifier, api_type, data in await session.execute(
+                    select(cls.user_unique_identifier, cls.api_type, cls.data).where(
+                        same_time, cls.content_hash.is_(None)
+                    )
+                ):
+                    hashes[cls, unique_identifier, api_type, update_time].add(content_hash(data))
+        return hashes
 
 
 async def anti_duplicate_add(model: T_HistoricalData) -> None:
-    async with lock, get_session() as session:
-        result = (
-            await session.scalars(
-                select(cls := model.__class__)
-                .where(cls.update_time == model.update_time)
-                .where(cls.user_unique_identifier == model.user_unique_identifier)
-                .where(cls.api_type == model.api_type)
-            )
-        ).all()
-        if result:
-            for i in result:
-                if i.data == model.data:
-                    logger.debug('Anti duplicate successfully')
-                    return
-        session.add(model)
-        await session.commit()
+    """将历史数据加入写入队列, 重复的数据会在写入时被丢弃"""
+    await HistoricalQueue.add(model)
+
+
+async def get_nearest_row(
+    session: AsyncSession,
+    update_time: InstrumentedAttribute[datetime],
+    target_time: datetime,
+    columns: Sequence[InstrumentedAttribute[Any]],
+    *where: ColumnElement[bool],
+) -> tuple[Row[Any], timedelta] | None:
+    """查找满足 where 且距离 target_time 最近的一行的 columns, 以及与 target_time 的时间差
+
+    前后两侧最近的一行在一次查询中得出, 距离相同时取更早的一行
+    """
+    await HistoricalQueue.flush()
+    target_time = ensure_utc_datetime(target_time)
+    before = (
+        select(update_time, *columns)
+        .where(*where, update_time <= target_time)
+        .order_by(update_time.desc())
+        .limit(1)
+        .subquery()
+    )
+    after = (
+        select(update_time, *columns)
+        .where(*where, update_time >= target_time)
+        .order_by(update_time.asc())
+        .limit(1)
+        .subquery()
+    )
+    candidates = (await session.execute(union_all(select(before), select(after)))).all()
+    if not candidates:
+        return None
+    selected = min(candidates, key=lambda i: abs(target_time - i[0]))
+    return selected, abs(target_time - selected[0])
+
+
+async def get_nearest_data(
+    session: AsyncSession,
+    model: type[T_HistoricalData],
+    unique_identifier: str,
+    api_type: str,
+    target_time: datetime,
+) -> tuple[T_HistoricalData, timedelta] | None:
+    """查找距离 target_time 最近的一条历史数据, 以及与 target_time 的时间差
+
+    前后两侧最近的数据通过 (user_unique_identifier, api_type, update_time) 复合索引得出, 之后只加载更近的那一条的 data
+    """
+    nearest = await get_nearest_row(
+        session,
+        model.update_time,
+        target_time,
+        (model.id,),
+        model.user_unique_identifier == unique_identifier,
+        model.api_type == api_type,
+    )
+    if nearest is None:
+        return None
+    (_, selected_id), delta = nearest
+    selected = await session.get(model, selected_id)
+    if selected is None:
+        return None
+    return selected, delta
 
 
 T_CONFIG = TypeVar('T_CONFIG', 'TETRIOUserConfig', 'TOPUserConfig', 'TOSUserConfig')
@@ -1,19 +1,61 @@
 from collections.abc import Callable, Sequence
 from datetime import datetime
+from functools import cache
 from typing import Any, cast
 
 from nonebot.compat import PYDANTIC_V2, type_validate_python
 from nonebot_plugin_orm import Model
 from pydantic import BaseModel, ValidationError
-from sqlalchemy import JSON, Dialect, String, TypeDecorator
-from sqlalchemy.orm import Mapped, MappedAsDataclass, mapped_column
+from sqlalchemy import JSON, ColumnElement, Dialect, String, TypeDecorator
+from sqlalchemy.orm import InstrumentedAttribute, Mapped, MappedAsDataclass, mapped_column
 from typing_extensions import override
 
 from ..utils.typedefs import AllCommandType, GameType
 from .types import UTCDateTime
 
+DISCRIMINATOR = '__type__'
+"""多模型列在 JSON 中记录模型类型的键"""
+
+PACKAGE = __name__.partition('.')[0]
+
+
+TYPE_KEY = '__type_key__'
+"""模型类上记录类型标识的类属性, 不会被子类继承"""
+
+
+def model_key(model: type[BaseModel]) -> str:
+    """模型在 JSON 中的类型标识
+
+    优先使用模型自身定义的 TYPE_KEY, 移动模块或重命名类都不会改变已经写入的标识
+    没有定义时为去掉包名的模块路径加类名, 只适用于不会写入类型标识的单模型列
+    """
+    if isinstance(key := model.__dict__.get(TYPE_KEY), str):
+        return key
+    return f'{model.__module__.removeprefix(f"{PACKAGE}.")}.{model.__qualname__}'
+
+
+if PYDANTIC_V2:
+    from pydantic import TypeAdapter
+
+    @cache
+    def get_adapter(model: type[BaseModel]) -> TypeAdapter[BaseModel]:
+        return TypeAdapter(model)
+
+    def validate(model: type[BaseModel], value: Any) -> BaseModel:  # noqa: ANN401
+        return get_adapter(model).validate_python(value)
+else:
+
+    def validate(model: type[BaseModel], value: Any) -> BaseModel:  # noqa: ANN401
+        return type_validate_python(model, value)
+
 
 class PydanticType(TypeDecorator):
+    """以 JSON 保存 Pydantic 模型
+
+    可能对应多个模型的列会在 JSON 中写入 DISCRIMINATOR, 读取时只需要用对应的模型验证一次
+    没有类型标识或验证失败时 (旧数据) 依次尝试所有模型
+    """
+
     impl = JSON
 
     @override
@@ -26,38 +68,62 @@ class PydanticType(TypeDecorator):
     ):
         self.get_model = get_model
         self._models = models
+        self._registry: dict[str, type[BaseModel]] | None = None
         super().__init__(*args, **kwargs)
 
-    if PYDANTIC_V2:
-
-        @override
-        def process_bind_param(self, value: Any | None, dialect: Dialect) -> dict | list:
-            # 将 Pydantic 模型实例转换为 JSON
-            if isinstance(value, tuple(self.models)):
-                model = cast('BaseModel', value)
-                return model.model_dump(mode='json', by_alias=True)
-            raise TypeError
-    else:
-
-        @override
-        def process_bind_param(self, value: Any | None, dialect: Dialect) -> dict | list:
-            # 将 Pydantic 模型实例转换为 JSON
-            if isinstance(value, tuple(self.models)):
-                model = cast('BaseModel', value)
-                return model.dict(by_alias=True)
-            raise TypeError
-
-    @override
-    def process_result_value(self, value: Any | None, dialect: Dialect) -> BaseModel:
-        # 将 JSON 转换回 Pydantic 模型实例
+    @property
+    def registry(self) -> dict[str, type[BaseModel]]:
+        """类型标识到模型的映射, get_model 的结果可能会随着导入增加, 找不到时需要 refresh"""
+        if self._registry is None:
+            self._registry = {model_key(i): i for i in self.models}
+        return self._registry
+
+    def refresh(self) -> None:
+        self._registry = None
+
+    def resolve(self, key: object) -> type[BaseModel] | None:
+        """根据类型标识找到模型"""
+        if not isinstance(key, str):
+            return None
+        if key not in self.registry:
+            self.refresh()
+        return self.registry.get(key)
+
+    def dump(self, value: BaseModel) -> dict:
+        data = value.model_dump(mode='json', by_alias=True) if PYDANTIC_V2 else value.dict(by_alias=True)
+        if len(self.registry) > 1:
+            data[DISCRIMINATOR] = model_key(value.__class__)
+        return data
+
+    def decode(self, value: object) -> BaseModel:
+        if isinstance(value, dict) and (model := self.resolve(value.pop(DISCRIMINATOR, None))) is not None:
+            try:
+                return validate(model, value)
+            except ValidationError:
+                ...
         if isinstance(value, dict | list):
-            for i in self.models:
+            for i in self.registry.values():
                 try:
-                    return type_validate_python(i, value)
+                    return validate(i, value)
                 except ValidationError:  # noqa: PERF203
                     ...
         raise ValueError
 
+    @override
+    def process_bind_param(self, value: Any | None, dialect: Dialect) -> dict | list:
+        # 将 Pydantic 模型实例转换为 JSON
+        if isinstance(value, BaseModel):
+            if value.__class__ not in self.registry.values():
+                self.refresh()
+            if isinstance(value, tuple(self.registry.values())):
+                return self.dump(value)
+        raise TypeError
+
+    @override
+    def process_result_value(self, value: Any | None, dialect: Dialect) -> BaseModel:
+        # 将 JSON 转换回 Pydantic 模型实例
+        return self.decode(value)
+
     @property
     def models(self) -> tuple[type[BaseModel], ...]:
         models: set[type[BaseModel]] = set()
@@ -67,6 +133,78 @@ class PydanticType(TypeDecorator):
         return tuple(models)
 
 
+class LazyModel:
+    """延迟验证的模型代理
+
+    保存原始的 JSON, 第一次访问属性时才验证为模型, 之后的访问都转发给验证后的模型
+    __class__ 返回模型的类型, 因此 isinstance 检查不需要验证
+    """
+
+    __slots__ = ('_model', '_raw', '_type', '_value')
+
+    def __init__(self, model: type[BaseModel], raw: dict, type_: 'PydanticType') -> None:
+        self._model = model
+        self._raw: dict | None = raw
+        self._type = type_
+        self._value: BaseModel | None = None
+
+    @property  # type: ignore[misc]
+    def __class__(self) -> type[BaseModel]:  # pyright: ignore[reportIncompatibleMethodOverride]
+        return self._model
+
+    @property
+    def __wrapped__(self) -> BaseModel:
+        if self._value is None:
+            try:
+                self._value = validate(self._model, self._raw)
+            except ValidationError:
+                self._value = self._type.decode(self._raw)
+            self._raw = None
+        return self._value
+
+    def __getattr__(self, name: str) -> Any:  # noqa: ANN401
+        return getattr(self.__wrapped__, name)
+
+    def __eq__(self, other: object) -> bool:
+        return self.__wrapped__ == unwrap(other)
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return repr(self.__wrapped__) if self._value is not None else f'<LazyModel {self._model.__qualname__}>'
+
+
+def unwrap(value: object) -> object:
+    """LazyModel 返回验证后的模型, 其他值原样返回"""
+    return value.__wrapped__ if type(value) is LazyModel else value
+
+
+class LazyPydanticType(PydanticType):
+    """读取时返回 LazyModel 的 PydanticType, 用于只会读取部分数据的大范围查询
+
+    只有带有类型标识的数据才会延迟验证, 旧数据需要先验证才能知道类型
+    """
+
+    @override
+    def process_result_value(self, value: Any | None, dialect: Dialect) -> BaseModel:
+        if isinstance(value, dict) and (model := self.resolve(value.pop(DISCRIMINATOR, None))) is not None:
+            return cast('BaseModel', LazyModel(model, value, self))
+        return self.decode(value)
+
+
+JSON_PATH_DIALECTS = frozenset({'sqlite', 'postgresql', 'mysql', 'mariadb'})
+
+
+def project(dialect: Dialect, column: InstrumentedAttribute[Any], *path: str | int) -> ColumnElement[str] | None:
+    """在数据库中取出 JSON 列 path 处的值 (字符串), 数据库不支持 JSON 路径时返回 None
+
+    path 为写入时的键, 即字段的 alias
+    """
+    if dialect.name not in JSON_PATH_DIALECTS:
+        return None
+    return column[path].as_string().cast(String)
+
+
 class Bind(MappedAsDataclass, Model):
     __tablename__ = 'nb_t_bind'
 
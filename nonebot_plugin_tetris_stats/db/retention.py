@@ -0,0 +1,172 @@
+from collections.abc import Awaitable, Hashable, Sequence
+from datetime import date, datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Any, NamedTuple, Protocol
+
+from nonebot.log import logger
+from nonebot_plugin_apscheduler import scheduler
+from nonebot_plugin_orm import AsyncSession, get_session
+from sqlalchemy import ColumnElement, Text, cast, delete, func, select
+from sqlalchemy.orm import InstrumentedAttribute
+
+from ..config.config import config
+from . import HistoricalQueue
+
+if TYPE_CHECKING:
+    from ..games.tetrio.api.models import TETRIOHistoricalData
+    from ..games.top.api.models import TOPHistoricalData
+    from ..games.tos.api.models import TOSHistoricalData
+
+UTC = timezone.utc
+
+CHUNK_SIZE = 500
+
+
+class TableReport(NamedTuple):
+    table: str
+    rows: int
+    size: int
+    """数据列的大小 (字节), 不包括索引与其他列"""
+
+
+class CompactionReport(NamedTuple):
+    dry_run: bool
+    tables: list[TableReport]
+
+    @property
+    def rows(self) -> int:
+        return sum(i.rows for i in self.tables)
+
+    @property
+    def size(self) -> int:
+        return sum(i.size for i in self.tables)
+
+    def __str__(self) -> str:
+        lines = [f'历史数据压缩{" (试运行)" if self.dry_run else ""}: 共 {self.rows} 行, 约 {self.size} 字节']
+        lines.extend(f'  {i.table}: {i.rows} 行, 约 {i.size} 字节' for i in self.tables if i.rows)
+        return '\n'.join(lines)
+
+
+class Compactor(Protocol):
+    def __call__(self, now: datetime, *, dry_run: bool) -> Awaitable[list[TableReport]]: ...
+
+
+compactors: list[Compactor] = []
+
+
+def compactor(func: Compactor) -> Compactor:
+    """注册一个压缩任务"""
+    compactors.append(func)
+    return func
+
+
+def full_cutoff(now: datetime) -> datetime:
+    """早于这个时间的数据才会被降采样"""
+    return now - timedelta(days=config.tetris.retention.full_days)
+
+
+def bucket_of(time: datetime, now: datetime) -> date | tuple[int, int] | None:
+    """数据所属的降采样区间
+
+    full_days 天内的数据全部保留 (None), 之后到 daily_days 天内每天一个区间, 更早的每周一个区间
+    """
+    age = now - time
+    if age < timedelta(days=config.tetris.retention.full_days):
+        return None
+    if age < timedelta(days=config.tetris.retention.daily_days):
+        return time.date()
+    year, week, _ = time.isocalendar()
+    return year, week
+
+
+class Downsampler:
+    """按 (key, 时间从新到旧) 的顺序依次输入数据, 每个 key 的每个区间只保留最新的一条
+
+    保留区间内最新的数据使按时间查找最近数据时, 结果与目标时间的距离不会超过区间长度
+    """
+
+    def __init__(self, now: datetime) -> None:
+        self.now = now
+        self._last: tuple[Hashable, date | tuple[int, int]] | None = None
+
+    def drop(self, key: Hashable, time: datetime) -> bool:
+        if (bucket := bucket_of(time, self.now)) is None:
+            return False
+        if (key, bucket) == self._last:
+            return True
+        self._last = (key, bucket)
+        return False
+
+
+async def measure(
+    session: AsyncSession, column: InstrumentedAttribute[int], values: Sequence[int], size: ColumnElement[Any] | None
+) -> tuple[int, int]:
+    """统计 column 在 values 中的行数与 size 列的总大小"""
+    rows = total = 0
+    for i in range(0, len(values), CHUNK_SIZE):
+        where = column.in_(values[i : i + CHUNK_SIZE])
+        rows += await session.scalar(select(func.count()).where(where)) or 0
+        if size is not None:
+            total += await session.scalar(select(func.sum(size)).where(where)) or 0
+    return rows, total
+
+
+async def delete_in(session: AsyncSession, column: InstrumentedAttribute[int], values: Sequence[int]) -> None:
+    for i in range(0, len(values), CHUNK_SIZE):
+        await session.execute(
+            delete(column.class_).where(column.in_(values[i : i + CHUNK_SIZE])),
+            execution_options={'synchronize_session': False},
+        )
+
+
+async def compact_historical(
+    model: type['TETRIOHistoricalData | TOPHistoricalData | TOSHistoricalData'], now: datetime, *, dry_run: bool
+) -> TableReport:
+    await HistoricalQueue.flush()
+    sampler = Downsampler(now)
+    ids: list[int] = []
+    size = 0
+    async with get_session() as session:
+        result = await session.stream(
+            select(
+                model.id,
+                model.user_unique_identifier,
+                model.api_type,
+                model.update_time,
+                func.length(cast(model.data, Text)),
+            )
+            .where(model.update_time < full_cutoff(now))
+            .order_by(model.user_unique_identifier, model.api_type, model.update_time.desc(), model.id.desc())
+        )
+        async for row_id, unique_identifier, api_type, update_time, length in result:
+            if sampler.drop((unique_identifier, api_type), update_time):
+                ids.append(row_id)
+                size += length or 0
+        if not dry_run and ids:
+            await delete_in(session, model.id, ids)
+            await session.commit()
+    return TableReport(model.__tablename__, len(ids), size)
+
+
+@compactor
+async def _(now: datetime, *, dry_run: bool) -> list[TableReport]:
+    from ..games.tetrio.api.models import TETRIOHistoricalData  # noqa: PLC0415
+    from ..games.top.api.models import TOPHistoricalData  # noqa: PLC0415
+    from ..games.tos.api.models import TOSHistoricalData  # noqa: PLC0415
+
+    return [
+        await compact_historical(model, now, dry_run=dry_run)
+        for model in (TETRIOHistoricalData, TOPHistoricalData, TOSHistoricalData)
+    ]
+
+
+async def compact(*, dry_run: bool) -> CompactionReport:
+    """按照 retention 配置对历史数据降采样, dry_run 时只统计不删除"""
+    now = datetime.now(UTC)
+    return CompactionReport(dry_run, [report for func in compactors for report in await func(now, dry_run=dry_run)])
+
+
+if config.tetris.retention.enabled:
+
+    @scheduler.scheduled_job('cron', hour=4, minute=30)
+    async def _() -> None:
+        logger.info(str(await compact(dry_run=config.tetris.retention.dry_run)))
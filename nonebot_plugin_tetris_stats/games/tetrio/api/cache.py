@@ -1,42 +1,123 @@
-from asyncio import Lock
-from datetime import datetime, timedelta, timezone
-from typing import ClassVar
+from asyncio import Lock, Task, create_task, to_thread
+from datetime import timezone
+from typing import Any, ClassVar, TypeVar
 from weakref import WeakValueDictionary
 
-from aiocache import Cache as ACache  # type: ignore[import-untyped]
 from nonebot.compat import type_validate_json
 from nonebot.log import logger
+from nonebot_plugin_apscheduler import scheduler
 from yarl import URL
 
-from ....config.config import config
-from ....utils.limit import limit
+from ....config.config import CACHE_PATH, config
+from ....utils.cache import CacheEntry, CacheStats, DiskCache, MemoryCache, estimate_size
+from ....utils.limit import Priority
 from ....utils.request import Request
-from .schemas.base import FailedModel, SuccessModel
+from .schemas.base import SuccessModel
 
 UTC = timezone.utc
 
 
 request = Request(config.tetris.proxy.tetrio or config.tetris.proxy.main)
-request.request = limit(timedelta(seconds=1))(request.request)  # type: ignore[method-assign]  # pyright: ignore[reportAttributeAccessIssue]
+
+STALE_GRACE = config.tetris.cache.stale_grace if config.tetris.cache.stale_while_revalidate else 0
+
+T = TypeVar('T')
 
 
 class Cache:
-    cache = ACache(ACache.MEMORY)
+    """TETR.IO API 缓存
+
+    内存中缓存的是校验后的模型, 以 (URL, 模型类型) 为键, 命中时不需要任何解析
+    每个条目按模型估算的内存占用计入 max_memory_size, 而不是原始响应的大小
+    返回的模型会被多个调用方共享, 请不要修改
+    """
+
+    cache: ClassVar[MemoryCache[tuple[URL, Any], SuccessModel]] = MemoryCache(config.tetris.cache.max_memory_size)
+    disk = DiskCache(CACHE_PATH / 'tetrio' / 'api', STALE_GRACE) if config.tetris.cache.persistent else None
     task: ClassVar[WeakValueDictionary[URL, Lock]] = WeakValueDictionary()
+    revalidating: ClassVar[dict[tuple[URL, Any], Task[None]]] = {}
 
     @classmethod
-    async def get(cls, url: URL, extra_headers: dict | None = None) -> bytes:
+    async def get(
+        cls,
+        url: URL,
+        model: type[T],
+        extra_headers: dict | None = None,
+        priority: Priority = Priority.INTERACTIVE,
+    ) -> T:
+        key = (url, model)
+        if (cached_data := cls.cache.get(key)) is not None:
+            logger.debug(f'{url}: Cache hit!')
+            return cached_data  # type: ignore[return-value]  # pyright: ignore[reportReturnType]
+        if STALE_GRACE and (stale_data := cls.cache.get_stale(key)) is not None:
+            logger.debug(f'{url}: Stale cache hit!')
+            cls.revalidate(url, model, extra_headers)
+            return stale_data  # type: ignore[return-value]  # pyright: ignore[reportReturnType]
         lock = cls.task.setdefault(url, Lock())
+        waited = lock.locked()
         async with lock:
-            if (cached_data := await cls.cache.get(url)) is not None:
+            if waited and (cached_data := cls.cache.get(key)) is not None:
                 logger.debug(f'{url}: Cache hit!')
-                return cached_data
-            response_data = await request.request(url, extra_headers, enable_anti_cloudflare=True)
-            parsed_data: SuccessModel | FailedModel = type_validate_json(SuccessModel | FailedModel, response_data)  # type: ignore[arg-type]  # pyright: ignore[reportArgumentType]
-            if isinstance(parsed_data, SuccessModel):
-                await cls.cache.add(
-                    url,
-                    response_data,
-                    (parsed_data.cache.cached_until - datetime.now(UTC)).total_seconds(),
-                )
-            return response_data
+                return cached_data  # type: ignore[return-value]  # pyright: ignore[reportReturnType]
+            if cls.disk is not None and (entry := await cls.disk.get(str(url))) is not None:
+                parsed_data = type_validate_json(model, entry.data)
+                if isinstance(parsed_data, SuccessModel):
+                    cls.cache.set(key, parsed_data, size=estimate_size(parsed_data), ttl=entry.ttl, grace=STALE_GRACE)
+                if not entry.expired:
+                    logger.debug(f'{url}: Disk cache hit!')
+                    return parsed_data
+                logger.debug(f'{url}: Stale disk cache hit!')
+                cls.revalidate(url, model, extra_headers)
+                return parsed_data
+            return await cls._fetch(url, model, extra_headers, priority)
+
+    @classmethod
+    def revalidate(cls, url: URL, model: type[T], extra_headers: dict | None = None) -> None:
+        """在后台刷新缓存, 同一 URL 同时只会有一个刷新任务
+
+        刷新请求以后台优先级排队, 不会挡在用户请求前面
+        """
+        if (key := (url, model)) in cls.revalidating:
+            return
+        task = create_task(cls._revalidate(url, model, extra_headers))
+        cls.revalidating[key] = task
+        task.add_done_callback(lambda _: cls.revalidating.pop(key, None))
+
+    @classmethod
+    async def _revalidate(cls, url: URL, model: type[T], extra_headers: dict | None) -> None:
+        async with cls.task.setdefault(url, Lock()):
+            if cls.cache.get((url, model)) is not None:
+                return
+            try:
+                await cls._fetch(url, model, extra_headers, Priority.BACKGROUND)
+            except Exception as e:  # noqa: BLE001
+                logger.warning(f'{url}: 后台刷新缓存失败 {e!r}')
+
+    @classmethod
+    async def _fetch(cls, url: URL, model: type[T], extra_headers: dict | None, priority: Priority) -> T:
+        response_data = await request.request(url, extra_headers, enable_anti_cloudflare=True, priority=priority)
+        parsed_data = type_validate_json(model, response_data)
+        if isinstance(parsed_data, SuccessModel):
+            entry = CacheEntry(data=response_data, expires_at=parsed_data.cache.cached_until)
+            if entry.expired:
+                return parsed_data
+            cls.cache.set((url, model), parsed_data, size=estimate_size(parsed_data), ttl=entry.ttl, grace=STALE_GRACE)
+            if cls.disk is not None:
+                await cls.disk.set(str(url), entry)
+        return parsed_data
+
+    @classmethod
+    def stats(cls) -> CacheStats:
+        return cls.cache.stats
+
+
+@scheduler.scheduled_job('interval', hours=1)
+async def _() -> None:
+    Cache.cache.purge()
+    if Cache.disk is not None and (count := await to_thread(Cache.disk.purge)):
+        logger.debug(f'清除了 {count} 个过期的 TETR.IO 缓存文件')
+    stats = Cache.stats()
+    logger.debug(
+        f'TETR.IO 缓存: 命中 {stats.hits} 次, 未命中 {stats.misses} 次, 淘汰 {stats.evictions} 次, '
+        f'{stats.count} 个条目共 {stats.size}/{stats.max_size} 字节'
+    )
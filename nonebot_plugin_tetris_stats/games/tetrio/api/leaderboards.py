@@ -1,11 +1,11 @@
-from typing import Literal, overload
+from typing import Literal, TypeVar, overload
 from uuid import UUID
 
 from nonebot import __version__ as __nonebot_version__
-from nonebot.compat import type_validate_json
 from yarl import URL
 
 from ....utils.exception import RequestError
+from ....utils.limit import Priority
 from ....version import __version__
 from ..constant import BASE_URL
 from .cache import Cache
@@ -17,20 +17,22 @@ from .schemas.leaderboards.zenith import Zenith, ZenithSuccessModel
 
 
 async def by(
-    by_type: Literal['league', 'xp', 'ar'], parameter: Parameter, x_session_id: UUID | None = None
+    by_type: Literal['league', 'xp', 'ar'],
+    parameter: Parameter,
+    x_session_id: UUID | None = None,
+    priority: Priority = Priority.INTERACTIVE,
 ) -> BySuccessModel:
-    model: By = type_validate_json(
+    model: By = await get(
+        BASE_URL / f'users/by/{by_type}',
+        parameter,
         By,  # type: ignore[arg-type]  # pyright: ignore[reportArgumentType]
-        await get(
-            BASE_URL / f'users/by/{by_type}',
-            parameter,
-            {
-                'X-Session-ID': str(x_session_id),
-                'User-Agent': f'nonebot-plugin-tetris-stats/{__version__} (Windows NT 10.0; Win64; x64) NoneBot2/{__nonebot_version__}',
-            }
-            if x_session_id is not None
-            else None,
-        ),
+        {
+            'X-Session-ID': str(x_session_id),
+            'User-Agent': f'nonebot-plugin-tetris-stats/{__version__} (Windows NT 10.0; Win64; x64) NoneBot2/{__nonebot_version__}',
+        }
+        if x_session_id is not None
+        else None,
+        priority,
     )
     if isinstance(model, FailedModel):
         msg = f'排行榜信息请求错误:\n{model.error}'
@@ -68,20 +70,16 @@ async def records(
     model: Solo | Zenith
     match records_type:
         case '40l' | 'blitz':
-            model = type_validate_json(
+            model = await get(
+                BASE_URL / 'records' / f'{records_type}{scope}{revolution_id if revolution_id is not None else ""}',
+                parameter,
                 Solo,  # type: ignore[arg-type]  # pyright: ignore[reportArgumentType]
-                await get(
-                    BASE_URL / 'records' / f'{records_type}{scope}{revolution_id if revolution_id is not None else ""}',
-                    parameter,
-                ),
             )
         case 'zenith' | 'zenithex':
-            model = type_validate_json(
+            model = await get(
+                BASE_URL / 'records' / f'{records_type}{scope}{revolution_id if revolution_id is not None else ""}',
+                parameter,
                 Zenith,  # type: ignore[arg-type]  # pyright: ignore[reportArgumentType]
-                await get(
-                    BASE_URL / 'records' / f'{records_type}{scope}{revolution_id if revolution_id is not None else ""}',
-                    parameter,
-                ),
             )
     if isinstance(model, FailedModel):
         msg = f'排行榜信息请求错误:\n{model.error}'
@@ -89,5 +87,14 @@ async def records(
     return model
 
 
-async def get(url: URL, parameter: Parameter, extra_headers: dict | None = None) -> bytes:
-    return await Cache.get(url % parameter.to_params(), extra_headers)
+T = TypeVar('T')
+
+
+async def get(
+    url: URL,
+    parameter: Parameter,
+    model: type[T],
+    extra_headers: dict | None = None,
+    priority: Priority = Priority.INTERACTIVE,
+) -> T:
+    return await Cache.get(url % parameter.to_params(), model, extra_headers, priority)
@@ -2,10 +2,10 @@ from datetime import datetime
 from typing import Literal
 
 from nonebot_plugin_orm import Model
-from sqlalchemy import JSON, String
+from sqlalchemy import JSON, Index, String
 from sqlalchemy.orm import Mapped, MappedAsDataclass, mapped_column
 
-from ....db.models import PydanticType
+from ....db.models import LazyPydanticType
 from ....db.types import UTCDateTime
 from .schemas.base import SuccessModel
 from .typedefs import Records, Summaries
@@ -13,10 +13,12 @@ from .typedefs import Records, Summaries
 
 class TETRIOHistoricalData(MappedAsDataclass, Model):
     __tablename__ = 'nb_t_io_hist_data'
+    __table_args__ = (Index('ix_nb_t_io_hist_data_lookup', 'user_unique_identifier', 'api_type', 'update_time'),)
 
     id: Mapped[int] = mapped_column(init=False, primary_key=True)
     user_unique_identifier: Mapped[str] = mapped_column(String(24), index=True)
     api_type: Mapped[Literal['User Info', Records, Summaries]] = mapped_column(String(32), index=True)
-    data: Mapped[SuccessModel] = mapped_column(PydanticType(get_model=[SuccessModel.__subclasses__], models=set()))
+    data: Mapped[SuccessModel] = mapped_column(LazyPydanticType(get_model=[SuccessModel.__subclasses__], models=set()))
     update_time: Mapped[datetime] = mapped_column(UTCDateTime(), index=True)
     query_params: Mapped[dict | None] = mapped_column(JSON, nullable=True, default=None)
+    content_hash: Mapped[str | None] = mapped_column(String(64), nullable=True, default=None)
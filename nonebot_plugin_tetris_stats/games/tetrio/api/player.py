@@ -3,7 +3,6 @@ from types import MappingProxyType
 from typing import Literal, NamedTuple, cast, overload
 
 from async_lru import alru_cache
-from nonebot.compat import type_validate_json
 
 from ....db import anti_duplicate_add
 from ....utils.exception import RequestError
@@ -115,8 +114,7 @@ class Player:
     async def get_info(self) -> UserInfoSuccess:
         """Get User Info"""
         if self._user_info is None:
-            raw_user_info = await Cache.get(BASE_URL / 'users' / self._request_user_parameter)
-            user_info: UserInfo = type_validate_json(UserInfo, raw_user_info)  # type: ignore[arg-type]  # pyright: ignore[reportArgumentType]
+            user_info: UserInfo = await Cache.get(BASE_URL / 'users' / self._request_user_parameter, UserInfo)  # type: ignore[arg-type]  # pyright: ignore[reportArgumentType]
             if isinstance(user_info, FailedModel):
                 msg = f'用户信息请求错误:\n{user_info.error}'
                 raise RequestError(msg)
@@ -144,12 +142,9 @@ class Player:
 
     async def get_summaries(self, summaries_type: Summaries) -> SummariesModel:
         if summaries_type not in self._summaries:
-            raw_summaries = await Cache.get(
-                BASE_URL / 'users' / self._request_user_parameter / 'summaries' / summaries_type
-            )
-            summaries: SummariesModel | FailedModel = type_validate_json(
+            summaries: SummariesModel | FailedModel = await Cache.get(
+                BASE_URL / 'users' / self._request_user_parameter / 'summaries' / summaries_type,
                 self.__SUMMARIES_MAPPING[summaries_type] | FailedModel,  # type: ignore[assignment, arg-type]  # pyright: ignore[reportArgumentType]  #! waiting for [PEP 747](https://peps.python.org/pep-0747/)
-                raw_summaries,
             )
             if isinstance(summaries, FailedModel):
                 msg = f'用户Summaries数据请求错误:\n{summaries.error}'
@@ -167,9 +162,9 @@ class Player:
 
     async def get_leagueflow(self) -> LeagueFlowSuccess:
         if self._leagueflow is None:
-            leagueflow: LeagueFlow = type_validate_json(
+            leagueflow: LeagueFlow = await Cache.get(
+                BASE_URL / 'labs/leagueflow' / self._request_user_parameter,
                 LeagueFlow,  # type: ignore[arg-type]  # pyright: ignore[reportArgumentType]
-                await Cache.get(BASE_URL / 'labs/leagueflow' / self._request_user_parameter),
             )
             if isinstance(leagueflow, FailedModel):
                 msg = f'League 历史记录请求错误:\n{leagueflow.error}'
@@ -235,8 +230,7 @@ class Player:
             url = BASE_URL / 'users' / self._request_user_parameter / 'records' / mode_type / records_type
             if parameter is not None:
                 url = url % parameter.to_params()
-            raw_records = await Cache.get(url)
-            records: RecordsSoloSuccessModel | FailedModel = type_validate_json(SoloRecord, raw_records)  # type: ignore[arg-type]  # pyright: ignore[reportArgumentType]
+            records: RecordsSoloSuccessModel | FailedModel = await Cache.get(url, SoloRecord)  # type: ignore[arg-type]  # pyright: ignore[reportArgumentType]
             if isinstance(records, FailedModel):
                 msg = f'用户Records数据请求错误:\n{records.error}'
                 raise RequestError(msg)
@@ -1,6 +1,6 @@
 from datetime import datetime
 from enum import IntEnum
-from typing import Literal, NamedTuple
+from typing import ClassVar, Literal, NamedTuple
 
 from pydantic import BaseModel, Field
 
@@ -37,6 +37,8 @@ class Empty(BaseModel):
 
 
 class LeagueFlowSuccess(BaseSuccessModel):
+    __type_key__: ClassVar[str] = 'tetrio.labs.leagueflow'
+
     data: Data | Empty
 
 
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Literal
+from typing import ClassVar, Literal
 
 from pydantic import BaseModel, Field
 
@@ -60,6 +60,8 @@ class Data(BaseModel):
 
 
 class BySuccessModel(SuccessModel):
+    __type_key__: ClassVar[str] = 'tetrio.leaderboards.by'
+
     data: Data
 
 
@@ -1,3 +1,5 @@
+from typing import ClassVar
+
 from pydantic import BaseModel
 
 from ..base import FailedModel, SuccessModel
@@ -9,6 +11,8 @@ class Data(BaseModel):
 
 
 class SoloSuccessModel(SuccessModel):
+    __type_key__: ClassVar[str] = 'tetrio.leaderboards.solo'
+
     data: Data
 
 
@@ -1,4 +1,4 @@
-from typing import TypeAlias
+from typing import ClassVar, TypeAlias
 
 from pydantic import BaseModel
 
@@ -11,6 +11,8 @@ class Data(BaseModel):
 
 
 class SoloSuccessModel(SuccessModel):
+    __type_key__: ClassVar[str] = 'tetrio.records.solo'
+
     data: Data
 
 
@@ -1,6 +1,6 @@
 from datetime import datetime
 from enum import IntEnum
-from typing import Literal, TypeAlias
+from typing import ClassVar, Literal, TypeAlias
 
 from pydantic import BaseModel, Field
 
@@ -92,6 +92,8 @@ class Achievement(BaseModel):
 
 
 class AchievementsSuccessModel(SuccessModel):
+    __type_key__: ClassVar[str] = 'tetrio.summaries.achievements'
+
     data: list[Achievement]
 
 
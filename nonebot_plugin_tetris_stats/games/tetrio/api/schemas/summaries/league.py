@@ -1,4 +1,4 @@
-from typing import Literal
+from typing import ClassVar, Literal
 
 from nonebot.compat import PYDANTIC_V2
 from pydantic import BaseModel, Field
@@ -127,4 +127,6 @@ class InvalidData(BaseModel):
 
 
 class LeagueSuccessModel(SuccessModel):
+    __type_key__: ClassVar[str] = 'tetrio.summaries.league'
+
     data: NeverPlayedData | NeverRatedData | RatedData | InvalidData
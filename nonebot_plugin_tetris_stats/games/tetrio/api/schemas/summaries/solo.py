@@ -1,4 +1,4 @@
-from typing import TypeAlias
+from typing import ClassVar, TypeAlias
 
 from pydantic import BaseModel
 
@@ -18,6 +18,8 @@ class Data(BaseModel):
 
 
 class SoloSuccessModel(SuccessModel):
+    __type_key__: ClassVar[str] = 'tetrio.summaries.solo'
+
     data: Data
 
 
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Literal, TypeAlias
+from typing import ClassVar, Literal, TypeAlias
 
 from pydantic import BaseModel, Field
 
@@ -109,6 +109,8 @@ class Data(BaseModel):
 
 
 class ZenithSuccessModel(SuccessModel):
+    __type_key__: ClassVar[str] = 'tetrio.summaries.zenith'
+
     data: Data
 
 
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Literal
+from typing import ClassVar, Literal
 
 from pydantic import BaseModel, Field
 
@@ -74,6 +74,8 @@ class Data(BaseModel):
 
 
 class UserInfoSuccess(BaseSuccessModel):
+    __type_key__: ClassVar[str] = 'tetrio.user_info'
+
     data: Data
 
 
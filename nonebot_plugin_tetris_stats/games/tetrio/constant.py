@@ -3,7 +3,7 @@ from typing import Literal
 
 from yarl import URL
 
-from .api.typedefs import ValidRank
+from .api.typedefs import Rank, ValidRank
 
 GAME_TYPE: Literal['IO'] = 'IO'
 
@@ -30,6 +30,8 @@ RANK_PERCENTILE: dict[ValidRank, float] = {
     'd': 100,
 }
 
+RANK_CODES: dict[Rank, int] = {rank: code for code, rank in enumerate([*RANK_PERCENTILE, 'z'])}
+
 TR_MIN = 0
 TR_MAX = 25000
 
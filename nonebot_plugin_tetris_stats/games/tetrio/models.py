@@ -1,14 +1,26 @@
 from datetime import datetime, timedelta
+from typing import Any
 from uuid import UUID
 
 from nonebot_plugin_orm import Model
-from sqlalchemy import ForeignKey, Integer, Interval, String, UniqueConstraint
-from sqlalchemy.orm import Mapped, MappedAsDataclass, mapped_column, relationship
+from sqlalchemy import (
+    Connection,
+    ForeignKey,
+    Index,
+    Interval,
+    LargeBinary,
+    String,
+    event,
+    insert,
+)
+from sqlalchemy.orm import Mapped, MappedAsDataclass, Mapper, mapped_column, relationship
 
 from ...db.models import PydanticType
 from ...db.types import UTCDateTime
+from .api.models import TETRIOHistoricalData
 from .api.schemas.leaderboards.by import BySuccessModel, Entry
-from .api.typedefs import ValidRank
+from .api.schemas.summaries.league import LeagueSuccessModel
+from .api.typedefs import Rank, ValidRank
 from .typedefs import Template
 
 
@@ -70,12 +82,73 @@ class TETRIOUserUniqueIdentifier(MappedAsDataclass, Model):
     user_unique_identifier: Mapped[str] = mapped_column(String(24), unique=True, index=True)
 
 
-class TETRIOLeagueUserMap(MappedAsDataclass, Model):
-    __tablename__ = 'nb_t_io_tl_map'
-    __table_args__ = (UniqueConstraint('uid_id', 'hist_id', name='uq_nb_t_io_tl_map_uid_hist'),)
+class TETRIOLeagueSnapshot(MappedAsDataclass, Model):
+    """一次抓取中所有玩家的紧凑快照, 格式见 snapshot.py"""
+
+    __tablename__ = 'nb_t_io_tl_snap'
+
+    id: Mapped[int] = mapped_column(init=False, primary_key=True)
+    stats_id: Mapped[int] = mapped_column(ForeignKey('nb_t_io_tl_stats.id'), unique=True)
+    player_count: Mapped[int]
+    data: Mapped[bytes] = mapped_column(LargeBinary)
+    update_time: Mapped[datetime] = mapped_column(UTCDateTime(), index=True)
+
+
+class TETRIOLeagueEntry(MappedAsDataclass, Model):
+    """一次抓取中一名玩家的段位数值, 查询玩家的历史段位数据时不需要解析整页数据
+
+    只保留 league_entry_days 天内的数据, 更早的抓取只保存在快照中
+    """
+
+    __tablename__ = 'nb_t_io_tl_entry'
+    __table_args__ = (Index('ix_nb_t_io_tl_entry_lookup', 'uid_id', 'update_time'),)
 
     id: Mapped[int] = mapped_column(init=False, primary_key=True)
     stats_id: Mapped[int] = mapped_column(ForeignKey('nb_t_io_tl_stats.id'), index=True)
-    uid_id: Mapped[int] = mapped_column(ForeignKey('nb_t_io_uid.id'), index=True)
-    hist_id: Mapped[int] = mapped_column(ForeignKey('nb_t_io_tl_hist.id'))
-    entry_index: Mapped[int] = mapped_column(Integer)
+    uid_id: Mapped[int] = mapped_column(ForeignKey('nb_t_io_uid.id'))
+    update_time: Mapped[datetime] = mapped_column(UTCDateTime())
+    """所在页面的缓存时间"""
+    tr: Mapped[float]
+    pps: Mapped[float | None]
+    apm: Mapped[float | None]
+    vs: Mapped[float | None]
+    rank: Mapped[Rank] = mapped_column(String(2))
+
+
+class TETRIOLeagueMetrics(MappedAsDataclass, Model):
+    """从 league 历史数据中提取出的数值, 趋势比较只需要读取这张表"""
+
+    __tablename__ = 'nb_t_io_lg_metrics'
+    __table_args__ = (Index('ix_nb_t_io_lg_metrics_lookup', 'user_unique_identifier', 'update_time'),)
+
+    id: Mapped[int] = mapped_column(init=False, primary_key=True)
+    hist_id: Mapped[int] = mapped_column(unique=True)
+    """来源的 TETRIOHistoricalData.id, 原始数据可能已经被降采样删除"""
+    user_unique_identifier: Mapped[str] = mapped_column(String(24))
+    update_time: Mapped[datetime] = mapped_column(UTCDateTime())
+    tr: Mapped[float | None]
+    glicko: Mapped[float | None]
+    rd: Mapped[float | None]
+    pps: Mapped[float | None]
+    apm: Mapped[float | None]
+    vs: Mapped[float | None]
+    rank: Mapped[Rank | None] = mapped_column(String(2))
+
+
+def league_metrics(data: LeagueSuccessModel) -> dict[str, Any]:
+    """没有打过排位或数据无效时对应的值为 None"""
+    return {field: getattr(data.data, field, None) for field in ('tr', 'glicko', 'rd', 'pps', 'apm', 'vs', 'rank')}
+
+
+@event.listens_for(TETRIOHistoricalData, 'after_insert')
+def _(mapper: Mapper, connection: Connection, target: TETRIOHistoricalData) -> None:  # noqa: ARG001
+    if target.api_type == 'league' and isinstance(target.data, LeagueSuccessModel):
+        connection.execute(
+            insert(TETRIOLeagueMetrics),
+            {
+                'hist_id': target.id,
+                'user_unique_identifier': target.user_unique_identifier,
+                'update_time': target.update_time,
+                **league_metrics(target.data),
+            },
+        )
@@ -1,12 +1,15 @@
 from asyncio import gather
 from datetime import datetime, timedelta, timezone
 from hashlib import md5
-from typing import Literal, NamedTuple
+from math import isnan
+from typing import NamedTuple
 
 from nonebot_plugin_orm import AsyncSession, get_session
-from sqlalchemy import func, select
+from sqlalchemy import select
 from yarl import URL
 
+from ....config.config import config
+from ....db import get_nearest_row
 from ....utils.chart import get_split, get_value_bounds, handle_history_data
 from ....utils.host import get_self_netloc
 from ....utils.lang import get_lang
@@ -17,11 +20,10 @@ from ....utils.render.schemas.v1.base import History
 from ....utils.render.schemas.v1.tetrio.info import Info, Multiplayer, Singleplayer, User
 from ....utils.timezone import ensure_utc_datetime
 from ..api import Player
-from ..api.models import TETRIOHistoricalData
-from ..api.schemas.leaderboards.by import Entry, InvalidEntry
-from ..api.schemas.summaries.league import LeagueSuccessModel, NeverRatedData, RatedData
+from ..api.schemas.summaries.league import NeverRatedData, RatedData
 from ..constant import TR_MAX, TR_MIN
-from ..models import TETRIOLeagueHistorical, TETRIOLeagueUserMap, TETRIOUserUniqueIdentifier
+from ..models import TETRIOLeagueEntry, TETRIOLeagueMetrics, TETRIOLeagueSnapshot, TETRIOUserUniqueIdentifier
+from ..snapshot import LeagueSnapshot
 from .tools import flow_to_history, get_league_data
 
 UTC = timezone.utc
@@ -43,94 +45,51 @@ async def get_nearest_historical(
     unique_identifier: str,
     target_time: datetime,
 ) -> HistoricalSnapshot | None:
-    target_time = ensure_utc_datetime(target_time)
-    before = await session.scalar(
-        select(TETRIOHistoricalData)
-        .where(
-            TETRIOHistoricalData.user_unique_identifier == unique_identifier,
-            TETRIOHistoricalData.api_type == 'league',
-            TETRIOHistoricalData.update_time <= target_time,
-        )
-        .order_by(TETRIOHistoricalData.update_time.desc())
-        .limit(1)
-    )
-    after = await session.scalar(
-        select(TETRIOHistoricalData)
-        .where(
-            TETRIOHistoricalData.user_unique_identifier == unique_identifier,
-            TETRIOHistoricalData.api_type == 'league',
-            TETRIOHistoricalData.update_time >= target_time,
-        )
-        .order_by(TETRIOHistoricalData.update_time.asc())
-        .limit(1)
+    nearest = await get_nearest_row(
+        session,
+        TETRIOLeagueMetrics.update_time,
+        target_time,
+        (TETRIOLeagueMetrics.pps, TETRIOLeagueMetrics.apm, TETRIOLeagueMetrics.vs),
+        TETRIOLeagueMetrics.user_unique_identifier == unique_identifier,
     )
-    candidates = [i for i in (before, after) if i is not None]
-    if not candidates:
+    if nearest is None:
         return None
+    (_, pps, apm, vs), delta = nearest
+    if pps is None or apm is None or vs is None:
+        return None
+    return HistoricalSnapshot(get_metrics(pps=pps, apm=apm, vs=vs), delta)
 
-    delta_seconds, selected = min(
-        (
-            abs((target_time - i.update_time).total_seconds()),
-            i,
-        )
-        for i in candidates
-    )
-    delta = timedelta(seconds=delta_seconds)
 
-    if not isinstance(selected.data, LeagueSuccessModel) or not isinstance(
-        selected.data.data, RatedData | NeverRatedData
-    ):
-        return None
+LeagueValues = tuple[tuple[float | None, float | None, float | None], timedelta]
+"""((pps, apm, vs), 与目标时间的时间差)"""
 
-    data = selected.data.data
-    return HistoricalSnapshot(get_metrics(pps=data.pps, apm=data.apm, vs=data.vs), delta)
+SNAPSHOT_SCAN_LIMIT = 4
+"""向前/向后最多检查的快照数量"""
 
 
-async def _get_boundary_league_historical(
-    session: AsyncSession,
-    uid_id: int,
-    target_time: datetime,
-    *,
-    time_direction: Literal['before', 'after'],
-) -> tuple[TETRIOLeagueUserMap, datetime] | None:
-    boundary_time = await session.scalar(
-        select((func.max if time_direction == 'before' else func.min)(TETRIOLeagueHistorical.update_time))
-        .select_from(TETRIOLeagueUserMap)
-        .join(TETRIOLeagueHistorical, TETRIOLeagueUserMap.hist_id == TETRIOLeagueHistorical.id)
-        .where(
-            TETRIOLeagueUserMap.uid_id == uid_id,
-            TETRIOLeagueHistorical.update_time <= target_time
-            if time_direction == 'before'
-            else TETRIOLeagueHistorical.update_time >= target_time,
-        )
+async def _get_nearest_league_entry(
+    session: AsyncSession, unique_identifier: str, target_time: datetime
+) -> LeagueValues | None:
+    nearest = await get_nearest_row(
+        session,
+        TETRIOLeagueEntry.update_time,
+        target_time,
+        (TETRIOLeagueEntry.pps, TETRIOLeagueEntry.apm, TETRIOLeagueEntry.vs),
+        TETRIOLeagueEntry.uid_id
+        == select(TETRIOUserUniqueIdentifier.id)
+        .where(TETRIOUserUniqueIdentifier.user_unique_identifier == unique_identifier)
+        .scalar_subquery(),
     )
-    if boundary_time is None:
+    if nearest is None:
         return None
-
-    return (
-        (
-            await session.execute(
-                select(TETRIOLeagueUserMap, TETRIOLeagueHistorical.update_time)
-                .join(TETRIOLeagueHistorical, TETRIOLeagueUserMap.hist_id == TETRIOLeagueHistorical.id)
-                .where(
-                    TETRIOLeagueUserMap.uid_id == uid_id,
-                    TETRIOLeagueHistorical.update_time == boundary_time,
-                )
-                .order_by(TETRIOLeagueHistorical.id.desc())
-                .limit(1)
-            )
-        )
-        .tuples()
-        .first()
-    )
+    (_, pps, apm, vs), delta = nearest
+    return (pps, apm, vs), delta
 
 
-async def get_nearest_league_historical(
-    session: AsyncSession,
-    unique_identifier: str,
-    target_time: datetime,
-) -> HistoricalSnapshot | None:
-    target_time = ensure_utc_datetime(target_time)
+async def _get_nearest_league_snapshot(
+    session: AsyncSession, unique_identifier: str, target_time: datetime
+) -> LeagueValues | None:
+    """在目标时间前后的快照中查找, 快照中没有这名玩家时继续检查更远的快照"""
     uid_id = await session.scalar(
         select(TETRIOUserUniqueIdentifier.id).where(
             TETRIOUserUniqueIdentifier.user_unique_identifier == unique_identifier
@@ -138,55 +97,44 @@ async def get_nearest_league_historical(
     )
     if uid_id is None:
         return None
-
-    before = await _get_boundary_league_historical(
-        session,
-        uid_id,
-        target_time,
-        time_direction='before',
-    )
-    after = await _get_boundary_league_historical(
-        session,
-        uid_id,
-        target_time,
-        time_direction='after',
-    )
-
-    candidates = [i for i in (before, after) if i is not None]
-    if not candidates:
-        return None
-    delta_seconds, selected = min(
-        (
-            abs((target_time - i[1]).total_seconds()),
-            i[0],
+    candidates: list[LeagueValues] = []
+    for before in (True, False):
+        snapshots = await session.execute(
+            select(TETRIOLeagueSnapshot.id, TETRIOLeagueSnapshot.update_time)
+            .where(
+                TETRIOLeagueSnapshot.update_time <= target_time
+                if before
+                else TETRIOLeagueSnapshot.update_time >= target_time
+            )
+            .order_by(TETRIOLeagueSnapshot.update_time.desc() if before else TETRIOLeagueSnapshot.update_time.asc())
+            .limit(SNAPSHOT_SCAN_LIMIT)
         )
-        for i in candidates
-    )
-    delta = timedelta(seconds=delta_seconds)
-
-    historical = await session.get(TETRIOLeagueHistorical, selected.hist_id)
-    if historical is None or not isinstance(
-        (entry := find_entry(historical.data.data.entries, selected.entry_index, unique_identifier)), Entry
-    ):
-        return None
-    return HistoricalSnapshot(get_metrics(pps=entry.league.pps, apm=entry.league.apm, vs=entry.league.vs), delta)
+        for snapshot_id, update_time in snapshots.all():
+            data = await session.scalar(select(TETRIOLeagueSnapshot.data).where(TETRIOLeagueSnapshot.id == snapshot_id))
+            if data is not None and (row := LeagueSnapshot(data).get(uid_id)) is not None:
+                pps, apm, vs = (None if isnan(i) else i for i in (row.pps, row.apm, row.vs))
+                candidates.append(((pps, apm, vs), abs(target_time - update_time)))
+                break
+    return min(candidates, key=lambda i: i[1], default=None)
 
 
-def find_entry(
-    entries: list[Entry | InvalidEntry],
-    entry_index: int,
-    unique_identifier: str | None = None,
-) -> Entry | InvalidEntry | None:
-    if 0 <= entry_index < len(entries):
-        entry = entries[entry_index]
-        if unique_identifier is None or entry.id == unique_identifier:
-            return entry
-    if unique_identifier is None:
+async def get_nearest_league_historical(
+    session: AsyncSession,
+    unique_identifier: str,
+    target_time: datetime,
+) -> HistoricalSnapshot | None:
+    """league_entry_days 天内的数据直接通过索引查找, 更早的数据只保存在快照中"""
+    target_time = ensure_utc_datetime(target_time)
+    nearest = await _get_nearest_league_entry(session, unique_identifier, target_time)
+    if target_time < datetime.now(UTC) - timedelta(days=config.tetris.league_entry_days):
+        archived = await _get_nearest_league_snapshot(session, unique_identifier, target_time)
+        nearest = min((i for i in (nearest, archived) if i is not None), key=lambda i: i[1], default=None)
+    if nearest is None:
+        return None
+    (pps, apm, vs), delta = nearest
+    if pps is None or apm is None or vs is None:
         return None
-    for entry in entries:
-        if entry.id == unique_identifier:
-            return entry
-    return None
+    return HistoricalSnapshot(get_metrics(pps=pps, apm=apm, vs=vs), delta)
 
 
 async def get_trends(player: Player, compare_delta: timedelta) -> Trends:
@@ -1,19 +1,20 @@
-from collections import defaultdict
-from collections.abc import Callable, Iterator, Sequence
+from asyncio import Lock, sleep
+from collections.abc import Awaitable, Callable
 from datetime import datetime, timedelta, timezone
-from math import floor
-from statistics import mean
-from typing import TYPE_CHECKING, TypeVar
-from uuid import uuid4
+from uuid import UUID, uuid4
 
 from nonebot import get_driver
+from nonebot.log import logger
 from nonebot_plugin_alconna import Subcommand
 from nonebot_plugin_apscheduler import scheduler
 from nonebot_plugin_orm import get_session
 from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
 from ....config.config import config
-from ....utils.exception import RequestError
+from ....utils.exception import CircuitOpenError, RequestError
+from ....utils.limit import Priority
 from ....utils.retry import retry
 from ....utils.timezone import ensure_utc_datetime
 from .. import alc
@@ -21,19 +22,19 @@ from .. import command as base_command
 from ..api.leaderboards import by
 from ..api.schemas.base import P
 from ..api.schemas.leaderboards import Parameter
-from ..api.schemas.leaderboards.by import Entry
+from ..api.schemas.leaderboards.by import BySuccessModel, Entry
 from ..constant import RANK_PERCENTILE
 from ..models import (
+    TETRIOLeagueEntry,
     TETRIOLeagueHistorical,
+    TETRIOLeagueSnapshot,
     TETRIOLeagueStats,
-    TETRIOLeagueStatsField,
-    TETRIOLeagueUserMap,
     TETRIOUserUniqueIdentifier,
 )
-
-if TYPE_CHECKING:
-    from ..api.schemas.leaderboards.by import BySuccessModel
-    from ..api.typedefs import Rank
+from ..snapshot import SnapshotBuilder
+from .aggregate import LeagueAggregate, build_fields, holders
+from .data import get_latest_and_compare, get_uid_mapping
+from .retention import prune_league_entries, prune_league_pages
 
 UTC = timezone.utc
 
@@ -62,128 +63,201 @@ alc.shortcut(
 )
 
 
-def _pps(user: Entry) -> float:
-    return user.league.pps
-
-
-def _apm(user: Entry) -> float:
-    return user.league.apm
-
-
-def _vs(user: Entry) -> float:
-    return user.league.vs
-
+PAGE_SIZE = 100
 
-def _min(users: Sequence[Entry], field: Callable[[Entry], float]) -> Entry:
-    return min(users, key=field)
+crawl_lock = Lock()
 
 
-def _max(users: Sequence[Entry], field: Callable[[Entry], float]) -> Entry:
-    return max(users, key=field)
-
-
-def find_special_player(
-    users: Sequence[Entry],
-    field: Callable[[Entry], float],
-    sort: Callable[[Sequence[Entry], Callable[[Entry], float]], Entry],
-) -> Entry:
-    return sort(users, field)
+@scheduler.scheduled_job('cron', hour='0,6,12,18', minute=0)
+async def get_tetra_league_data(*, prerender: bool = True) -> None:
+    """抓取 TETR.IO 排行榜并生成段位统计
+
+    每一页数据到达后立即写入数据库, 内存中只保留统计需要的列
+    还没有生成 fields 的统计即为未完成的抓取, 6 小时内重新运行时会从最后一页继续
+    抓取完成后只保留快照与玩家数值, 原始页面会被删除
+    同时只会有一次抓取, 已经在抓取时 (例如启动时的抓取与定时抓取重叠) 直接返回
+    prerender 为 True 时在抓取完成后预渲染段位图片
+    """
+    if crawl_lock.locked():
+        logger.info('段位数据正在抓取中, 跳过本次抓取')
+        return
+    async with crawl_lock:
+        await _crawl()
+    if prerender:
+        await prerender_images()
+
+
+async def _crawl() -> None:
+    retry_by = retry(max_attempts=10, exception_type=RequestError)(_fetch_page)
+    aggregate = LeagueAggregate()
+    snapshot = SnapshotBuilder()
+    async with get_session() as session:
+        stats_id, x_session_id, prisecter, finished = await _resume(session, aggregate, snapshot)
+    while not finished:
+        model = await retry_by(prisecter, x_session_id)
+        if not model.data.entries:
+            break
+        hist_id, uid_ids = await _save_page(stats_id, x_session_id, model)
+        aggregate.add_page(model, hist_id)
+        snapshot.add_page(model, uid_ids)
+        prisecter = model.data.entries[-1].p
+        finished = len(model.data.entries) < PAGE_SIZE
+    summaries = aggregate.summarize()
+    locators = holders(summaries)
+    async with get_session() as session:
+        pages = await session.scalars(
+            select(TETRIOLeagueHistorical).where(TETRIOLeagueHistorical.id.in_(list({key for key, _ in locators})))
+        )
+        entries = {
+            (page.id, index): entry
+            for page in pages
+            for index, entry in enumerate(page.data.data.entries)
+            if (page.id, index) in locators and isinstance(entry, Entry)
+        }
+        stats = (
+            await session.scalars(
+                select(TETRIOLeagueStats)
+                .where(TETRIOLeagueStats.id == stats_id)
+                .options(selectinload(TETRIOLeagueStats.fields))
+            )
+        ).one()
+        stats.update_time = datetime.now(UTC)
+        session.add_all(build_fields(stats, summaries, entries))
+        session.add(
+            TETRIOLeagueSnapshot(
+                stats_id=stats_id,
+                player_count=len(snapshot),
+                data=snapshot.to_bytes(),
+                update_time=stats.update_time,
+            )
+        )
+        # 快照写入后原始页面不再需要
+        await prune_league_pages(session)
+        await prune_league_entries(session, stats.update_time)
+        await session.commit()
 
 
-T = TypeVar('T')
+CIRCUIT_MIN_WAIT = 1.0
 
 
-def _chunked(values: list[T], size: int) -> Iterator[list[T]]:
-    for i in range(0, len(values), size):
-        yield values[i : i + size]
+async def _fetch_page(prisecter: P, x_session_id: UUID) -> BySuccessModel:
+    """请求一页排行榜, 熔断时等待冷却结束后再请求, 不消耗 retry 的重试次数"""
+    while True:
+        try:
+            return await by(
+                'league', Parameter(after=prisecter.to_prisecter(), limit=PAGE_SIZE), x_session_id, Priority.BACKGROUND
+            )
+        except CircuitOpenError as e:  # noqa: PERF203
+            # 半开状态下其他请求正在探测时 retry_after 为 0, 至少等待 CIRCUIT_MIN_WAIT 秒
+            wait = max(e.retry_after, CIRCUIT_MIN_WAIT)
+            logger.warning(f'TETR.IO 已熔断, {wait:.0f}s 后继续抓取段位数据')
+            await sleep(wait)
 
 
-@scheduler.scheduled_job('cron', hour='0,6,12,18', minute=0)
-async def get_tetra_league_data() -> None:
-    x_session_id = uuid4()
-    retry_by = retry(max_attempts=10, exception_type=RequestError)(by)
+async def _resume(
+    session: AsyncSession, aggregate: LeagueAggregate, snapshot: SnapshotBuilder
+) -> tuple[int, UUID, P, bool]:
+    """找到未完成的抓取并把已经保存的页面重新收集进 aggregate 与 snapshot, 没有则新建一条统计"""
     prisecter = P(pri=9007199254740991, sec=9007199254740991, ter=9007199254740991)  # * from ch.tetr.io
-    results: list[BySuccessModel] = []
-    while True:
-        model = await retry_by('league', Parameter(after=prisecter.to_prisecter(), limit=100), x_session_id)
-        prisecter = model.data.entries[-1].p
-        results.append(model)
-        if len(model.data.entries) < 100:  # 分页值 # noqa: PLR2004
-            break
-
-    players = [i for result in results for i in result.data.entries if isinstance(i, Entry)]
-    players.sort(key=lambda x: x.league.tr, reverse=True)
-
-    rank_player_mapping: defaultdict[Rank, list[Entry]] = defaultdict(list)
-    for player in players:
-        rank_player_mapping[player.league.rank].append(player)
-
-    stats = TETRIOLeagueStats(raw=[], fields=[], update_time=datetime.now(UTC))
-    fields: list[TETRIOLeagueStatsField] = []
-    for rank, percentile in RANK_PERCENTILE.items():
-        offset = floor((percentile / 100) * len(players)) - 1
-        tr_line = players[offset].league.tr
-        rank_players = rank_player_mapping[rank]
-        fields.append(
-            TETRIOLeagueStatsField(
-                rank=rank,
-                tr_line=tr_line,
-                player_count=len(rank_players),
-                low_pps=find_special_player(rank_players, _pps, _min),
-                low_apm=find_special_player(rank_players, _apm, _min),
-                low_vs=find_special_player(rank_players, _vs, _min),
-                avg_pps=mean(_pps(i) for i in rank_players),
-                avg_apm=mean(_apm(i) for i in rank_players),
-                avg_vs=mean(_vs(i) for i in rank_players),
-                high_pps=find_special_player(rank_players, _pps, _max),
-                high_apm=find_special_player(rank_players, _apm, _max),
-                high_vs=find_special_player(rank_players, _vs, _max),
-                stats=stats,
-            )
+    stats = await session.scalar(
+        select(TETRIOLeagueStats)
+        .where(
+            ~TETRIOLeagueStats.fields.any(),
+            TETRIOLeagueStats.update_time >= datetime.now(UTC) - timedelta(hours=6),
+        )
+        .order_by(TETRIOLeagueStats.id.desc())
+        .limit(1)
+    )
+    if stats is None:
+        stats = TETRIOLeagueStats(raw=[], fields=[], update_time=datetime.now(UTC))
+        session.add(stats)
+        await session.flush()
+        stats_id = stats.id
+        await session.commit()
+        return stats_id, uuid4(), prisecter, False
+    pages = (
+        await session.scalars(
+            select(TETRIOLeagueHistorical)
+            .where(TETRIOLeagueHistorical.stats_id == stats.id)
+            .order_by(TETRIOLeagueHistorical.id)
         )
-    historicals = [
-        TETRIOLeagueHistorical(
+    ).all()
+    if not pages:
+        return stats.id, uuid4(), prisecter, False
+    uid_mapping = await get_uid_mapping(session, {entry.id for page in pages for entry in page.data.data.entries})
+    for page in pages:
+        aggregate.add_page(page.data, page.id)
+        snapshot.add_page(page.data, [uid_mapping[entry.id] for entry in page.data.data.entries])
+    last = pages[-1].data.data.entries
+    logger.info(f'继续未完成的排行榜抓取, 已保存 {len(pages)} 页')
+    return stats.id, pages[0].request_id, last[-1].p, len(last) < PAGE_SIZE
+
+
+async def _save_page(stats_id: int, x_session_id: UUID, model: BySuccessModel) -> tuple[int, list[int]]:
+    """保存一页排行榜数据, 返回 TETRIOLeagueHistorical.id 与每个玩家的 TETRIOUserUniqueIdentifier.id"""
+    update_time = ensure_utc_datetime(model.cache.cached_at)
+    async with get_session() as session:
+        historical = TETRIOLeagueHistorical(
             request_id=x_session_id,
             data=model,
-            update_time=ensure_utc_datetime(model.cache.cached_at),
-            stats=stats,
+            update_time=update_time,
+            stats=await session.get_one(TETRIOLeagueStats, stats_id),
         )
-        for model in results
-    ]
-    stats.raw = historicals
-    stats.fields = fields
-    player_ids = {i.id for result in results for i in result.data.entries}
-    async with get_session() as session:
-        session.add(stats)
-        existing_ids: list[TETRIOUserUniqueIdentifier] = []
-        for chunk in _chunked(list(player_ids), 500):
-            existing_ids.extend(
-                (
-                    await session.scalars(
-                        select(TETRIOUserUniqueIdentifier).filter(
-                            TETRIOUserUniqueIdentifier.user_unique_identifier.in_(chunk)
-                        )
-                    )
-                ).all()
-            )
-        new_ids = [
-            TETRIOUserUniqueIdentifier(user_unique_identifier=i)
-            for i in player_ids - {i.user_unique_identifier for i in existing_ids}
-        ]
+        session.add(historical)
+        player_ids = {i.id for i in model.data.entries}
+        uid_mapping = await get_uid_mapping(session, player_ids)
+        new_ids = [TETRIOUserUniqueIdentifier(user_unique_identifier=i) for i in player_ids - uid_mapping.keys()]
         session.add_all(new_ids)
         await session.flush()
-        uid_mapping = {i.user_unique_identifier: i.id for i in list(existing_ids) + new_ids}
-        maps: list[TETRIOLeagueUserMap] = []
-        for i in stats.raw:
-            for index, entry in enumerate(i.data.data.entries):
-                maps.append(
-                    TETRIOLeagueUserMap(
-                        stats_id=stats.id, uid_id=uid_mapping[entry.id], hist_id=i.id, entry_index=index
-                    )
-                )
-            session.add_all(maps)
-            maps.clear()
+        uid_mapping.update({i.user_unique_identifier: i.id for i in new_ids})
+        session.add_all(
+            TETRIOLeagueEntry(
+                stats_id=stats_id,
+                uid_id=uid_mapping[entry.id],
+                update_time=update_time,
+                tr=entry.league.tr,
+                pps=entry.league.pps,
+                apm=entry.league.apm,
+                vs=entry.league.vs,
+                rank=entry.league.rank,
+            )
+            for entry in model.data.entries
+        )
+        hist_id = historical.id
         await session.commit()
+    return hist_id, [uid_mapping[entry.id] for entry in model.data.entries]
+
+
+PRERENDER_TTL = timedelta(hours=6, minutes=30).total_seconds()  # 覆盖到下一次抓取完成
+
+
+async def prerender_images() -> None:
+    """预先渲染段位概览与各段位详情, 之后的查询会直接命中渲染缓存"""
+    if not config.tetris.render_cache.enabled or config.tetris.dev.enabled:
+        return
+    from .all import make_image_v1, make_image_v2  # noqa: PLC0415
+    from .detail import make_image  # noqa: PLC0415
+
+    async with get_session() as session:
+        latest, compare = await get_latest_and_compare(session)
+    jobs = [
+        ('all v1', lambda: make_image_v1(latest, compare, PRERENDER_TTL)),
+        ('all v2', lambda: make_image_v2(latest, compare, PRERENDER_TTL)),
+        *(
+            (f'detail {rank}', lambda rank=rank: make_image(rank, latest, compare, PRERENDER_TTL))
+            for rank in RANK_PERCENTILE
+        ),
+    ]
+    for name, job in jobs:
+        await _prerender(name, job)
+    logger.debug(f'预渲染了 {len(jobs)} 张段位图片')
+
+
+async def _prerender(name: str, job: Callable[[], Awaitable[bytes]]) -> None:
+    try:
+        await job()
+    except Exception as e:  # noqa: BLE001
+        logger.warning(f'预渲染 rank {name} 失败 {e!r}')
 
 
 if not config.tetris.dev.enabled:
@@ -192,14 +266,18 @@ if not config.tetris.dev.enabled:
     async def _() -> None:
         async with get_session() as session:
             latest_time = await session.scalar(
-                select(TETRIOLeagueStats.update_time).order_by(TETRIOLeagueStats.id.desc()).limit(1)
+                select(TETRIOLeagueStats.update_time)
+                .where(TETRIOLeagueStats.fields.any())
+                .order_by(TETRIOLeagueStats.id.desc())
+                .limit(1)
             )
         if latest_time is None or datetime.now(tz=UTC) - latest_time > timedelta(hours=6):
-            await get_tetra_league_data()
+            # 启动时 HTTP 服务还没有开始监听, 渲染用的页面无法访问, 预渲染留给之后的定时抓取
+            await get_tetra_league_data(prerender=False)
 
 
-from . import all, detail  # noqa: A004, E402
+from . import all, detail, retention  # noqa: A004, E402
 
 base_command.add(command)
 
-__all__ = ['all', 'detail']
+__all__ = ['all', 'detail', 'retention']
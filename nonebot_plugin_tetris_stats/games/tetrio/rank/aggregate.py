@@ -0,0 +1,125 @@
+from array import array
+from collections.abc import Iterable, Mapping
+from math import floor
+from typing import Literal, NamedTuple
+
+from pandas import DataFrame, Series
+
+from ..api.schemas.leaderboards.by import BySuccessModel, Entry
+from ..api.typedefs import ValidRank
+from ..constant import RANK_CODES, RANK_PERCENTILE
+from ..models import TETRIOLeagueStats, TETRIOLeagueStatsField
+
+Metric = Literal['pps', 'apm', 'vs']
+
+METRICS: tuple[Metric, ...] = ('pps', 'apm', 'vs')
+
+RANKS: tuple[ValidRank, ...] = tuple(RANK_PERCENTILE)
+
+Locator = tuple[int, int]
+"""玩家在排行榜中的位置: (页面 key, 页内序号)"""
+
+
+class RankSummary(NamedTuple):
+    tr_line: float
+    player_count: int
+    means: dict[Metric, float]
+    low: dict[Metric, Locator]
+    high: dict[Metric, Locator]
+
+
+class LeagueAggregate:
+    """整个排行榜的列式统计
+
+    每一页数据到达后只把 tr / pps / apm / vs / 段位 追加到紧凑的列中, 并记录每一行来自哪一页
+    统计时一次性转换为 DataFrame, 段位线, 各段位平均值与最低/最高的玩家都通过向量化运算得出
+    """
+
+    def __init__(self) -> None:
+        self.tr = array('d')
+        self.metrics: dict[Metric, array[float]] = {metric: array('d') for metric in METRICS}
+        self.rank_codes = array('b')
+        self.page_keys = array('q')
+        self.entry_indexes = array('H')
+
+    def __len__(self) -> int:
+        return len(self.tr)
+
+    def add_page(self, model: BySuccessModel, key: int) -> None:
+        """key 用于之后找回这一页的数据, 一般为对应的 TETRIOLeagueHistorical.id"""
+        for index, entry in enumerate(model.data.entries):
+            if not isinstance(entry, Entry):
+                continue
+            league = entry.league
+            self.tr.append(league.tr)
+            for metric in METRICS:
+                self.metrics[metric].append(getattr(league, metric))
+            self.rank_codes.append(RANK_CODES[league.rank])
+            self.page_keys.append(key)
+            self.entry_indexes.append(index)
+
+    def to_frame(self) -> DataFrame:
+        return DataFrame({'tr': self.tr, **self.metrics, 'rank': self.rank_codes})
+
+    def tr_lines(self, percentiles: Iterable[float]) -> list[float]:
+        """按 TR 从高到低排序后, 位于前 percentile% 的最后一名玩家的 TR"""
+        trs = Series(self.tr).sort_values(ascending=False, ignore_index=True)
+        return trs.iloc[[floor((percentile / 100) * len(trs)) - 1 for percentile in percentiles]].tolist()
+
+    def summarize(self) -> dict[ValidRank, RankSummary]:
+        """计算每个段位的统计, 没有玩家的段位不会出现在结果中"""
+        tr_lines = self.tr_lines(RANK_PERCENTILE.values())
+        # idxmin / idxmax 在数值相同时返回先出现 (TR 更高) 的玩家
+        grouped = self.to_frame().groupby('rank', sort=False)[list(METRICS)]
+        counts = grouped.size()
+        means = grouped.mean()
+        lows = grouped.idxmin()
+        highs = grouped.idxmax()
+        return {
+            rank: RankSummary(
+                tr_line=tr_line,
+                player_count=int(counts[code]),
+                means={metric: float(means.loc[code, metric]) for metric in METRICS},
+                low={metric: self.locate(lows.loc[code, metric]) for metric in METRICS},
+                high={metric: self.locate(highs.loc[code, metric]) for metric in METRICS},
+            )
+            for code, (rank, tr_line) in enumerate(zip(RANKS, tr_lines, strict=True))
+            if code in counts.index
+        }
+
+    def locate(self, row: int) -> Locator:
+        return self.page_keys[row], self.entry_indexes[row]
+
+
+def holders(summaries: Mapping[ValidRank, RankSummary]) -> set[Locator]:
+    """所有段位最低/最高玩家的位置"""
+    return {locator for summary in summaries.values() for locator in (*summary.low.values(), *summary.high.values())}
+
+
+def build_fields(
+    stats: TETRIOLeagueStats, summaries: Mapping[ValidRank, RankSummary], entries: Mapping[Locator, Entry]
+) -> list[TETRIOLeagueStatsField]:
+    """entries 中需要包含 holders(summaries) 中所有玩家的数据"""
+    fields: list[TETRIOLeagueStatsField] = []
+    for rank in RANKS:
+        if (summary := summaries.get(rank)) is None:
+            msg = f'段位 {rank} 内没有玩家'
+            raise ValueError(msg)
+        fields.append(
+            TETRIOLeagueStatsField(
+                rank=rank,
+                tr_line=summary.tr_line,
+                player_count=summary.player_count,
+                low_pps=entries[summary.low['pps']],
+                low_apm=entries[summary.low['apm']],
+                low_vs=entries[summary.low['vs']],
+                avg_pps=summary.means['pps'],
+                avg_apm=summary.means['apm'],
+                avg_vs=summary.means['vs'],
+                high_pps=entries[summary.high['pps']],
+                high_apm=entries[summary.high['apm']],
+                high_vs=entries[summary.high['vs']],
+                stats=stats,
+            )
+        )
+    return fields
@@ -1,12 +1,8 @@
-from datetime import timedelta
-
 from arclet.alconna import Arg
 from nonebot_plugin_alconna import Option, Subcommand, UniMessage
 from nonebot_plugin_orm import get_session
 from nonebot_plugin_uninfo import Uninfo
 from nonebot_plugin_uninfo.orm import get_session_persist_id
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
 
 from ....db import trigger
 from ....utils.lang import get_lang
@@ -22,6 +18,7 @@ from ..constant import GAME_TYPE
 from ..models import TETRIOLeagueStats
 from ..typedefs import Template
 from . import command
+from .data import get_latest_and_compare
 
 command.add(
     Subcommand(
@@ -42,51 +39,7 @@ async def _(event_session: Uninfo, template: Template | None = None):
         command_args=['--all'] + ([f'--template {template}'] if template is not None else []),
     ):
         async with get_session() as session:
-            # 获取最新记录
-            latest_data = (
-                await session.scalars(
-                    select(TETRIOLeagueStats)
-                    .order_by(TETRIOLeagueStats.id.desc())
-                    .limit(1)
-                    .options(selectinload(TETRIOLeagueStats.fields))
-                )
-            ).one()
-
-            # 计算目标时间点 (24小时前)
-            target_time = latest_data.update_time - timedelta(hours=24)
-
-            # 查询目标时间点之前的最近记录
-            before = (
-                await session.scalar(
-                    select(TETRIOLeagueStats)
-                    .where(TETRIOLeagueStats.update_time <= target_time)
-                    .order_by(TETRIOLeagueStats.update_time.desc())
-                    .limit(1)
-                    .options(selectinload(TETRIOLeagueStats.fields))
-                )
-                or latest_data
-            )
-
-            # 查询目标时间点之后的最近记录
-            after = (
-                await session.scalar(
-                    select(TETRIOLeagueStats)
-                    .where(TETRIOLeagueStats.update_time >= target_time)  # 使用 >= 避免间隙
-                    .order_by(TETRIOLeagueStats.update_time.asc())
-                    .limit(1)
-                    .options(selectinload(TETRIOLeagueStats.fields))
-                )
-                or latest_data
-            )
-
-            # 确定最接近的记录
-            compare_data = (
-                before
-                if abs((target_time - before.update_time).total_seconds())
-                < abs((target_time - after.update_time).total_seconds())
-                else after
-            )
-
+            latest_data, compare_data = await get_latest_and_compare(session)
         match template:
             case 'v1' | None:
                 await UniMessage.image(raw=await make_image_v1(latest_data, compare_data)).finish()
@@ -110,7 +63,9 @@ def _rank_sort_key(rank: str) -> int:
         raise ValueError(msg) from e
 
 
-async def make_image_v1(latest_data: TETRIOLeagueStats, compare_data: TETRIOLeagueStats) -> bytes:
+async def make_image_v1(
+    latest_data: TETRIOLeagueStats, compare_data: TETRIOLeagueStats, ttl: float | None = None
+) -> bytes:
     return await render_image(
         DataV1(
             items={
@@ -128,10 +83,13 @@ async def make_image_v1(latest_data: TETRIOLeagueStats, compare_data: TETRIOLeag
             updated_at=latest_data.update_time,
             lang=get_lang(),
         ),
+        ttl=ttl,
     )
 
 
-async def make_image_v2(latest_data: TETRIOLeagueStats, compare_data: TETRIOLeagueStats) -> bytes:
+async def make_image_v2(
+    latest_data: TETRIOLeagueStats, compare_data: TETRIOLeagueStats, ttl: float | None = None
+) -> bytes:
     return await render_image(
         DataV2(
             items={
@@ -156,4 +114,5 @@ async def make_image_v2(latest_data: TETRIOLeagueStats, compare_data: TETRIOLeag
             updated_at=latest_data.update_time,
             lang=get_lang(),
         ),
+        ttl=ttl,
     )
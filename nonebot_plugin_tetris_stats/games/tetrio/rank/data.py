@@ -0,0 +1,74 @@
+from collections.abc import Iterable
+from datetime import timedelta
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from ..models import TETRIOLeagueStats, TETRIOUserUniqueIdentifier
+
+CHUNK_SIZE = 500
+
+
+async def get_latest_and_compare(session: AsyncSession) -> tuple[TETRIOLeagueStats, TETRIOLeagueStats]:
+    """获取最新的段位统计, 以及最接近其 24 小时前的段位统计用于对比"""
+    # 获取最新记录
+    latest_data = (
+        await session.scalars(
+            select(TETRIOLeagueStats)
+            .where(TETRIOLeagueStats.fields.any())  # 跳过还没有抓取完成的统计
+            .order_by(TETRIOLeagueStats.id.desc())
+            .limit(1)
+            .options(selectinload(TETRIOLeagueStats.fields))
+        )
+    ).one()
+
+    # 计算目标时间点 (24小时前)
+    target_time = latest_data.update_time - timedelta(hours=24)
+
+    # 查询目标时间点之前的最近记录
+    before = (
+        await session.scalar(
+            select(TETRIOLeagueStats)
+            .where(TETRIOLeagueStats.fields.any(), TETRIOLeagueStats.update_time <= target_time)
+            .order_by(TETRIOLeagueStats.update_time.desc())
+            .limit(1)
+            .options(selectinload(TETRIOLeagueStats.fields))
+        )
+        or latest_data  # 回退到最新记录
+    )
+
+    # 查询目标时间点之后的最近记录
+    after = (
+        await session.scalar(
+            select(TETRIOLeagueStats)
+            .where(TETRIOLeagueStats.fields.any(), TETRIOLeagueStats.update_time >= target_time)  # 使用 >= 避免间隙
+            .order_by(TETRIOLeagueStats.update_time.asc())
+            .limit(1)
+            .options(selectinload(TETRIOLeagueStats.fields))
+        )
+        or latest_data  # 回退到最新记录
+    )
+
+    # 确定最接近的记录
+    compare_data = (
+        before
+        if abs((target_time - before.update_time).total_seconds())
+        < abs((target_time - after.update_time).total_seconds())
+        else after
+    )
+    return latest_data, compare_data
+
+
+async def get_uid_mapping(session: AsyncSession, unique_identifiers: Iterable[str]) -> dict[str, int]:
+    """已经记录的玩家对应的 TETRIOUserUniqueIdentifier.id"""
+    ids = list(unique_identifiers)
+    mapping: dict[str, int] = {}
+    for i in range(0, len(ids), CHUNK_SIZE):
+        result = await session.execute(
+            select(TETRIOUserUniqueIdentifier.user_unique_identifier, TETRIOUserUniqueIdentifier.id).where(
+                TETRIOUserUniqueIdentifier.user_unique_identifier.in_(ids[i : i + CHUNK_SIZE])
+            )
+        )
+        mapping.update(result.tuples().all())
+    return mapping
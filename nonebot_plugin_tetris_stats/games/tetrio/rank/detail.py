@@ -1,4 +1,4 @@
-from datetime import timedelta, timezone
+from datetime import timezone
 from zoneinfo import ZoneInfo
 
 from arclet.alconna import Arg
@@ -7,8 +7,6 @@ from nonebot_plugin_alconna import Subcommand, UniMessage
 from nonebot_plugin_orm import get_session
 from nonebot_plugin_uninfo import Uninfo
 from nonebot_plugin_uninfo.orm import get_session_persist_id
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
 
 from ....db import trigger
 from ....utils.lang import get_lang
@@ -20,6 +18,7 @@ from ..api.typedefs import ValidRank
 from ..constant import GAME_TYPE
 from ..models import TETRIOLeagueStats
 from . import command
+from .data import get_latest_and_compare
 
 UTC = timezone.utc
 
@@ -45,50 +44,7 @@ async def _(rank: ValidRank, event_session: Uninfo):
         command_args=[f'--detail {rank}'],
     ):
         async with get_session() as session:
-            # 获取最新记录
-            latest_data = (
-                await session.scalars(
-                    select(TETRIOLeagueStats)
-                    .order_by(TETRIOLeagueStats.id.desc())
-                    .limit(1)
-                    .options(selectinload(TETRIOLeagueStats.fields))
-                )
-            ).one()
-
-            # 计算目标时间点 (24小时前)
-            target_time = latest_data.update_time - timedelta(hours=24)
-
-            # 查询目标时间点之前的最近记录
-            before = (
-                await session.scalar(
-                    select(TETRIOLeagueStats)
-                    .where(TETRIOLeagueStats.update_time <= target_time)
-                    .order_by(TETRIOLeagueStats.update_time.desc())
-                    .limit(1)
-                    .options(selectinload(TETRIOLeagueStats.fields))
-                )
-                or latest_data  # 回退到最新记录
-            )
-
-            # 查询目标时间点之后的最近记录
-            after = (
-                await session.scalar(
-                    select(TETRIOLeagueStats)
-                    .where(TETRIOLeagueStats.update_time >= target_time)
-                    .order_by(TETRIOLeagueStats.update_time.asc())
-                    .limit(1)
-                    .options(selectinload(TETRIOLeagueStats.fields))
-                )
-                or latest_data  # 回退到最新记录
-            )
-
-            # 确定最接近的记录
-            compare_data = (
-                before
-                if abs((target_time - before.update_time).total_seconds())
-                < abs((target_time - after.update_time).total_seconds())
-                else after
-            )
+            latest_data, compare_data = await get_latest_and_compare(session)
         await UniMessage.image(
             raw=await make_image(
                 rank,
@@ -98,7 +54,9 @@ async def _(rank: ValidRank, event_session: Uninfo):
         ).finish()
 
 
-async def make_image(rank: ValidRank, latest: TETRIOLeagueStats, compare: TETRIOLeagueStats) -> bytes:
+async def make_image(
+    rank: ValidRank, latest: TETRIOLeagueStats, compare: TETRIOLeagueStats, ttl: float | None = None
+) -> bytes:
     latest_data = next(filter(lambda x: x.rank == rank, latest.fields))
     compare_data = next(filter(lambda x: x.rank == rank, compare.fields))
     avg = get_metrics(pps=latest_data.avg_pps, apm=latest_data.avg_apm, vs=latest_data.avg_vs)
@@ -152,4 +110,5 @@ async def make_image(rank: ValidRank, latest: TETRIOLeagueStats, compare: TETRIO
             updated_at=latest.update_time.astimezone(ZoneInfo('Asia/Shanghai')),
             lang=get_lang(),
         ),
+        ttl=ttl,
     )
@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta
+
+from nonebot.log import logger
+from nonebot_plugin_orm import AsyncSession, get_session
+from sqlalchemy import Text, cast, delete, func, select
+
+from ....config.config import config
+from ....db.retention import Downsampler, TableReport, compactor, delete_in, full_cutoff, measure
+from ..models import (
+    TETRIOLeagueEntry,
+    TETRIOLeagueHistorical,
+    TETRIOLeagueSnapshot,
+    TETRIOLeagueStats,
+    TETRIOLeagueStatsField,
+)
+from ..snapshot import SnapshotBuilder
+from .data import get_uid_mapping
+
+
+@compactor
+async def compact_league(now: datetime, *, dry_run: bool) -> list[TableReport]:
+    """段位统计的降采样
+
+    被降采样掉的抓取会连同统计, 快照, 玩家数值与原始数据一起删除
+    保留下来的抓取在确认有快照后删除原始的 JSON 页面
+    """
+    sampler = Downsampler(now)
+    dropped: list[int] = []
+    kept: dict[int, datetime] = {}
+    async with get_session() as session:
+        for stats_id, update_time, finished in await session.execute(
+            select(TETRIOLeagueStats.id, TETRIOLeagueStats.update_time, TETRIOLeagueStats.fields.any())
+            .where(TETRIOLeagueStats.update_time < full_cutoff(now))
+            .order_by(TETRIOLeagueStats.update_time.desc(), TETRIOLeagueStats.id.desc())
+        ):
+            # 超过保留期仍未完成的抓取已经不会再继续
+            if not finished or sampler.drop(None, update_time):
+                dropped.append(stats_id)
+            else:
+                kept[stats_id] = update_time
+        # 试运行时假设所有保留下来的抓取都能生成快照
+        compacted = [i for i, update_time in kept.items() if dry_run or await ensure_snapshot(session, i, update_time)]
+        reports = [
+            TableReport(
+                TETRIOLeagueHistorical.__tablename__,
+                *await measure(
+                    session,
+                    TETRIOLeagueHistorical.stats_id,
+                    dropped + compacted,
+                    func.length(cast(TETRIOLeagueHistorical.data, Text)),
+                ),
+            ),
+            TableReport(
+                TETRIOLeagueEntry.__tablename__,
+                *await measure(session, TETRIOLeagueEntry.stats_id, dropped, None),
+            ),
+            TableReport(
+                TETRIOLeagueStatsField.__tablename__,
+                *await measure(session, TETRIOLeagueStatsField.stats_id, dropped, None),
+            ),
+            TableReport(
+                TETRIOLeagueSnapshot.__tablename__,
+                *await measure(session, TETRIOLeagueSnapshot.stats_id, dropped, func.length(TETRIOLeagueSnapshot.data)),
+            ),
+            TableReport(TETRIOLeagueStats.__tablename__, len(dropped), 0),
+        ]
+        if not dry_run:
+            await delete_in(session, TETRIOLeagueHistorical.stats_id, dropped + compacted)
+            await delete_in(session, TETRIOLeagueEntry.stats_id, dropped)
+            await delete_in(session, TETRIOLeagueStatsField.stats_id, dropped)
+            await delete_in(session, TETRIOLeagueSnapshot.stats_id, dropped)
+            await delete_in(session, TETRIOLeagueStats.id, dropped)
+            await session.commit()
+    return reports
+
+
+async def ensure_snapshot(session: AsyncSession, stats_id: int, update_time: datetime) -> bool:
+    """确保抓取有快照, 旧的抓取会从原始页面生成, 无法生成时返回 False"""
+    if await session.scalar(select(TETRIOLeagueSnapshot.id).where(TETRIOLeagueSnapshot.stats_id == stats_id)):
+        return True
+    builder = SnapshotBuilder()
+    page_ids = (
+        await session.scalars(
+            select(TETRIOLeagueHistorical.id)
+            .where(TETRIOLeagueHistorical.stats_id == stats_id)
+            .order_by(TETRIOLeagueHistorical.id)
+        )
+    ).all()
+    # 逐页读取, 每一页都需要查询玩家 id, 不能在流式读取的过程中执行
+    for page_id in page_ids:
+        page = await session.get_one(TETRIOLeagueHistorical, page_id)
+        entries = page.data.data.entries
+        uid_mapping = await get_uid_mapping(session, {i.id for i in entries})
+        if len(uid_mapping) != len({i.id for i in entries}):
+            logger.warning(f'段位统计 {stats_id} 中有未记录的玩家, 跳过压缩')
+            return False
+        builder.add_page(page.data, [uid_mapping[i.id] for i in entries])
+        session.expunge(page)
+    if not builder:
+        return False
+    session.add(
+        TETRIOLeagueSnapshot(
+            stats_id=stats_id, player_count=len(builder), data=builder.to_bytes(), update_time=update_time
+        )
+    )
+    return True
+
+
+async def prune_league_entries(session: AsyncSession, now: datetime) -> None:
+    """删除超过 league_entry_days 天的玩家数值, 只删除已经有快照的抓取, 更早的数据从快照中查询
+
+    与降采样不同, 这一步不受 retention.enabled 控制
+    """
+    await session.execute(
+        delete(TETRIOLeagueEntry).where(
+            TETRIOLeagueEntry.update_time < now - timedelta(days=config.tetris.league_entry_days),
+            TETRIOLeagueEntry.stats_id.in_(select(TETRIOLeagueSnapshot.stats_id)),
+        ),
+        execution_options={'synchronize_session': False},
+    )
+
+
+async def prune_league_pages(session: AsyncSession) -> None:
+    """删除已经有快照的抓取的原始页面, 只有未完成的抓取需要保留页面用于继续抓取"""
+    await session.execute(
+        delete(TETRIOLeagueHistorical).where(
+            TETRIOLeagueHistorical.stats_id.in_(select(TETRIOLeagueSnapshot.stats_id))
+        ),
+        execution_options={'synchronize_session': False},
+    )
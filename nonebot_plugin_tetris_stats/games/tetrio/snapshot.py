@@ -0,0 +1,115 @@
+"""段位排行榜快照的紧凑二进制格式
+
+一次抓取的所有玩家保存为一个 zlib 压缩的 blob, 解压后的布局为:
+
+    header: magic (4s) version (H) padding (2x) count (Q)
+    tr / glicko / rd / pps / apm / vs: 各 count 个 double
+    uid: count 个 uint32 (TETRIOUserUniqueIdentifier.id, 升序)
+    rank: count 个 int8 (RANK_CODES)
+
+所有列都按 uid 升序排列并自然对齐, 解压后通过 memoryview.cast 直接读取, 不需要额外复制或解析
+"""
+
+from array import array
+from bisect import bisect_left
+from collections.abc import Sequence
+from math import nan
+from struct import Struct
+from typing import Literal, NamedTuple
+from zlib import compress, decompress
+
+from .api.schemas.leaderboards.by import BySuccessModel
+from .api.typedefs import Rank
+from .constant import RANK_CODES
+
+Column = Literal['tr', 'glicko', 'rd', 'pps', 'apm', 'vs']
+
+COLUMNS: tuple[Column, ...] = ('tr', 'glicko', 'rd', 'pps', 'apm', 'vs')
+
+HEADER = Struct('<4sHxxQ')
+MAGIC = b'TLSN'
+VERSION = 1
+
+RANKS: tuple[Rank, ...] = tuple(RANK_CODES)
+
+
+class SnapshotRow(NamedTuple):
+    uid_id: int
+    tr: float
+    glicko: float
+    rd: float
+    pps: float
+    apm: float
+    vs: float
+    rank: Rank
+
+
+class SnapshotBuilder:
+    """逐页收集排行榜数据, 最后编码为快照"""
+
+    def __init__(self) -> None:
+        self.columns: dict[Column, array[float]] = {column: array('d') for column in COLUMNS}
+        self.uid_ids = array('I')
+        self.rank_codes = array('b')
+
+    def __len__(self) -> int:
+        return len(self.uid_ids)
+
+    def add_page(self, model: BySuccessModel, uid_ids: Sequence[int]) -> None:
+        """uid_ids 为这一页每个玩家对应的 TETRIOUserUniqueIdentifier.id, 顺序与 entries 一致"""
+        for entry, uid_id in zip(model.data.entries, uid_ids, strict=True):
+            league = entry.league
+            for column in COLUMNS:
+                value = getattr(league, column)
+                self.columns[column].append(nan if value is None else value)
+            self.uid_ids.append(uid_id)
+            self.rank_codes.append(RANK_CODES[league.rank])
+
+    def to_bytes(self, level: int = 6) -> bytes:
+        order = sorted(range(len(self)), key=self.uid_ids.__getitem__)
+        parts = [HEADER.pack(MAGIC, VERSION, len(order))]
+        parts.extend(array('d', (values[i] for i in order)).tobytes() for values in self.columns.values())
+        parts.append(array('I', (self.uid_ids[i] for i in order)).tobytes())
+        parts.append(array('b', (self.rank_codes[i] for i in order)).tobytes())
+        return compress(b''.join(parts), level)
+
+
+class LeagueSnapshot:
+    """只读的排行榜快照, 各列均为指向解压后数据的 memoryview"""
+
+    def __init__(self, data: bytes) -> None:
+        buffer = memoryview(decompress(data))
+        magic, version, count = HEADER.unpack_from(buffer)
+        if magic != MAGIC or version != VERSION:
+            msg = f'不支持的快照格式: {magic!r} v{version}'
+            raise ValueError(msg)
+        offset = HEADER.size
+        self.columns: dict[Column, memoryview] = {}
+        for column in COLUMNS:
+            self.columns[column] = buffer[offset : offset + count * 8].cast('d')
+            offset += count * 8
+        self.uid_ids = buffer[offset : offset + count * 4].cast('I')
+        offset += count * 4
+        self.rank_codes = buffer[offset : offset + count].cast('b')
+        if offset + count != len(buffer):
+            msg = '快照数据长度不正确'
+            raise ValueError(msg)
+
+    def __len__(self) -> int:
+        return len(self.uid_ids)
+
+    def index(self, uid_id: int) -> int | None:
+        index = bisect_left(self.uid_ids, uid_id)
+        if index < len(self) and self.uid_ids[index] == uid_id:
+            return index
+        return None
+
+    def row(self, index: int) -> SnapshotRow:
+        return SnapshotRow(
+            self.uid_ids[index],
+            *(self.columns[column][index] for column in COLUMNS),
+            rank=RANKS[self.rank_codes[index]],
+        )
+
+    def get(self, uid_id: int) -> SnapshotRow | None:
+        return None if (index := self.index(uid_id)) is None else self.row(index)
@@ -2,7 +2,7 @@ from datetime import datetime
 from typing import Literal
 
 from nonebot_plugin_orm import Model
-from sqlalchemy import String
+from sqlalchemy import Index, String
 from sqlalchemy.orm import Mapped, MappedAsDataclass, mapped_column
 
 from ....db.models import PydanticType
@@ -12,9 +12,11 @@ from .schemas.user_profile import UserProfile
 
 class TOPHistoricalData(MappedAsDataclass, Model):
     __tablename__ = 'nb_t_top_hist_data'
+    __table_args__ = (Index('ix_nb_t_top_hist_data_lookup', 'user_unique_identifier', 'api_type', 'update_time'),)
 
     id: Mapped[int] = mapped_column(init=False, primary_key=True)
     user_unique_identifier: Mapped[str] = mapped_column(String(24), index=True)
     api_type: Mapped[Literal['User Profile']] = mapped_column(String(16), index=True)
     data: Mapped[UserProfile] = mapped_column(PydanticType(get_model=[], models={UserProfile}))
     update_time: Mapped[datetime] = mapped_column(UTCDateTime(), index=True)
+    content_hash: Mapped[str | None] = mapped_column(String(64), nullable=True, default=None)
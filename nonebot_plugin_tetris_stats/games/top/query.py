@@ -9,9 +9,8 @@ from nonebot_plugin_uninfo import Uninfo
 from nonebot_plugin_uninfo.orm import get_session_persist_id
 from nonebot_plugin_user import User as NBUser
 from nonebot_plugin_user import get_user
-from sqlalchemy import select
 
-from ...db import query_bind_info, resolve_compare_delta, trigger
+from ...db import get_nearest_data, query_bind_info, resolve_compare_delta, trigger
 from ...i18n import Lang
 from ...utils.exception import FallbackError
 from ...utils.lang import get_lang
@@ -21,7 +20,6 @@ from ...utils.render.avatar import get_avatar
 from ...utils.render.schemas.base import People, Trending
 from ...utils.render.schemas.v1.top.info import Data as InfoData
 from ...utils.render.schemas.v1.top.info import Info
-from ...utils.timezone import ensure_utc_datetime
 from ...utils.typedefs import Me
 from . import alc
 from .api import Player
@@ -34,39 +32,8 @@ UTC = timezone.utc
 
 
 async def get_compare_profile(session: AsyncSession, user_name: str, target_time: datetime) -> UserProfile | None:
-    target_time = ensure_utc_datetime(target_time)
-    before = await session.scalar(
-        select(TOPHistoricalData)
-        .where(
-            TOPHistoricalData.user_unique_identifier == user_name,
-            TOPHistoricalData.api_type == 'User Profile',
-            TOPHistoricalData.update_time <= target_time,
-        )
-        .order_by(TOPHistoricalData.update_time.desc())
-        .limit(1)
-    )
-    after = await session.scalar(
-        select(TOPHistoricalData)
-        .where(
-            TOPHistoricalData.user_unique_identifier == user_name,
-            TOPHistoricalData.api_type == 'User Profile',
-            TOPHistoricalData.update_time >= target_time,
-        )
-        .order_by(TOPHistoricalData.update_time.asc())
-        .limit(1)
-    )
-    if before is None:
-        selected = after
-    elif after is None:
-        selected = before
-    else:
-        selected = (
-            before
-            if abs((target_time - before.update_time).total_seconds())
-            <= abs((target_time - after.update_time).total_seconds())
-            else after
-        )
-    if selected is None or not isinstance(selected.data, UserProfile):
+    nearest = await get_nearest_data(session, TOPHistoricalData, user_name, 'User Profile', target_time)
+    if nearest is None or not isinstance((selected := nearest[0]).data, UserProfile):
         return None
     return selected.data
 
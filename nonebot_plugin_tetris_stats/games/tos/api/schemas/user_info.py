@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Literal
+from typing import ClassVar, Literal
 
 from pydantic import BaseModel, Field
 
@@ -75,6 +75,8 @@ class Data(BaseModel):
 
 
 class UserInfoSuccess(BaseModel):
+    __type_key__: ClassVar[str] = 'tos.user_info'
+
     code: int
     success: Literal[True]
     data: Data
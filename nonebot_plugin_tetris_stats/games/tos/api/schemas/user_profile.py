@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Literal
+from typing import ClassVar, Literal
 
 from pydantic import BaseModel
 
@@ -29,6 +29,8 @@ class Data(BaseModel):
 
 
 class UserProfile(BaseModel):
+    __type_key__: ClassVar[str] = 'tos.user_profile'
+
     code: int
     success: bool
     data: list[Data]
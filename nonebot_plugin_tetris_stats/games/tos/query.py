@@ -16,7 +16,8 @@ from nonebot_plugin_user import User as NBUser
 from nonebot_plugin_user import get_user
 from sqlalchemy import select
 
-from ...db import query_bind_info, resolve_compare_delta, trigger
+from ...db import HistoricalQueue, get_nearest_data, query_bind_info, resolve_compare_delta, trigger
+from ...db.models import project
 from ...i18n import Lang
 from ...utils.chart import get_split, get_value_bounds, handle_history_data
 from ...utils.exception import FallbackError, RequestError
@@ -276,49 +277,26 @@ async def get_game_data(player: Player, query_num: int = 50) -> GameData | None:
 async def get_compare_profile(
     session: AsyncSession, unique_identifier: str, target_time: datetime
 ) -> UserProfile | None:
-    target_time = ensure_utc_datetime(target_time)
-    before = await session.scalar(
-        select(TOSHistoricalData)
-        .where(
-            TOSHistoricalData.user_unique_identifier == unique_identifier,
-            TOSHistoricalData.api_type == 'User Profile',
-            TOSHistoricalData.update_time <= target_time,
-        )
-        .order_by(TOSHistoricalData.update_time.desc())
-        .limit(1)
-    )
-    after = await session.scalar(
-        select(TOSHistoricalData)
-        .where(
-            TOSHistoricalData.user_unique_identifier == unique_identifier,
-            TOSHistoricalData.api_type == 'User Profile',
-            TOSHistoricalData.update_time >= target_time,
-        )
-        .order_by(TOSHistoricalData.update_time.asc())
-        .limit(1)
-    )
-    if before is None:
-        selected = after
-    elif after is None:
-        selected = before
-    else:
-        selected = (
-            before
-            if abs((target_time - before.update_time).total_seconds())
-            <= abs((target_time - after.update_time).total_seconds())
-            else after
-        )
-    if selected is None or not isinstance(selected.data, UserProfile):
+    nearest = await get_nearest_data(session, TOSHistoricalData, unique_identifier, 'User Profile', target_time)
+    if nearest is None or not isinstance((selected := nearest[0]).data, UserProfile):
         return None
     return selected.data
 
 
 @time_it
 async def get_historical_data(unique_identifier: str) -> list[HistoryData]:
+    await HistoricalQueue.flush()
     async with get_session() as session:
+        # 只需要 rating_now, 数据库支持时直接在查询中取出, 否则读取延迟验证的 data
+        rating_now = project(session.get_bind(TOSHistoricalData).dialect, TOSHistoricalData.data, 'data', 'ratingNow')
+        columns = (
+            TOSHistoricalData.id,
+            TOSHistoricalData.update_time,
+            TOSHistoricalData.data if rating_now is None else rating_now,
+        )
         user_infos = (
-            await session.scalars(
-                select(TOSHistoricalData)
+            await session.execute(
+                select(*columns)
                 .where(TOSHistoricalData.user_unique_identifier == unique_identifier)
                 .where(TOSHistoricalData.api_type == 'User Info')
                 .where(
@@ -333,9 +311,9 @@ async def get_historical_data(unique_identifier: str) -> list[HistoryData]:
         ).all()
         if user_infos:
             extra_info = (
-                await session.scalars(
-                    select(TOSHistoricalData)
-                    .where(TOSHistoricalData.id < user_infos[0].id)
+                await session.execute(
+                    select(*columns)
+                    .where(TOSHistoricalData.id < user_infos[0][0])
                     .where(TOSHistoricalData.user_unique_identifier == unique_identifier)
                     .where(TOSHistoricalData.api_type == 'User Info')
                     .limit(1)
@@ -343,11 +321,14 @@ async def get_historical_data(unique_identifier: str) -> list[HistoryData]:
             ).one_or_none()
             if extra_info is not None:
                 user_infos = [extra_info, *user_infos]
-    return [
-        HistoryData(score=float(i.data.data.rating_now), record_at=i.update_time.astimezone(ZoneInfo('Asia/Shanghai')))
-        for i in user_infos
-        if isinstance(i.data, UserInfoSuccess)
-    ]
+    histories: list[HistoryData] = []
+    for _, update_time, data in user_infos:
+        score = data.data.rating_now if isinstance(data, UserInfoSuccess) else data
+        if isinstance(score, str):
+            histories.append(
+                HistoryData(score=float(score), record_at=update_time.astimezone(ZoneInfo('Asia/Shanghai')))
+            )
+    return histories
 
 
 class Trends(NamedTuple):
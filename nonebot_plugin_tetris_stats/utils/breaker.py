@@ -0,0 +1,92 @@
+from time import monotonic
+from typing import NamedTuple
+
+from strenum import StrEnum
+
+
+class BreakerState(StrEnum):
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+
+class BreakerStats(NamedTuple):
+    state: BreakerState
+    failures: int
+    cooldown: float
+    retry_after: float
+
+
+class CircuitBreaker:
+    """熔断器
+
+    连续失败 failure_threshold 次后熔断 (open), 冷却 cooldown 秒后进入半开 (half-open) 状态并只放行一个探测请求
+    探测成功则恢复 (closed), 失败则再次熔断且冷却时间翻倍, 最多 max_cooldown 秒
+    """
+
+    def __init__(self, failure_threshold: int, cooldown: float, max_cooldown: float) -> None:
+        if failure_threshold < 1 or cooldown <= 0 or max_cooldown < cooldown:
+            msg = 'failure_threshold 必须大于等于 1, cooldown 必须大于 0, max_cooldown 必须大于等于 cooldown'
+            raise ValueError(msg)
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._state = BreakerState.CLOSED
+        self._failures = 0
+        self._cooldown = cooldown
+        self._opened_until = 0.0
+        self._probing = False
+
+    @property
+    def state(self) -> BreakerState:
+        if self._state == BreakerState.OPEN and monotonic() >= self._opened_until:
+            return BreakerState.HALF_OPEN
+        return self._state
+
+    @property
+    def available(self) -> bool:
+        """是否可能放行请求, 不会改变熔断器状态"""
+        state = self.state
+        return state == BreakerState.CLOSED or (state == BreakerState.HALF_OPEN and not self._probing)
+
+    def allow(self) -> bool:
+        """判断是否放行请求, 放行后必须调用 record_success / record_failure / release 之一"""
+        if not self.available:
+            return False
+        if (state := self.state) != self._state:
+            self._state = state
+        if self._state == BreakerState.HALF_OPEN:
+            self._probing = True
+        return True
+
+    def record_success(self) -> None:
+        self._state = BreakerState.CLOSED
+        self._failures = 0
+        self._cooldown = self.base_cooldown
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._state == BreakerState.HALF_OPEN:
+            self._cooldown = min(self._cooldown * 2, self.max_cooldown)
+            self._open()
+        elif self._state == BreakerState.CLOSED and self._failures >= self.failure_threshold:
+            self._open()
+
+    def release(self) -> None:
+        """请求没有得出结果 (例如被取消) 时释放探测名额"""
+        self._probing = False
+
+    @property
+    def stats(self) -> BreakerStats:
+        return BreakerStats(
+            state=self.state,
+            failures=self._failures,
+            cooldown=self._cooldown,
+            retry_after=max(0.0, self._opened_until - monotonic()) if self._state == BreakerState.OPEN else 0.0,
+        )
+
+    def _open(self) -> None:
+        self._state = BreakerState.OPEN
+        self._opened_until = monotonic() + self._cooldown
+        self._probing = False
@@ -8,7 +8,7 @@ from typing import Any, ClassVar
 from nonebot import get_driver
 from nonebot.log import logger
 from playwright.__main__ import main
-from playwright.async_api import Browser, BrowserContext, async_playwright
+from playwright.async_api import Browser, BrowserContext, Playwright, async_playwright
 
 from ..config.config import config
 
@@ -30,7 +30,9 @@ async def _():
 class BrowserManager:
     """浏览器管理类"""
 
+    _playwright: Playwright | None = None
     _browser: Browser | None = None
+    _browsers: ClassVar[list[Browser]] = []
     _contexts: ClassVar[dict[str, BrowserContext]] = {}
 
     @classmethod
@@ -74,17 +76,29 @@ class BrowserManager:
         return True
 
     @classmethod
-    async def _start_browser(cls) -> Browser:
-        """启动浏览器实例"""
-        playwright = await async_playwright().start()
-        cls._browser = await playwright.firefox.launch(
+    async def _launch_browser(cls) -> Browser:
+        if cls._playwright is None:
+            cls._playwright = await async_playwright().start()
+        return await cls._playwright.firefox.launch(
             headless=not config.tetris.dev.enabled,
             firefox_user_prefs={
                 'network.http.max-persistent-connections-per-server': 64,
             },
         )
+
+    @classmethod
+    async def _start_browser(cls) -> Browser:
+        """启动浏览器实例"""
+        cls._browser = await cls._launch_browser()
         return cls._browser
 
+    @classmethod
+    async def new_browser(cls) -> Browser:
+        """启动一个额外的浏览器实例, 会在关闭浏览器时一并关闭"""
+        browser = await cls._launch_browser()
+        cls._browsers.append(browser)
+        return browser
+
     @classmethod
     async def get_browser(cls) -> Browser:
         """获取浏览器实例"""
@@ -113,5 +127,7 @@ class BrowserManager:
         """关闭浏览器实例"""
         for i in cls._contexts.values():
             await i.close()
+        for i in cls._browsers:
+            await i.close()
         if isinstance(cls._browser, Browser):
             await cls._browser.close()
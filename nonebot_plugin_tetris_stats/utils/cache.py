@@ -0,0 +1,237 @@
+from collections import OrderedDict
+from collections.abc import Hashable
+from contextlib import suppress
+from datetime import datetime, timezone
+from hashlib import sha256
+from pathlib import Path
+from sys import getsizeof
+from time import monotonic, time
+from typing import Generic, NamedTuple, TypeVar
+from uuid import uuid4
+
+from aiofiles import open as aopen
+from aiofiles import os as aos
+from msgspec import DecodeError, Struct, msgpack
+from nonebot.log import logger
+from pydantic import BaseModel
+
+UTC = timezone.utc
+
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
+
+TEMP_FILE_MAX_AGE = 60 * 60
+"""atomic_write 遗留的临时文件在此秒数后才会被 purge 清除, 避免删除正在写入的文件"""
+
+
+async def atomic_write(path: Path, data: bytes) -> None:
+    """先写临时文件再原子替换, 并发读取 (包括其他进程) 永远不会读到写了一半的文件"""
+    temp_path = path.with_name(f'{path.name}.{uuid4().hex}.tmp')
+    await aos.makedirs(path.parent, exist_ok=True)
+    try:
+        async with aopen(temp_path, 'wb') as file:
+            await file.write(data)
+        await aos.replace(temp_path, path)
+    except OSError:
+        with suppress(FileNotFoundError):
+            await aos.remove(temp_path)
+        raise
+
+
+class CacheEntry(Struct):
+    data: bytes
+    expires_at: datetime
+
+    @property
+    def ttl(self) -> float:
+        """剩余有效时间 (秒)"""
+        return (self.expires_at - datetime.now(UTC)).total_seconds()
+
+    @property
+    def expired(self) -> bool:
+        return self.ttl <= 0
+
+
+class DiskCache:
+    """以 key 的 sha256 作为文件名的持久化缓存
+
+    写入通过 atomic_write 完成, 并发读取 (包括其他进程) 永远不会读到写了一半的文件
+    过期后的 grace 秒内条目仍会被保留并返回, 由调用方通过 CacheEntry.expired 判断是否过期
+    """
+
+    encoder = msgpack.Encoder()
+    decoder = msgpack.Decoder(type=CacheEntry)
+
+    def __init__(self, path: Path, grace: float = 0) -> None:
+        self.path = path
+        self.grace = grace
+
+    def _get_path(self, key: str) -> Path:
+        digest = sha256(key.encode()).hexdigest()
+        return self.path / digest[:2] / digest
+
+    async def get(self, key: str) -> CacheEntry | None:
+        path = self._get_path(key)
+        try:
+            async with aopen(path, 'rb') as file:
+                entry = self.decoder.decode(await file.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, DecodeError):
+            logger.warning(f'缓存文件 {path} 损坏, 已删除')
+            await self._remove(path)
+            return None
+        if entry.ttl + self.grace <= 0:
+            await self._remove(path)
+            return None
+        return entry
+
+    async def set(self, key: str, entry: CacheEntry) -> None:
+        await atomic_write(self._get_path(key), self.encoder.encode(entry))
+
+    async def delete(self, key: str) -> None:
+        await self._remove(self._get_path(key))
+
+    def purge(self) -> int:
+        """清除所有已过期或损坏的缓存文件以及遗留的临时文件, 返回清除的文件数量
+
+        会阻塞, 请在线程中调用
+        """
+        count = 0
+        if not self.path.is_dir():
+            return count
+        for path in self.path.glob('*/*'):
+            try:
+                if path.suffix == '.tmp':
+                    if time() - path.stat().st_mtime < TEMP_FILE_MAX_AGE:
+                        continue
+                elif self.decoder.decode(path.read_bytes()).ttl + self.grace > 0:
+                    continue
+            except FileNotFoundError:
+                continue
+            except (OSError, DecodeError):
+                ...
+            with suppress(FileNotFoundError):
+                path.unlink()
+                count += 1
+        return count
+
+    @staticmethod
+    async def _remove(path: Path) -> None:
+        with suppress(FileNotFoundError):
+            await aos.remove(path)
+
+
+def estimate_size(value: object) -> int:
+    """估算对象在内存中占用的字节数
+
+    递归计算容器与 Pydantic 模型中的所有对象, 被多处引用的对象只计算一次
+    """
+    seen: set[int] = set()
+    stack = [value]
+    size = 0
+    while stack:
+        if id(obj := stack.pop()) in seen:
+            continue
+        seen.add(id(obj))
+        size += getsizeof(obj)
+        if isinstance(obj, BaseModel):
+            stack.append(obj.__dict__)
+        elif isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, list | tuple | set | frozenset):
+            stack.extend(obj)
+    return size
+
+
+class CacheStats(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    count: int
+    size: int
+    max_size: int
+
+
+class _MemoryEntry(Struct, Generic[V]):
+    value: V
+    size: int
+    expires_at: float
+    stale_until: float
+
+
+class MemoryCache(Generic[K, V]):
+    """按字节预算淘汰的 LRU 内存缓存
+
+    每个条目的大小由调用方给出, 超出 max_size 时淘汰最久未使用的条目
+    过期后的 grace 秒内条目不会被 get 返回, 但仍可以通过 get_stale 取得
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._entries: OrderedDict[K, _MemoryEntry[V]] = OrderedDict()
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key: K) -> V | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self._misses += 1
+            return None
+        if entry.expires_at <= (now := monotonic()):
+            if entry.stale_until <= now:
+                self._pop(key)
+            self._misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return entry.value
+
+    def get_stale(self, key: K) -> V | None:
+        """获取已过期但仍在 grace 内的条目"""
+        entry = self._entries.get(key)
+        if entry is None or entry.stale_until <= monotonic():
+            return None
+        self._entries.move_to_end(key)
+        return entry.value
+
+    def set(self, key: K, value: V, *, size: int, ttl: float, grace: float = 0) -> None:
+        self._pop(key)
+        if ttl + grace <= 0 or size > self.max_size:
+            return
+        expires_at = monotonic() + ttl
+        self._entries[key] = _MemoryEntry(value, size, expires_at, expires_at + grace)
+        self._size += size
+        while self._size > self.max_size:
+            _, entry = self._entries.popitem(last=False)
+            self._size -= entry.size
+            self._evictions += 1
+
+    def delete(self, key: K) -> None:
+        self._pop(key)
+
+    def purge(self) -> int:
+        """清除所有已过期且超出 grace 的条目, 返回清除的条目数量"""
+        now = monotonic()
+        expired = [key for key, entry in self._entries.items() if entry.stale_until <= now]
+        for key in expired:
+            self._pop(key)
+        return len(expired)
+
+    @property
+    def stats(self) -> CacheStats:
+        return CacheStats(
+            hits=self._hits,
+            misses=self._misses,
+            evictions=self._evictions,
+            count=len(self._entries),
+            size=self._size,
+            max_size=self.max_size,
+        )
+
+    def _pop(self, key: K) -> None:
+        if (entry := self._entries.pop(key, None)) is not None:
+            self._size -= entry.size
@@ -28,6 +28,21 @@ class RequestError(NeedCatchError):
         self.status_code = status_code
 
 
+class CircuitOpenError(RequestError):
+    """目标 host 已熔断, 请求没有被发出
+
+    retry_after 为距离熔断结束的秒数, 半开状态下其他请求正在探测时为 0
+    """
+
+    def __init__(self, message: str = '', *, retry_after: float = 0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RenderQueueFullError(NeedCatchError):
+    """等待渲染的请求过多"""
+
+
 class MessageFormatError(NeedCatchError):
     """用户发送的消息格式不正确"""
 
@@ -1,35 +1,99 @@
-from asyncio import Lock, sleep
-from collections.abc import Callable, Coroutine
-from datetime import timedelta
-from functools import wraps
-from time import time
-from typing import Any, ParamSpec, TypeVar
+from asyncio import CancelledError, Future, TimerHandle, get_running_loop
+from enum import IntEnum
+from heapq import heappop, heappush
+from itertools import count
+from time import monotonic
+from typing import NamedTuple
 
-from nonebot.log import logger
 
-P = ParamSpec('P')
-T = TypeVar('T')
+class Priority(IntEnum):
+    """请求优先级, 值越小越先被放行"""
 
+    INTERACTIVE = 0
+    BACKGROUND = 1
 
-def limit(limit: timedelta) -> Callable[[Callable[P, Coroutine[Any, Any, T]]], Callable[P, Coroutine[Any, Any, T]]]:
-    limit_seconds = limit.total_seconds()
 
-    def decorator(func: Callable[P, Coroutine[Any, Any, T]]) -> Callable[P, Coroutine[Any, Any, T]]:
-        last_call = 0.0
-        lock = Lock()
+class LimiterStats(NamedTuple):
+    acquired: int
+    queue_depth: int
+    total_wait: float
+    max_wait: float
 
-        @wraps(func)
-        async def wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
-            nonlocal last_call
-            async with lock:
-                if (diff := (time() - last_call)) < limit_seconds:
-                    logger.debug(
-                        f'func: {func.__name__} trigger limit, wait {(limit_time := limit_seconds - diff):.3f}s'
-                    )
-                    await sleep(limit_time)
-            last_call = time()
-            return await func(*args, **kwargs)
 
-        return wrapper
+class TokenBucket:
+    """异步令牌桶
 
-    return decorator
+    每秒补充 rate 个令牌, 最多积攒 burst 个
+    令牌不足时调用方按优先级排队, 同一优先级内按 FIFO 顺序放行, 在等待中被取消不会消耗令牌
+    """
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        if rate <= 0 or burst < 1:
+            msg = 'rate 必须大于 0, burst 必须大于等于 1'
+            raise ValueError(msg)
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last_refill = monotonic()
+        self._waiters: list[tuple[Priority, int, Future[None]]] = []
+        self._counter = count()
+        self._timer: TimerHandle | None = None
+        self._acquired = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    async def acquire(self, priority: Priority = Priority.INTERACTIVE) -> float:
+        """获取一个令牌, 返回等待的时间 (秒)"""
+        start = monotonic()
+        self._refill()
+        if not self._waiters and self._tokens >= 1:
+            self._tokens -= 1
+            self._acquired += 1
+            return 0
+        waiter: Future[None] = get_running_loop().create_future()
+        heappush(self._waiters, (priority, next(self._counter), waiter))
+        self._dispatch()
+        try:
+            await waiter
+        except CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # 令牌已经分配给了被取消的调用方, 归还后交给下一个等待者
+                self._tokens += 1
+                self._dispatch()
+            raise
+        wait = monotonic() - start
+        self._acquired += 1
+        self._total_wait += wait
+        self._max_wait = max(self._max_wait, wait)
+        return wait
+
+    @property
+    def stats(self) -> LimiterStats:
+        return LimiterStats(
+            acquired=self._acquired,
+            queue_depth=sum(not i.done() for *_, i in self._waiters),
+            total_wait=self._total_wait,
+            max_wait=self._max_wait,
+        )
+
+    def _refill(self) -> None:
+        now = monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def _dispatch(self) -> None:
+        self._refill()
+        while self._waiters and self._tokens >= 1:
+            *_, waiter = heappop(self._waiters)
+            if waiter.done():
+                continue
+            self._tokens -= 1
+            waiter.set_result(None)
+        while self._waiters and self._waiters[0][2].done():
+            heappop(self._waiters)
+        if self._waiters and self._timer is None:
+            self._timer = get_running_loop().call_later((1 - self._tokens) / self.rate, self._on_timer)
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self._dispatch()
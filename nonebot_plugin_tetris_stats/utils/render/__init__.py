@@ -1,9 +1,11 @@
 from jinja2 import Environment, FileSystemLoader
 from nonebot.compat import PYDANTIC_V2
 
+from ...config.config import config
 from ..host import HostPage, get_self_netloc
 from ..screenshot import screenshot
 from ..templates import TEMPLATES_DIR
+from .cache import ImageCache
 from .schemas.base import Base
 
 env = Environment(
@@ -15,19 +17,31 @@ env = Environment(
 )
 
 
+def dump(data: Base) -> str:
+    if PYDANTIC_V2:
+        return data.model_dump_json(by_alias=True)
+    return data.json(by_alias=True)
+
+
 async def render(
     data: Base,
 ) -> str:
-    if PYDANTIC_V2:
-        return await env.get_template('index.html').render_async(data=data.model_dump_json(by_alias=True))
-    return await env.get_template('index.html').render_async(data=data.json(by_alias=True))
+    return await env.get_template('index.html').render_async(data=dump(data))
 
 
-async def render_image(
-    data: Base,
-) -> bytes:
-    async with HostPage(page=await render(data)) as page_hash:
-        return await screenshot(f'http://{get_self_netloc()}/host/{page_hash}.html#/{data.path}')
+async def render_image(data: Base, *, ttl: float | None = None) -> bytes:
+    """渲染图片, 结果会被缓存 ttl 秒, 为 None 时使用配置的 render_cache.ttl"""
+    payload = dump(data)
+
+    async def render_page() -> bytes:
+        async with HostPage(page=await env.get_template('index.html').render_async(data=payload)) as page_hash:
+            return await screenshot(
+                f'http://{get_self_netloc()}/host/{page_hash}.html#/{data.path}', path=data.path, data=payload
+            )
+
+    if not config.tetris.render_cache.enabled or config.tetris.dev.enabled:  # 开发模式下模板随时会变, 不缓存
+        return await render_page()
+    return await ImageCache.get(data.path, payload, render_page, ttl)
 
 
 __all__ = ['render']
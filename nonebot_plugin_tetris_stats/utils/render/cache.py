@@ -0,0 +1,80 @@
+from asyncio import Lock, to_thread
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timedelta, timezone
+from hashlib import sha256
+from typing import ClassVar
+from weakref import WeakValueDictionary
+
+from nonebot.log import logger
+from nonebot_plugin_apscheduler import scheduler
+
+from ...config.config import CACHE_PATH, config
+from ..cache import CacheEntry, CacheStats, DiskCache, MemoryCache
+from ..templates import template_version
+
+UTC = timezone.utc
+
+
+class ImageCache:
+    """渲染结果缓存
+
+    以 模板版本 + 路由 + 数据 + 截图质量 的 sha256 为键, 相同的数据在 ttl 内不会再次渲染
+    """
+
+    cache: ClassVar[MemoryCache[str, bytes]] = MemoryCache(config.tetris.render_cache.max_memory_size)
+    disk = DiskCache(CACHE_PATH / 'render') if config.tetris.render_cache.persistent else None
+    task: ClassVar[WeakValueDictionary[str, Lock]] = WeakValueDictionary()
+
+    @staticmethod
+    def key(path: str, payload: str) -> str:
+        return sha256(
+            '\0'.join((template_version(), path, str(config.tetris.screenshot_quality), payload)).encode()
+        ).hexdigest()
+
+    @classmethod
+    async def get(
+        cls, path: str, payload: str, render: Callable[[], Awaitable[bytes]], ttl: float | None = None
+    ) -> bytes:
+        """获取渲染结果, 没有缓存时调用 render 渲染, 同一个键同时只会渲染一次
+
+        ttl 为 None 时使用配置的 render_cache.ttl
+        """
+        key = cls.key(path, payload)
+        if (image := cls.cache.get(key)) is not None:
+            logger.debug(f'{path}: Render cache hit!')
+            return image
+        async with cls.task.setdefault(key, Lock()):
+            if (image := cls.cache.get(key)) is not None:
+                logger.debug(f'{path}: Render cache hit!')
+                return image
+            if cls.disk is not None and (entry := await cls.disk.get(key)) is not None:
+                logger.debug(f'{path}: Render disk cache hit!')
+                cls.cache.set(key, entry.data, size=len(entry.data), ttl=entry.ttl)
+                return entry.data
+            image = await render()
+            await cls.set(key, image, ttl)
+            return image
+
+    @classmethod
+    async def set(cls, key: str, image: bytes, ttl: float | None = None) -> None:
+        if ttl is None:
+            ttl = config.tetris.render_cache.ttl
+        cls.cache.set(key, image, size=len(image), ttl=ttl)
+        if cls.disk is not None:
+            await cls.disk.set(key, CacheEntry(data=image, expires_at=datetime.now(UTC) + timedelta(seconds=ttl)))
+
+    @classmethod
+    def stats(cls) -> CacheStats:
+        return cls.cache.stats
+
+
+@scheduler.scheduled_job('interval', hours=1)
+async def _() -> None:
+    ImageCache.cache.purge()
+    if ImageCache.disk is not None and (count := await to_thread(ImageCache.disk.purge)):
+        logger.debug(f'清除了 {count} 个过期的渲染缓存文件')
+    stats = ImageCache.stats()
+    logger.debug(
+        f'渲染缓存: 命中 {stats.hits} 次, 未命中 {stats.misses} 次, 淘汰 {stats.evictions} 次, '
+        f'{stats.count} 个条目共 {stats.size}/{stats.max_size} 字节'
+    )
@@ -1,18 +1,33 @@
+from asyncio import FIRST_COMPLETED, CancelledError, Lock, Task, create_task, gather, wait
 from collections.abc import Sequence
+from contextlib import suppress
+from datetime import datetime, timezone
 from http import HTTPStatus
-from typing import Any
+from importlib.util import find_spec
+from math import inf
+from time import monotonic
+from typing import Any, ClassVar, NamedTuple
 
+from aiofiles import open as aopen
+from aiofiles import os as aos
 from fake_useragent import UserAgent
-from httpx import AsyncClient, HTTPError
+from httpx import AsyncClient, HTTPError, Limits
 from msgspec import DecodeError, Struct, json
 from nonebot import get_driver
 from nonebot.log import logger
-from playwright.async_api import Response
+from nonebot_plugin_apscheduler import scheduler
+from playwright.async_api import BrowserContext, Page, Response
+from playwright.async_api import Error as PlaywrightError
 from yarl import URL
 
 from ..config.config import CACHE_PATH, config
+from .breaker import BreakerState, BreakerStats, CircuitBreaker
 from .browser import BrowserManager
-from .exception import RequestError
+from .cache import atomic_write
+from .exception import CircuitOpenError, RequestError
+from .limit import LimiterStats, Priority, TokenBucket
+
+UTC = timezone.utc
 
 driver = get_driver()
 
@@ -20,11 +35,151 @@ driver = get_driver()
 class CloudflareCache(Struct):
     headers: dict[str, Any] | None = None
     cookies: dict[str, Any] | None = None
+    expires_at: datetime | None = None
+
+
+HTTP2 = config.tetris.http_client.http2 and find_spec('h2') is not None
+if config.tetris.http_client.http2 and not HTTP2:
+    logger.warning('未安装 h2, 无法启用 HTTP/2, 请安装 httpx[http2]')
 
+# 导航被打断时各浏览器的错误信息
+INTERRUPTED_NAVIGATION = ('interrupted by another navigation', 'NS_BINDING_ABORTED', 'net::ERR_ABORTED')
 
 encoder = json.Encoder()
 decoder = json.Decoder()
 
+limiters: dict[str, TokenBucket] = {
+    host: TokenBucket(rate_limit.rate, rate_limit.burst) for host, rate_limit in config.tetris.rate_limit.items()
+}
+
+
+def get_limiter_stats() -> dict[str, LimiterStats]:
+    return {host: limiter.stats for host, limiter in limiters.items()}
+
+
+class MirrorStats(NamedTuple):
+    latency: float | None
+    failures: int
+
+
+class MirrorHealth:
+    """记录单个地址的延迟 (指数移动平均) 与连续失败次数"""
+
+    alpha = 0.3
+
+    def __init__(self) -> None:
+        self.latency: float | None = None
+        self.failures = 0
+
+    def record_latency(self, latency: float) -> None:
+        self.latency = latency if self.latency is None else self.alpha * latency + (1 - self.alpha) * self.latency
+
+    def record_success(self, latency: float) -> None:
+        self.record_latency(latency)
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+
+    @property
+    def sort_key(self) -> tuple[int, float]:
+        """健康的地址优先, 其次延迟低的优先, 没有记录的地址视为最快以便探测"""
+        return (self.failures, self.latency or 0)
+
+    @property
+    def stats(self) -> MirrorStats:
+        return MirrorStats(latency=self.latency, failures=self.failures)
+
+
+mirrors: dict[str, MirrorHealth] = {}
+
+
+def get_mirror_stats() -> dict[str, MirrorStats]:
+    return {origin: health.stats for origin, health in mirrors.items()}
+
+
+breakers: dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(host: str) -> CircuitBreaker:
+    if (breaker := breakers.get(host)) is None:
+        breaker = breakers[host] = CircuitBreaker(
+            config.tetris.breaker.failure_threshold, config.tetris.breaker.cooldown, config.tetris.breaker.max_cooldown
+        )
+    return breaker
+
+
+def get_breaker_stats() -> dict[str, BreakerStats]:
+    return {host: breaker.stats for host, breaker in breakers.items()}
+
+
+def is_host_failure(error: RequestError) -> bool:
+    """超时, 连接失败, 429 与 5xx 视为 host 故障, 其余状态码说明 host 仍在正常响应"""
+    return (
+        error.status_code is None
+        or error.status_code == HTTPStatus.TOO_MANY_REQUESTS
+        or error.status_code >= HTTPStatus.INTERNAL_SERVER_ERROR
+    )
+
+
+async def limit(url: URL, priority: Priority = Priority.INTERACTIVE) -> None:
+    """按 host 限流, 没有配置限流的 host 直接放行"""
+    if (limiter := limiters.get(url.host or '')) is not None and (wait := await limiter.acquire(priority)) > 0:
+        logger.debug(f'{url.host}: trigger limit, waited {wait:.3f}s')
+
+
+@driver.on_shutdown
+async def _():
+    await ClientPool.close()
+
+
+@scheduler.scheduled_job('interval', hours=1)
+async def _() -> None:
+    for host, stats in get_limiter_stats().items():
+        logger.debug(
+            f'{host} 限流: 放行 {stats.acquired} 次, 排队 {stats.queue_depth} 个, '
+            f'共等待 {stats.total_wait:.1f}s, 最长 {stats.max_wait:.1f}s'
+        )
+    for host, stats in get_breaker_stats().items():
+        logger.debug(f'{host} 熔断器: {stats.state}, 连续失败 {stats.failures} 次, 冷却 {stats.cooldown:.0f}s')
+    for origin, stats in get_mirror_stats().items():
+        latency = 'N/A' if stats.latency is None else f'{stats.latency * 1000:.0f}ms'
+        logger.debug(f'{origin} 镜像: 延迟 {latency}, 连续失败 {stats.failures} 次')
+
+
+class ClientPool:
+    """共享的 httpx 客户端池
+
+    以 (代理, origin) 为键复用客户端, 同一 host 的请求共享连接, 每个 host 的连接数单独受限
+    """
+
+    _clients: ClassVar[dict[tuple[str | None, str], AsyncClient]] = {}
+
+    @classmethod
+    def get_client(cls, url: URL, proxy: str | None) -> AsyncClient:
+        key = (proxy, str(url.origin()))
+        client = cls._clients.get(key)
+        if client is None or client.is_closed:
+            http_client = config.tetris.http_client
+            client = cls._clients[key] = AsyncClient(
+                timeout=config.tetris.request_timeout,
+                proxy=proxy,
+                http2=HTTP2,
+                limits=Limits(
+                    max_connections=http_client.max_connections,
+                    max_keepalive_connections=http_client.max_keepalive_connections,
+                    keepalive_expiry=http_client.keepalive_expiry,
+                ),
+            )
+        return client
+
+    @classmethod
+    async def close(cls) -> None:
+        """关闭所有客户端"""
+        for client in cls._clients.values():
+            await client.aclose()
+        cls._clients.clear()
+
 
 class AntiCloudflare:
     cache_decoder = json.Decoder(type=CloudflareCache)
@@ -32,80 +187,176 @@ class AntiCloudflare:
     def __init__(self, domain_suffix: str) -> None:
         self.domain_suffix = domain_suffix
         self.cache_path = CACHE_PATH / f'{self.domain_suffix}_cloudflare_cache.json'
-        self._headers: dict | None = None
-        self._cookies: dict | None = None
-        self.read_cache()
+        self.headers: dict | None = None
+        self.cookies: dict | None = None
+        self.expires_at: datetime | None = None
+        self._loaded = False
+        self._dirty = False
+        self._write_task: Task[None] | None = None
+        self._refresh_task: Task[None] | None = None
+        self._last_refresh = -inf
+        self._lock = Lock()
+        self._load_lock = Lock()
+        self._page: Page | None = None
+
+    async def load(self) -> None:
+        """读取缓存文件, 只会读取一次, 并发调用会等待同一次读取完成"""
+        if self._loaded:
+            return
+        async with self._load_lock:
+            if self._loaded:
+                return
+            cache = await self._read_cache()
+            if cache is not None and self.headers is None and self.cookies is None:  # 读取期间可能已经完成了一次绕过
+                self.headers, self.cookies, self.expires_at = cache.headers, cache.cookies, cache.expires_at
+            self._loaded = True
 
-    def read_cache(self) -> None:
-        """读取缓存文件"""
+    async def _read_cache(self) -> CloudflareCache | None:
         try:
-            cache: CloudflareCache = self.cache_decoder.decode(self.cache_path.read_text(encoding='UTF-8'))
-            self._headers = cache.headers
-            self._cookies = cache.cookies
+            async with aopen(self.cache_path, 'rb') as file:
+                return self.cache_decoder.decode(await file.read())
+        except FileNotFoundError:
+            return None
         except (OSError, DecodeError):
-            self.cache_path.unlink()
-            self.write_cache()
+            logger.warning(f'缓存文件 {self.cache_path} 损坏, 已删除')
+            with suppress(FileNotFoundError):
+                await aos.remove(self.cache_path)
+            return None
+
+    def update(self, headers: dict | None, cookies: dict | None, expires_at: datetime | None) -> None:
+        """更新通过验证后的 headers 与 cookies, 缓存文件在后台写入, 多次更新只会写入最新的状态"""
+        self.headers = headers
+        self.cookies = cookies
+        self.expires_at = expires_at
+        self._dirty = True
+        if self._write_task is None or self._write_task.done():
+            self._write_task = create_task(self._write_cache())
 
-    def write_cache(self) -> None:
-        """写入缓存文件"""
-        self.cache_path.write_bytes(json.encode(CloudflareCache(headers=self.headers, cookies=self.cookies)))
+    async def _write_cache(self) -> None:
+        while self._dirty:
+            self._dirty = False
+            try:
+                await atomic_write(
+                    self.cache_path,
+                    json.encode(
+                        CloudflareCache(headers=self.headers, cookies=self.cookies, expires_at=self.expires_at)
+                    ),
+                )
+            except OSError as e:
+                logger.warning(f'写入缓存文件 {self.cache_path} 失败 {e!r}')
 
     @property
-    def headers(self) -> dict | None:
-        return self._headers
+    def credentials(self) -> tuple[dict, dict | None]:
+        """请求时使用的 headers 与 cookies, cf_clearance 过期后不再使用"""
+        if not self.valid:
+            return {}, None
+        return dict(self.headers or {}), self.cookies
 
-    @headers.setter
-    def headers(self, value: dict | None) -> None:
-        self._headers = value
-        self.write_cache()
+    @property
+    def valid(self) -> bool:
+        """cf_clearance 是否仍然有效, 没有过期时间的视为有效"""
+        return self.expires_at is None or self.expires_at > datetime.now(UTC)
 
     @property
-    def cookies(self) -> dict | None:
-        return self._cookies
-
-    @cookies.setter
-    def cookies(self, value: dict | None) -> None:
-        self._cookies = value
-        self.write_cache()
-
-    async def __call__(self, url: str, proxy: str | None = None) -> bytes:
-        """用firefox硬穿五秒盾"""
-        browser = await BrowserManager.get_browser()
-        async with (
-            await browser.new_context(proxy={'server': proxy} if proxy is not None else None) as context,
-            await context.new_page() as page,
+    def expiring(self) -> bool:
+        """cf_clearance 是否即将过期"""
+        return (
+            self.expires_at is not None
+            and (self.expires_at - datetime.now(UTC)).total_seconds() < config.tetris.cloudflare.refresh_before
+        )
+
+    def refresh(self, url: str, proxy: str | None = None) -> None:
+        """在 cf_clearance 过期前于后台重新通过验证"""
+        if (
+            self._lock.locked()
+            or (self._refresh_task is not None and not self._refresh_task.done())
+            or monotonic() - self._last_refresh < config.tetris.cloudflare.refresh_before
         ):
-            response = await page.goto(url)
-            attempts = 0
-            while attempts < 60:  # noqa: PLR2004
-                attempts += 1
-                text = await page.locator('body').text_content()
-                if text is None:
-                    await page.wait_for_timeout(1000)
-                    continue
-                if await page.title() == 'Please Wait... | Cloudflare':
-                    logger.warning('疑似触发了 Cloudflare 的验证码')
-                    break
-                try:
-                    decoder.decode(text)
-                except DecodeError:
-                    await page.wait_for_timeout(1000)
-                else:
-                    if not isinstance(response, Response):
-                        msg = 'api请求失败'
-                        raise RequestError(msg)
-                    self.headers = await response.request.all_headers()
+            return
+        self._last_refresh = monotonic()
+        self._refresh_task = create_task(self._refresh(url, proxy))
+
+    async def _refresh(self, url: str, proxy: str | None) -> None:
+        logger.debug(f'{self.domain_suffix}: cf_clearance 即将过期, 开始刷新')
+        try:
+            # 刷新同样会请求一次 api, 以后台优先级占用限流令牌, 不挤占用户的请求
+            await limit(URL(url), Priority.BACKGROUND)
+            await self(url, proxy, renew=True)
+        except RequestError as e:
+            logger.warning(f'{self.domain_suffix}: 刷新 cf_clearance 失败 {e!r}')
+
+    async def __call__(self, url: str, proxy: str | None = None, *, renew: bool = False) -> bytes:
+        """用firefox硬穿五秒盾
+
+        同一域名共用一个常驻的浏览器上下文与页面, 已通过验证的 cookie 会被复用
+        同时只会有一个绕过流程, 其余请求排队等待, 之后直接复用已通过验证的上下文
+        renew 为 True 时会先清除旧的 cf_clearance, 强制重新验证以取得新的有效期
+        """
+        async with self._lock:
+            page = await self._get_page(proxy)
+            if renew:
+                await page.context.clear_cookies(name='cf_clearance')
+            try:
+                async with page.expect_response(self._is_api_response, timeout=60000) as response_info:
                     try:
-                        self.cookies = {
-                            name: value
-                            for i in await context.cookies()
-                            if (name := i.get('name')) is not None and (value := i.get('value')) is not None
-                        }
-                    except KeyError:
-                        self.cookies = None
-                    return await response.body()
-        msg = '绕过五秒盾失败'
-        raise RequestError(msg)
+                        await page.goto(url, wait_until='commit')
+                    except PlaywrightError as e:
+                        # 通过验证后页面会重新导航, 打断首次导航, 其余的导航错误直接失败, 不再等待响应
+                        if not self._is_interrupted(e):
+                            raise
+                response = await response_info.value
+                body = await response.body()
+                decoder.decode(body)
+            except (PlaywrightError, DecodeError) as e:
+                with suppress(PlaywrightError):
+                    if await page.title() == 'Please Wait... | Cloudflare':
+                        logger.warning('疑似触发了 Cloudflare 的验证码')
+                msg = '绕过五秒盾失败'
+                raise RequestError(msg) from e
+            cookies = await page.context.cookies()
+            self.update(
+                await response.request.all_headers(),
+                {
+                    name: value
+                    for i in cookies
+                    if (name := i.get('name')) is not None and (value := i.get('value')) is not None
+                },
+                next(
+                    (
+                        datetime.fromtimestamp(expires, UTC)
+                        for i in cookies
+                        if i.get('name') == 'cf_clearance' and (expires := i.get('expires', -1)) > 0
+                    ),
+                    None,
+                ),
+            )
+            return body
+
+    async def _get_page(self, proxy: str | None) -> Page:
+        """获取常驻页面, 不存在或已关闭时重新创建"""
+        if self._page is None or self._page.is_closed():
+
+            async def factory() -> BrowserContext:
+                browser = await BrowserManager.get_browser()
+                return await browser.new_context(proxy={'server': proxy} if proxy is not None else None)
+
+            context = await BrowserManager.get_context(f'anti_cloudflare_{self.domain_suffix}_{proxy}', factory)
+            self._page = await context.new_page()
+        return self._page
+
+    @staticmethod
+    def _is_interrupted(error: PlaywrightError) -> bool:
+        """导航是否被之后的导航打断"""
+        return any(i in error.message for i in INTERRUPTED_NAVIGATION)
+
+    @staticmethod
+    def _is_api_response(response: Response) -> bool:
+        """五秒盾的验证页面是 html, 通过验证后的主框架导航响应才是 api 的结果"""
+        return (
+            response.ok
+            and response.request.is_navigation_request()
+            and 'text/html' not in response.headers.get('content-type', '')
+        )
 
 
 class Request:
@@ -114,7 +365,6 @@ class Request:
     def __init__(self, proxy: str | None) -> None:
         self.proxy = proxy
         self.anti_cloudflares: dict[str, AntiCloudflare] = {}
-        self.client = AsyncClient(timeout=config.tetris.request_timeout, proxy=self.proxy)
         self.ua = UserAgent()
 
     async def request(
@@ -124,21 +374,57 @@ class Request:
         *,
         is_json: bool = True,
         enable_anti_cloudflare: bool = False,
+        priority: Priority = Priority.INTERACTIVE,
     ) -> bytes:
         """请求api"""
-        if (anti_cloudflare := self.anti_cloudflares.get(url.host or '')) is not None:
-            cookies = anti_cloudflare.cookies
-            headers = anti_cloudflare.headers
-        else:
-            cookies = None
-            headers = None
-        if headers is None:
-            headers = {}
+        host = url.host or ''
+        breaker = get_breaker(host)
+        if not breaker.allow():
+            retry_after = breaker.stats.retry_after
+            msg = f'{host} 近期请求多次失败, 已暂停请求, {retry_after:.0f}s 后重试'
+            raise CircuitOpenError(msg, retry_after=retry_after)
+        state = breaker.state
+        try:
+            result = await self._request(
+                url,
+                extra_headers,
+                is_json=is_json,
+                enable_anti_cloudflare=enable_anti_cloudflare,
+                priority=priority,
+            )
+        except RequestError as e:
+            if not is_host_failure(e):
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            if breaker.state == BreakerState.OPEN:
+                logger.warning(f'{host} 连续失败 {breaker.stats.failures} 次, 熔断 {breaker.stats.cooldown:.0f}s')
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+        if state == BreakerState.HALF_OPEN:
+            logger.info(f'{host} 已恢复')
+        breaker.record_success()
+        return result
+
+    async def _request(
+        self,
+        url: URL,
+        extra_headers: dict | None,
+        *,
+        is_json: bool,
+        enable_anti_cloudflare: bool,
+        priority: Priority,
+    ) -> bytes:
+        await limit(url, priority)
+        anti_cloudflare = await self._get_anti_cloudflare(url, enable_anti_cloudflare)
+        headers, cookies = anti_cloudflare.credentials if anti_cloudflare is not None else ({}, None)
         if extra_headers:
             headers.update(extra_headers)
         headers.setdefault('User-Agent', self.ua.random)
         try:
-            response = await self.client.get(str(url), cookies=cookies, headers=headers)
+            response = await ClientPool.get_client(url, self.proxy).get(str(url), cookies=cookies, headers=headers)
             if response.status_code != HTTPStatus.OK:
                 msg = (
                     f'请求错误 code: {response.status_code} {HTTPStatus(response.status_code).phrase}\n{response.text}'
@@ -150,12 +436,25 @@ class Request:
             msg = f'请求错误 \n{e!r}'
             raise RequestError(msg) from e
         except DecodeError:  # 由于捕获的是 DecodeError 所以一定是 is_json = True
-            if enable_anti_cloudflare and url.host is not None:
-                return await self.anti_cloudflares.setdefault(url.host, AntiCloudflare(url.host))(str(url), self.proxy)
+            if anti_cloudflare is not None and enable_anti_cloudflare:
+                return await anti_cloudflare(str(url), self.proxy)
             raise
         else:
             return response.content
 
+    async def _get_anti_cloudflare(self, url: URL, enable: bool) -> AntiCloudflare | None:  # noqa: FBT001
+        """获取 host 对应的 AntiCloudflare, 首次获取时会读取缓存文件, cf_clearance 即将过期时会在后台刷新"""
+        if url.host is None:
+            return None
+        if (anti_cloudflare := self.anti_cloudflares.get(url.host)) is None:
+            if not enable:
+                return None
+            anti_cloudflare = self.anti_cloudflares[url.host] = AntiCloudflare(url.host)
+        await anti_cloudflare.load()
+        if enable and anti_cloudflare.expiring:
+            anti_cloudflare.refresh(str(url), self.proxy)
+        return anti_cloudflare
+
     async def failover_request(
         self,
         urls: Sequence[URL],
@@ -164,24 +463,110 @@ class Request:
         failover_exc: tuple[type[BaseException], ...],
         is_json: bool = True,
     ) -> bytes:
+        """依次尝试多个地址, 按各地址的健康状况与延迟排序
+
+        启用 hedged 时, 当前地址在 hedge_delay 秒内没有响应就同时请求下一个地址, 取最先成功的结果并取消其余请求
+        """
+        urls = sorted(
+            urls,
+            key=lambda url: (
+                not get_breaker(url.host or '').available,
+                mirrors.setdefault(str(url.origin()), MirrorHealth()).sort_key,
+            ),
+        )
+        if config.tetris.failover.hedged:
+            return await self._hedged_request(
+                urls, failover_code=failover_code, failover_exc=failover_exc, is_json=is_json
+            )
         error_list: list[RequestError] = []
         for i in urls:
             logger.debug(f'尝试请求 {i}')
             try:
-                return await self.request(i, is_json=is_json)
+                return await self._mirror_request(i, is_json=is_json)
             except RequestError as e:
-                if e.status_code in failover_code:  # 如果状态码在 failover_code 中, 则继续尝试下一个URL
-                    error_list.append(e)
+                if not self._should_failover(e, failover_code, failover_exc):
+                    raise
+                error_list.append(e)
+        msg = f'所有地址皆不可用\n{error_list!r}'
+        raise RequestError(msg)
+
+    async def _hedged_request(
+        self,
+        urls: Sequence[URL],
+        *,
+        failover_code: Sequence[int],
+        failover_exc: tuple[type[BaseException], ...],
+        is_json: bool,
+    ) -> bytes:
+        error_list: list[RequestError] = []
+        remaining = list(reversed(urls))
+        pending: set[Task[bytes]] = set()
+
+        def launch() -> None:
+            url = remaining.pop()
+            logger.debug(f'尝试请求 {url}')
+            pending.add(create_task(self._mirror_request(url, is_json=is_json)))
+
+        launch()
+        try:
+            while pending:
+                done, _ = await wait(
+                    pending,
+                    timeout=config.tetris.failover.hedge_delay if remaining else None,
+                    return_when=FIRST_COMPLETED,
+                )
+                if not done:  # 超过 hedge_delay 仍没有响应, 对冲请求下一个地址
+                    launch()
                     continue
-                # 如果状态码不在故障转移列表中, 则查找异常栈, 如果异常栈内有 failover_exc 内的异常类型, 则继续尝试下一个URL
-                tb = e.__traceback__
-                while tb is not None:
-                    if isinstance(tb.tb_frame.f_locals.get('exc_value'), failover_exc):
+                # 同时完成的请求中优先取成功的结果, 失败的请求不能掩盖已经成功的响应
+                for task in sorted(done, key=lambda task: task.exception() is not None):
+                    pending.discard(task)
+                    try:
+                        return task.result()
+                    except RequestError as e:
+                        if not self._should_failover(e, failover_code, failover_exc):
+                            raise
                         error_list.append(e)
-                        break
-                    tb = tb.tb_next
-                else:
-                    raise
-                continue
+                        if remaining:
+                            launch()
+        finally:
+            for task in pending:
+                task.cancel()
+            await gather(*pending, return_exceptions=True)
         msg = f'所有地址皆不可用\n{error_list!r}'
         raise RequestError(msg)
+
+    async def _mirror_request(self, url: URL, *, is_json: bool) -> bytes:
+        """请求并记录地址的延迟与健康状况"""
+        health = mirrors.setdefault(str(url.origin()), MirrorHealth())
+        start = monotonic()
+        try:
+            result = await self.request(url, is_json=is_json)
+        except CircuitOpenError:
+            raise
+        except RequestError:
+            health.record_failure()
+            raise
+        except CancelledError:  # 被对冲请求取消, 已等待的时间是延迟的下限
+            health.record_latency(monotonic() - start)
+            raise
+        health.record_success(monotonic() - start)
+        return result
+
+    @staticmethod
+    def _should_failover(
+        error: RequestError, failover_code: Sequence[int], failover_exc: tuple[type[BaseException], ...]
+    ) -> bool:
+        if isinstance(error, CircuitOpenError):  # 已熔断的地址直接跳过
+            return True
+        if error.status_code in failover_code:  # 如果状态码在 failover_code 中, 则继续尝试下一个URL
+            return True
+        # 如果状态码不在故障转移列表中, 则查找异常栈, 如果异常栈内有 failover_exc 内的异常类型, 则继续尝试下一个URL
+        if isinstance(error.__cause__, failover_exc):
+            return True
+        tb = error.__traceback__
+        while tb is not None:
+            if isinstance(tb.tb_frame.f_locals.get('exc_value'), failover_exc):
+                return True
+            tb = tb.tb_next
+        return False
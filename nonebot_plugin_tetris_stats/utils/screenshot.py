@@ -1,21 +1,165 @@
-from playwright.async_api import BrowserContext, TimeoutError, ViewportSize  # noqa: A004
+from asyncio import Lock, Semaphore, gather
+from collections.abc import AsyncIterator, Iterator
+from contextlib import asynccontextmanager, suppress
+from itertools import count
+from typing import ClassVar
+from weakref import WeakKeyDictionary
+
+from nonebot import get_driver
+from nonebot.log import logger
+from playwright.async_api import BrowserContext, Page, TimeoutError, ViewportSize  # noqa: A004
+from playwright.async_api import Error as PlaywrightError
 
 from ..config.config import config
 from .browser import BrowserManager
+from .exception import RenderQueueFullError
 from .retry import retry
+from .templates import template_version
 from .time_it import time_it
 
+driver = get_driver()
+
+
+@driver.on_startup
+async def _():
+    try:
+        await PagePool.warm_up()
+    except PlaywrightError as e:
+        logger.warning(f'预先打开截图页面失败 {e!r}')
+
+
+SUPPORTS_CLIENT_SIDE_RENDER = "() => typeof window.__TETRIS_STATS_RENDER__ === 'function'"
+
+CLIENT_SIDE_RENDER = """
+    async ({ path, data }) => {
+        await window.__TETRIS_STATS_RENDER__(path, data);
+        await document.fonts.ready;
+        await Promise.all(
+            Array.from(document.images)
+                .filter((image) => !image.complete)
+                .map((image) => new Promise((resolve) => {
+                    image.addEventListener('load', resolve, { once: true });
+                    image.addEventListener('error', resolve, { once: true });
+                })),
+        );
+    };
+"""
+
+DEFAULT_VIEWPORT: ViewportSize = {'width': 1280, 'height': 720}
+"""新页面的视口大小, 复用的页面截图前会恢复到这个大小"""
+
+client_side_pages: WeakKeyDictionary[Page, str] = WeakKeyDictionary()
+"""已经加载了模板且支持客户端渲染的页面, 值为加载时的模板版本"""
+
+
+async def client_side_render(page: Page, path: str, data: str) -> bool:
+    """在已经加载了模板的页面中直接渲染, 页面不支持或渲染失败时返回 False"""
+    if client_side_pages.get(page) != template_version():
+        return False
+    try:
+        await page.evaluate(CLIENT_SIDE_RENDER, {'path': path, 'data': data})
+    except PlaywrightError as e:
+        logger.debug(f'客户端渲染失败, 回退到重新加载页面 {e!r}')
+        client_side_pages.pop(page, None)
+        return False
+    return True
+
 
 async def context_factory() -> BrowserContext:
-    return await (await BrowserManager.get_browser()).new_context(device_scale_factor=config.tetris.screenshot_quality)
+    return await (await BrowserManager.get_browser()).new_context(
+        viewport=DEFAULT_VIEWPORT, device_scale_factor=config.tetris.screenshot_quality
+    )
+
+
+async def get_context(index: int) -> BrowserContext:
+    """第 0 个浏览器使用默认的浏览器实例, 其余的浏览器实例按需启动"""
+    if index == 0:
+        return await BrowserManager.get_context('screenshot', factory=context_factory)
+
+    async def factory() -> BrowserContext:
+        browser = await BrowserManager.new_browser()
+        return await browser.new_context(
+            viewport=DEFAULT_VIEWPORT, device_scale_factor=config.tetris.screenshot_quality
+        )
+
+    return await BrowserManager.get_context(f'screenshot_{index}', factory=factory)
+
+
+class PagePool:
+    """截图页面池
+
+    最多同时打开 pages 个页面, 轮流分布在 browsers 个浏览器实例中, 页面用完后放回池中复用
+    所有页面都在使用时请求会排队等待, 排队数量超过 queue_size 时直接拒绝
+    """
+
+    _semaphore: ClassVar[Semaphore] = Semaphore(config.tetris.screenshot.pages)
+    _idle: ClassVar[list[Page]] = []
+    _counter: ClassVar[Iterator[int]] = count()
+    _waiting: ClassVar[int] = 0
+    _lock: ClassVar[Lock] = Lock()
+
+    @classmethod
+    async def warm_up(cls) -> None:
+        """预先打开所有页面"""
+        pages = await gather(*(cls._new_page() for _ in range(config.tetris.screenshot.pages - len(cls._idle))))
+        cls._idle.extend(pages)
+
+    @classmethod
+    @asynccontextmanager
+    async def acquire(cls) -> AsyncIterator[Page]:
+        if cls._semaphore.locked() and cls._waiting >= config.tetris.screenshot.queue_size:
+            msg = '渲染队列已满, 请稍后再试'
+            raise RenderQueueFullError(msg)
+        cls._waiting += 1
+        try:
+            await cls._semaphore.acquire()
+        finally:
+            cls._waiting -= 1
+        page: Page | None = None
+        try:
+            page = await cls._get_page()
+            yield page
+        except BaseException:
+            if page is not None:  # 出错的页面状态未知, 直接丢弃
+                with suppress(PlaywrightError):
+                    await page.close()
+                page = None
+            raise
+        finally:
+            if page is not None:
+                cls._idle.append(page)
+            cls._semaphore.release()
+
+    @classmethod
+    async def _get_page(cls) -> Page:
+        while cls._idle:
+            if not (page := cls._idle.pop()).is_closed():
+                return page
+        return await cls._new_page()
+
+    @classmethod
+    async def _new_page(cls) -> Page:
+        async with cls._lock:  # 避免并发启动多个相同的浏览器实例
+            context = await get_context(next(cls._counter) % config.tetris.screenshot.browsers)
+        return await context.new_page()
 
 
 @retry(exception_type=TimeoutError, reply='截图失败, 重试中')
 @time_it
-async def screenshot(url: str) -> bytes:
-    context = await BrowserManager.get_context('screenshot', factory=context_factory)
-    async with await context.new_page() as page:
-        await page.goto(url)
+async def screenshot(url: str, *, path: str | None = None, data: str | None = None) -> bytes:
+    """截图
+
+    启用 client_side_render 且模板提供了 window.__TETRIS_STATS_RENDER__(path, data) 时,
+    已经加载过当前版本模板的页面会直接通过它切换路由与数据, 不再重新加载整个页面
+    """
+    async with PagePool.acquire() as page:
+        # 复用的页面还保持着上一张图片的大小, 需要在默认大小下重新排版后再测量
+        if page.viewport_size != DEFAULT_VIEWPORT:
+            await page.set_viewport_size(DEFAULT_VIEWPORT)
+        if not (path is not None and data is not None and await client_side_render(page, path, data)):
+            await page.goto(url)
+            if config.tetris.screenshot.client_side_render and await page.evaluate(SUPPORTS_CLIENT_SIDE_RENDER):
+                client_side_pages[page] = template_version()
         await page.wait_for_selector('#content')
         size: ViewportSize = await page.evaluate("""
             () => {
@@ -1,3 +1,4 @@
+from functools import cache
 from hashlib import sha256
 from http import HTTPStatus
 from pathlib import Path
@@ -24,6 +25,15 @@ TEMPLATES_DIR = config.tetris.dev.template_path or DATA_PATH / 'templates'
 alc = on_alconna(Alconna('更新模板', Option('--revision', Args['revision', str], alias={'-R'})), permission=SUPERUSER)
 
 
+@cache
+def template_version() -> str:
+    """当前模板的版本, 以模板哈希文件的 sha256 表示, 模板更新后会改变"""
+    try:
+        return sha256((TEMPLATES_DIR / 'hash.sha256').read_bytes()).hexdigest()
+    except OSError:
+        return ''
+
+
 async def download_templates(tag: str) -> Path:
     logger.info(f'开始下载模板 {tag}')
     async with AsyncClient(proxy=config.tetris.proxy.github or config.tetris.proxy.main) as client:
@@ -104,6 +114,7 @@ async def init_templates(tag: str) -> bool:
         logger.info('清除旧模板文件')
         rmtree(TEMPLATES_DIR)
     temp_path.rename(TEMPLATES_DIR)
+    template_version.cache_clear()
     logger.info('模板初始化完成')
     return True
 
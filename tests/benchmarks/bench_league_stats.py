@@ -0,0 +1,113 @@
+# ruff: noqa: PLC0415, T201
+"""段位统计的性能对比, 不会被 pytest 自动收集
+
+运行: pytest -s tests/benchmarks/bench_league_stats.py
+"""
+
+from collections import defaultdict
+from collections.abc import Callable
+from math import floor
+from random import Random
+from statistics import mean
+from time import perf_counter
+from typing import Any
+
+PLAYERS = 50_000
+PAGE_SIZE = 100
+ROUNDS = 5
+
+
+def make_pages() -> list[Any]:
+    from nonebot_plugin_tetris_stats.games.tetrio.api.schemas.base import ArCounts, Cache, P
+    from nonebot_plugin_tetris_stats.games.tetrio.api.schemas.leaderboards.by import (
+        BySuccessModel,
+        Data,
+        Entry,
+        League,
+    )
+    from nonebot_plugin_tetris_stats.games.tetrio.constant import RANK_PERCENTILE
+
+    random = Random(0)  # noqa: S311
+    trs = sorted((random.uniform(0, 25000) for _ in range(PLAYERS)), reverse=True)
+    ranks = list(RANK_PERCENTILE)
+    cache = Cache.model_construct(status='cached', cached_at=None, cached_until=None)
+    entries = [
+        Entry.model_construct(
+            id=f'{index:024x}',
+            username=f'player{index}',
+            role='user',
+            ar_counts=ArCounts.model_construct(),
+            p=P.model_construct(pri=tr, sec=0.0, ter=0.0),
+            league=League.model_construct(
+                tr=tr,
+                rank=ranks[min(len(ranks) - 1, index * len(ranks) // PLAYERS)],
+                pps=random.uniform(0.5, 4),
+                apm=random.uniform(5, 200),
+                vs=random.uniform(10, 400),
+            ),
+        )
+        for index, tr in enumerate(trs)
+    ]
+    return [
+        BySuccessModel.model_construct(
+            success=True, cache=cache, data=Data.model_construct(entries=entries[i : i + PAGE_SIZE])
+        )
+        for i in range(0, PLAYERS, PAGE_SIZE)
+    ]
+
+
+def list_based(pages: list[Any]) -> None:
+    """原先的实现: 收集所有 Entry 后逐个段位做六次扫描"""
+    from nonebot_plugin_tetris_stats.games.tetrio.constant import RANK_PERCENTILE
+
+    players = [i for page in pages for i in page.data.entries]
+    players.sort(key=lambda x: x.league.tr, reverse=True)
+    rank_player_mapping = defaultdict(list)
+    for player in players:
+        rank_player_mapping[player.league.rank].append(player)
+    for rank, percentile in RANK_PERCENTILE.items():
+        _ = players[floor((percentile / 100) * len(players)) - 1].league.tr
+        rank_players = rank_player_mapping[rank]
+        for field in ('pps', 'apm', 'vs'):
+            min(rank_players, key=lambda x, field=field: getattr(x.league, field))
+            max(rank_players, key=lambda x, field=field: getattr(x.league, field))
+            mean(getattr(i.league, field) for i in rank_players)
+
+
+def columnar(pages: list[Any]) -> None:
+    from nonebot_plugin_tetris_stats.games.tetrio.rank.aggregate import LeagueAggregate, holders
+
+    aggregate = LeagueAggregate()
+    for key, page in enumerate(pages):
+        aggregate.add_page(page, key)
+    holders(aggregate.summarize())
+
+
+def columnar_summarize_only(pages: list[Any]) -> Callable[[], object]:
+    from nonebot_plugin_tetris_stats.games.tetrio.rank.aggregate import LeagueAggregate
+
+    aggregate = LeagueAggregate()
+    for key, page in enumerate(pages):
+        aggregate.add_page(page, key)
+    return aggregate.summarize
+
+
+def best_of(func: Callable[[], object]) -> float:
+    timings = []
+    for _ in range(ROUNDS):
+        start = perf_counter()
+        func()
+        timings.append(perf_counter() - start)
+    return min(timings)
+
+
+def test_bench_league_stats() -> None:
+    pages = make_pages()
+    results = {
+        'list based (collect + 6 scans per rank)': best_of(lambda: list_based(pages)),
+        'columnar (add_page + summarize)': best_of(lambda: columnar(pages)),
+        'columnar (summarize only)': best_of(columnar_summarize_only(pages)),
+    }
+    print(f'\n{PLAYERS} players, best of {ROUNDS}:')
+    for name, seconds in results.items():
+        print(f'  {name:<42} {seconds * 1000:8.2f} ms')
@@ -0,0 +1,138 @@
+# ruff: noqa: PLC0415, T201
+"""按时间查找最近历史数据的性能对比, 不会被 pytest 自动收集
+
+运行: pytest -s tests/benchmarks/bench_nearest_historical.py
+行数可以通过环境变量 BENCH_ROWS 调整
+"""
+
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timedelta, timezone
+from os import environ
+from pathlib import Path
+from random import Random
+from time import perf_counter
+from typing import Any
+
+import pytest
+from sqlalchemy import create_engine, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+UTC = timezone.utc
+
+ROWS = int(environ.get('BENCH_ROWS', '1000000'))
+USERS = 1_000
+LOOKUPS = 200
+BATCH = 10_000
+START = datetime(2024, 1, 1, tzinfo=UTC)
+
+
+def seed(path: Path) -> None:
+    from nonebot_plugin_tetris_stats.games.top.api.models import TOPHistoricalData
+    from nonebot_plugin_tetris_stats.games.top.api.schemas.user_profile import Data, UserProfile
+
+    engine = create_engine(f'sqlite:///{path}')
+    TOPHistoricalData.metadata.create_all(engine, tables=[TOPHistoricalData.__table__])
+    random = Random(0)  # noqa: S311
+    table = TOPHistoricalData.__table__
+    with engine.begin() as conn:
+        batch: list[dict[str, Any]] = []
+        for index in range(ROWS):
+            user = f'user{index % USERS}'
+            total = [Data(lpm=random.uniform(0, 200), apm=random.uniform(0, 100)) for _ in range(5)]
+            batch.append(
+                {
+                    'user_unique_identifier': user,
+                    'api_type': 'User Profile',
+                    'data': UserProfile(user_name=user, today=total[0], total=total),
+                    'update_time': START + timedelta(minutes=index),
+                }
+            )
+            if len(batch) == BATCH:
+                conn.execute(insert(table), batch)
+                batch.clear()
+        if batch:
+            conn.execute(insert(table), batch)
+    engine.dispose()
+
+
+async def two_queries(session: AsyncSession, user: str, target_time: datetime) -> object:
+    """原先的实现: 前后各一次 ORDER BY ... LIMIT 1, 都加载完整的数据"""
+    from nonebot_plugin_tetris_stats.games.top.api.models import TOPHistoricalData
+
+    before = await session.scalar(
+        select(TOPHistoricalData)
+        .where(
+            TOPHistoricalData.user_unique_identifier == user,
+            TOPHistoricalData.api_type == 'User Profile',
+            TOPHistoricalData.update_time <= target_time,
+        )
+        .order_by(TOPHistoricalData.update_time.desc())
+        .limit(1)
+    )
+    after = await session.scalar(
+        select(TOPHistoricalData)
+        .where(
+            TOPHistoricalData.user_unique_identifier == user,
+            TOPHistoricalData.api_type == 'User Profile',
+            TOPHistoricalData.update_time >= target_time,
+        )
+        .order_by(TOPHistoricalData.update_time.asc())
+        .limit(1)
+    )
+    return before or after
+
+
+async def nearest(session: AsyncSession, user: str, target_time: datetime) -> object:
+    from nonebot_plugin_tetris_stats.db import get_nearest_data
+    from nonebot_plugin_tetris_stats.games.top.api.models import TOPHistoricalData
+
+    return await get_nearest_data(session, TOPHistoricalData, user, 'User Profile', target_time)
+
+
+async def run(path: Path, func: Callable[[AsyncSession, str, datetime], Awaitable[object]]) -> float:
+    random = Random(1)  # noqa: S311
+    lookups = [
+        (f'user{random.randrange(USERS)}', START + timedelta(minutes=random.uniform(0, ROWS))) for _ in range(LOOKUPS)
+    ]
+    engine = create_async_engine(f'sqlite+aiosqlite:///{path}')
+    async with AsyncSession(engine) as session:
+        start = perf_counter()
+        for user, target_time in lookups:
+            assert await func(session, user, target_time) is not None  # noqa: S101
+            session.expunge_all()
+        elapsed = perf_counter() - start
+    await engine.dispose()
+    return elapsed
+
+
+def explain(path: Path, sql: str) -> str:
+    engine = create_engine(f'sqlite:///{path}')
+    with engine.connect() as conn:
+        plan = ' / '.join(row[-1] for row in conn.execute(text(f'EXPLAIN QUERY PLAN {sql}')))
+    engine.dispose()
+    return plan
+
+
+@pytest.mark.asyncio
+async def test_bench_nearest_historical(tmp_path: Path) -> None:
+    path = tmp_path / 'bench.db'
+    start = perf_counter()
+    seed(path)
+    print(f'\nseeded {ROWS} rows in {perf_counter() - start:.1f}s')
+    query = (
+        "SELECT id FROM nb_t_top_hist_data WHERE user_unique_identifier = 'user1' "
+        "AND api_type = 'User Profile' AND update_time <= '2024-06-01' ORDER BY update_time DESC LIMIT 1"
+    )
+    print(f'  with composite index: {explain(path, query)}')
+    with_index = await run(path, nearest)
+
+    engine = create_engine(f'sqlite:///{path}')
+    with engine.begin() as conn:
+        conn.execute(text('DROP INDEX ix_nb_t_top_hist_data_lookup'))
+    engine.dispose()
+    print(f'  separate indexes only: {explain(path, query)}')
+    without_index = await run(path, two_queries)
+
+    print(f'{LOOKUPS} lookups:')
+    print(f'  {"two queries, separate indexes":<42} {without_index * 1000:8.2f} ms')
+    print(f'  {"get_nearest_data, composite index":<42} {with_index * 1000:8.2f} ms')
@@ -0,0 +1,113 @@
+# ruff: noqa: PLC0415, T201
+"""PydanticType 读取历史数据的性能对比, 不会被 pytest 自动收集
+
+运行: pytest -s tests/benchmarks/bench_pydantic_type.py
+"""
+
+import json
+from collections.abc import Callable
+from datetime import datetime, timedelta, timezone
+from time import perf_counter
+from typing import Any
+
+UTC = timezone.utc
+
+ROWS = 5_000
+ROUNDS = 3
+
+
+def make_payload() -> dict[str, Any]:
+    from nonebot_plugin_tetris_stats.games.tetrio.api.schemas.base import Cache
+    from nonebot_plugin_tetris_stats.games.tetrio.api.schemas.summaries.league import (
+        LeagueSuccessModel,
+        Past,
+        RatedData,
+    )
+
+    cache_time = datetime(2026, 3, 8, 12, tzinfo=UTC)
+    return LeagueSuccessModel(
+        success=True,
+        cache=Cache(status='cached', cached_at=cache_time, cached_until=cache_time + timedelta(minutes=5)),
+        data=RatedData(
+            decaying=False,
+            past=Past(),
+            gamesplayed=10,
+            gameswon=6,
+            glicko=1500.0,
+            rd=50.0,
+            gxe=0.5,
+            tr=12345.0,
+            rank='s',
+            bestrank='s',
+            standing=100,
+            apm=40.0,
+            pps=2.0,
+            vs=80.0,
+            standing_local=10,
+            prev_rank='a',
+            prev_at=12000,
+            next_rank='ss',
+            next_at=13000,
+            percentile=0.9,
+            percentile_rank='s',
+        ),
+    ).model_dump(mode='json', by_alias=True)
+
+
+def legacy(models: Callable[[], list[type]], value: object) -> object:
+    """原先的实现: 每一行都重新收集模型, 再依次尝试验证, 耗时取决于集合中模型的顺序"""
+    from nonebot.compat import type_validate_python
+    from pydantic import ValidationError
+
+    for i in models():
+        try:
+            return type_validate_python(i, value)
+        except ValidationError:  # noqa: PERF203
+            ...
+    raise ValueError
+
+
+def rows_per_second(rows: list[str], decode: Callable[[Any], Any]) -> float:
+    timings = []
+    for _ in range(ROUNDS):
+        values = [json.loads(i) for i in rows]
+        start = perf_counter()
+        for value in values:
+            decode(value)
+        timings.append(perf_counter() - start)
+    return len(rows) / min(timings)
+
+
+def test_bench_pydantic_type() -> None:
+    from nonebot_plugin_tetris_stats.db.models import DISCRIMINATOR, LazyPydanticType, PydanticType, model_key
+    from nonebot_plugin_tetris_stats.games.tetrio.api.schemas.base import SuccessModel
+    from nonebot_plugin_tetris_stats.games.tetrio.api.schemas.summaries.league import LeagueSuccessModel
+
+    # TETRIOHistoricalData.data 是 LazyPydanticType, 读取时不会验证, 这里单独构造会验证的 PydanticType
+    type_ = PydanticType(get_model=[SuccessModel.__subclasses__], models=set())
+    lazy_type = LazyPydanticType(get_model=[SuccessModel.__subclasses__], models=set())
+    payload = make_payload()
+    untyped = [json.dumps(payload)] * ROWS
+    typed = [json.dumps({**payload, DISCRIMINATOR: model_key(LeagueSuccessModel)})] * ROWS
+    results = {
+        'legacy, best case (first model)': rows_per_second(
+            untyped,
+            lambda value: legacy(lambda: sorted(type_.models, key=lambda i: i is not LeagueSuccessModel), value),
+        ),
+        'legacy, worst case (last model)': rows_per_second(
+            untyped, lambda value: legacy(lambda: sorted(type_.models, key=lambda i: i is LeagueSuccessModel), value)
+        ),
+        'PydanticType, no discriminator': rows_per_second(
+            untyped, lambda value: type_.process_result_value(value, None)
+        ),
+        'PydanticType, discriminator': rows_per_second(typed, lambda value: type_.process_result_value(value, None)),
+        'LazyPydanticType, not accessed': rows_per_second(
+            typed, lambda value: lazy_type.process_result_value(value, None)
+        ),
+        'LazyPydanticType, accessed': rows_per_second(
+            typed, lambda value: lazy_type.process_result_value(value, None).data
+        ),
+    }
+    print(f'\n{ROWS} league rows, {len(type_.models)} candidate models, best of {ROUNDS}:')
+    for name, speed in results.items():
+        print(f'  {name:<34} {speed:12,.0f} rows/s')
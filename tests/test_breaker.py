@@ -0,0 +1,30 @@
+from time import sleep
+
+import pytest
+
+
+def test_circuit_breaker_opens_probes_and_backs_off() -> None:
+    from nonebot_plugin_tetris_stats.utils.breaker import BreakerState, CircuitBreaker  # noqa: PLC0415
+
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=0.05, max_cooldown=0.08)
+    for _ in range(2):
+        assert breaker.allow()  # noqa: S101
+        breaker.record_failure()
+
+    assert breaker.state == BreakerState.OPEN  # noqa: S101
+    assert not breaker.allow()  # noqa: S101
+
+    sleep(0.06)
+    assert breaker.state == BreakerState.HALF_OPEN  # noqa: S101
+    assert breaker.allow()  # noqa: S101
+    assert not breaker.allow()  # 半开状态只放行一个探测请求  # noqa: S101
+    breaker.record_failure()
+    assert breaker.stats.cooldown == pytest.approx(0.08)  # noqa: S101
+    assert breaker.state == BreakerState.OPEN  # noqa: S101
+
+    sleep(0.09)
+    assert breaker.allow()  # noqa: S101
+    breaker.release()
+    assert breaker.allow()  # noqa: S101
+    breaker.record_success()
+    assert breaker.stats == (BreakerState.CLOSED, 0, 0.05, 0.0)  # noqa: S101
@@ -0,0 +1,258 @@
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+UTC = timezone.utc
+
+
+@pytest.mark.asyncio
+async def test_disk_cache_round_trip(tmp_path: Path) -> None:
+    from nonebot_plugin_tetris_stats.utils.cache import CacheEntry, DiskCache  # noqa: PLC0415
+
+    cache = DiskCache(tmp_path)
+    entry = CacheEntry(data=b'{"success":true}', expires_at=datetime.now(UTC) + timedelta(minutes=5))
+
+    await cache.set('https://ch.tetr.io/api/users/alice', entry)
+    result = await cache.get('https://ch.tetr.io/api/users/alice')
+
+    assert result is not None  # noqa: S101
+    assert result.data == entry.data  # noqa: S101
+    assert result.expires_at == entry.expires_at  # noqa: S101
+    assert await DiskCache(tmp_path).get('https://ch.tetr.io/api/users/alice') is not None  # noqa: S101
+    assert list(tmp_path.rglob('*.tmp')) == []  # noqa: S101, ASYNC240
+
+
+@pytest.mark.asyncio
+async def test_disk_cache_drops_expired_and_corrupted(tmp_path: Path) -> None:
+    from nonebot_plugin_tetris_stats.utils.cache import CacheEntry, DiskCache  # noqa: PLC0415
+
+    cache = DiskCache(tmp_path)
+    await cache.set('expired', CacheEntry(data=b'1', expires_at=datetime.now(UTC) - timedelta(seconds=1)))
+    await cache.set('corrupted', CacheEntry(data=b'2', expires_at=datetime.now(UTC) + timedelta(minutes=5)))
+    await cache.set('alive', CacheEntry(data=b'3', expires_at=datetime.now(UTC) + timedelta(minutes=5)))
+    cache._get_path('corrupted').write_bytes(b'\xc1')  # noqa: SLF001
+
+    assert cache.purge() == 2  # noqa: S101, PLR2004
+    assert await cache.get('expired') is None  # noqa: S101
+    assert await cache.get('corrupted') is None  # noqa: S101
+    assert await cache.get('alive') is not None  # noqa: S101
+
+
+def test_disk_cache_purges_stale_temp_files(tmp_path: Path) -> None:
+    from os import utime  # noqa: PLC0415
+    from time import time  # noqa: PLC0415
+
+    from nonebot_plugin_tetris_stats.utils.cache import TEMP_FILE_MAX_AGE, DiskCache  # noqa: PLC0415
+
+    (tmp_path / 'ab').mkdir()
+    stale = tmp_path / 'ab' / 'abcd.stale.tmp'
+    writing = tmp_path / 'ab' / 'abcd.writing.tmp'
+    stale.write_bytes(b'\x00')
+    writing.write_bytes(b'\x00')
+    mtime = time() - TEMP_FILE_MAX_AGE - 1
+    utime(stale, (mtime, mtime))
+
+    assert DiskCache(tmp_path).purge() == 1  # noqa: S101
+    assert not stale.exists()  # noqa: S101
+    assert writing.exists()  # noqa: S101
+
+
+def test_memory_cache_evicts_least_recently_used_by_size() -> None:
+    from nonebot_plugin_tetris_stats.utils.cache import MemoryCache  # noqa: PLC0415
+
+    cache: MemoryCache[str, bytes] = MemoryCache(max_size=10)
+    cache.set('a', b'aaaa', size=4, ttl=60)
+    cache.set('b', b'bbbb', size=4, ttl=60)
+    assert cache.get('a') == b'aaaa'  # noqa: S101
+    cache.set('c', b'cccc', size=4, ttl=60)
+    cache.set('huge', b'x' * 11, size=11, ttl=60)
+
+    assert cache.get('b') is None  # noqa: S101
+    assert cache.get('huge') is None  # noqa: S101
+    assert cache.get('a') == b'aaaa'  # noqa: S101
+    assert cache.get('c') == b'cccc'  # noqa: S101
+    stats = cache.stats
+    assert (stats.hits, stats.misses, stats.evictions) == (3, 2, 1)  # noqa: S101
+    assert (stats.count, stats.size) == (2, 8)  # noqa: S101
+
+
+def test_memory_cache_drops_expired_entries() -> None:
+    from nonebot_plugin_tetris_stats.utils.cache import MemoryCache  # noqa: PLC0415
+
+    cache: MemoryCache[str, bytes] = MemoryCache(max_size=10)
+    cache.set('expired', b'1', size=1, ttl=0)
+    cache.set('alive', b'2', size=1, ttl=60)
+
+    assert cache.get('expired') is None  # noqa: S101
+    assert cache.purge() == 0  # noqa: S101
+    assert cache.stats.size == 1  # noqa: S101
+
+
+def test_memory_cache_serves_stale_entries_within_grace() -> None:
+    from nonebot_plugin_tetris_stats.utils.cache import MemoryCache  # noqa: PLC0415
+
+    cache: MemoryCache[str, bytes] = MemoryCache(max_size=10)
+    cache.set('stale', b'1', size=1, ttl=-1, grace=60)
+    cache.set('gone', b'2', size=1, ttl=-61, grace=60)
+
+    assert cache.get('stale') is None  # noqa: S101
+    assert cache.get_stale('stale') == b'1'  # noqa: S101
+    assert cache.get_stale('gone') is None  # noqa: S101
+    assert cache.stats.count == 1  # noqa: S101
+
+
+def test_estimate_size_counts_model_contents() -> None:
+    from sys import getsizeof  # noqa: PLC0415
+
+    from pydantic import BaseModel  # noqa: PLC0415
+
+    from nonebot_plugin_tetris_stats.utils.cache import estimate_size  # noqa: PLC0415
+
+    class Item(BaseModel):
+        name: str
+
+    class Page(BaseModel):
+        items: list[Item]
+
+    page = Page(items=[Item(name=f'player-{i}') for i in range(100)])
+    raw = page.model_dump_json().encode()
+    # 验证后的模型比原始的 JSON 大得多, 按 JSON 的长度计算会低估内存占用
+    assert estimate_size(page) > 2 * len(raw)  # noqa: S101
+    shared = Item(name='shared')
+    # 同一个对象被多处引用时只计算一次
+    extra_slot = getsizeof([shared, shared]) - getsizeof([shared])
+    assert estimate_size([shared, shared]) == estimate_size([shared]) + extra_slot  # noqa: S101
+
+
+@pytest.mark.asyncio
+async def test_tetrio_cache_returns_validated_model_without_refetch(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    from yarl import URL  # noqa: PLC0415
+
+    from nonebot_plugin_tetris_stats.games.tetrio.api import cache as cache_module  # noqa: PLC0415
+    from nonebot_plugin_tetris_stats.games.tetrio.api.schemas.leaderboards.by import By  # noqa: PLC0415
+    from nonebot_plugin_tetris_stats.utils.cache import DiskCache, MemoryCache  # noqa: PLC0415
+
+    now = datetime.now(UTC)
+    calls: list[URL] = []
+
+    async def fake_request(url: URL, *_: object, **__: object) -> bytes:
+        calls.append(url)
+        return (
+            b'{"success":true,"cache":{"status":"miss","cached_at":"%s","cached_until":"%s"},"data":{"entries":[]}}'
+            % (now.isoformat().encode(), (now + timedelta(minutes=1)).isoformat().encode())
+        )
+
+    monkeypatch.setattr(cache_module.request, 'request', fake_request)
+    monkeypatch.setattr(cache_module.Cache, 'cache', MemoryCache(1024 * 1024))
+    monkeypatch.setattr(cache_module.Cache, 'disk', DiskCache(tmp_path))
+    url = URL('https://ch.tetr.io/api/users/by/league')
+
+    first = await cache_module.Cache.get(url, By)  # type: ignore[arg-type]  # pyright: ignore[reportArgumentType]
+    second = await cache_module.Cache.get(url, By)  # type: ignore[arg-type]  # pyright: ignore[reportArgumentType]
+    monkeypatch.setattr(cache_module.Cache, 'cache', MemoryCache(1024 * 1024))
+    third = await cache_module.Cache.get(url, By)  # type: ignore[arg-type]  # pyright: ignore[reportArgumentType]
+
+    assert first is second  # noqa: S101
+    assert third == first  # noqa: S101
+    assert calls == [url]  # noqa: S101
+
+
+@pytest.mark.asyncio
+async def test_tetrio_cache_serves_stale_and_revalidates_in_background(monkeypatch: pytest.MonkeyPatch) -> None:
+    from asyncio import Event, gather, sleep, wait_for  # noqa: PLC0415
+
+    from nonebot.compat import type_validate_json  # noqa: PLC0415
+    from yarl import URL  # noqa: PLC0415
+
+    from nonebot_plugin_tetris_stats.games.tetrio.api import cache as cache_module  # noqa: PLC0415
+    from nonebot_plugin_tetris_stats.games.tetrio.api.schemas.leaderboards.by import By  # noqa: PLC0415
+    from nonebot_plugin_tetris_stats.utils.cache import MemoryCache  # noqa: PLC0415
+    from nonebot_plugin_tetris_stats.utils.exception import RequestError  # noqa: PLC0415
+    from nonebot_plugin_tetris_stats.utils.limit import Priority  # noqa: PLC0415
+
+    def payload(cached_until: datetime) -> bytes:
+        now = datetime.now(UTC)
+        return (
+            b'{"success":true,"cache":{"status":"miss","cached_at":"%s","cached_until":"%s"},"data":{"entries":[]}}'
+            % (now.isoformat().encode(), cached_until.isoformat().encode())
+        )
+
+    url = URL('https://ch.tetr.io/api/users/by/league')
+    calls: list[Priority] = []
+    released = Event()
+    fail = False
+
+    async def fake_request(_: URL, *__: object, priority: Priority, **___: object) -> bytes:
+        calls.append(priority)
+        await released.wait()
+        if fail:
+            msg = 'bad gateway'
+            raise RequestError(msg, status_code=502)
+        return payload(datetime.now(UTC) + timedelta(minutes=1))
+
+    def seed_stale() -> object:
+        stale = type_validate_json(By, payload(datetime.now(UTC) - timedelta(seconds=1)))
+        cache = MemoryCache(1024 * 1024)
+        cache.set((url, By), stale, size=1, ttl=-1, grace=60)
+        monkeypatch.setattr(cache_module.Cache, 'cache', cache)
+        return stale
+
+    monkeypatch.setattr(cache_module.request, 'request', fake_request)
+    monkeypatch.setattr(cache_module.Cache, 'disk', None)
+    monkeypatch.setattr(cache_module.Cache, 'revalidating', {})
+    monkeypatch.setattr(cache_module, 'STALE_GRACE', 60)
+    stale = seed_stale()
+
+    # 刷新请求被挂起, 过期的缓存仍然立即返回
+    results = await wait_for(gather(*(cache_module.Cache.get(url, By) for _ in range(3))), 1)  # type: ignore[arg-type]  # pyright: ignore[reportArgumentType]
+    assert all(i is stale for i in results)  # noqa: S101
+    task = cache_module.Cache.revalidating[(url, By)]
+    await sleep(0)
+    # 多个调用方同时命中过期缓存时只会有一个以后台优先级运行的刷新
+    assert calls == [Priority.BACKGROUND]  # noqa: S101
+    released.set()
+    await task
+    fresh = await cache_module.Cache.get(url, By)  # type: ignore[arg-type]  # pyright: ignore[reportArgumentType]
+    assert fresh is not stale  # noqa: S101
+    assert calls == [Priority.BACKGROUND]  # noqa: S101
+
+    # 刷新失败时继续返回过期的缓存
+    fail = True
+    stale = seed_stale()
+    assert await cache_module.Cache.get(url, By) is stale  # type: ignore[arg-type]  # noqa: S101  # pyright: ignore[reportArgumentType]
+    await cache_module.Cache.revalidating[(url, By)]
+    assert await cache_module.Cache.get(url, By) is stale  # type: ignore[arg-type]  # noqa: S101  # pyright: ignore[reportArgumentType]
+    await gather(*cache_module.Cache.revalidating.values())
+
+
+@pytest.mark.asyncio
+async def test_image_cache_renders_each_payload_once(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    from asyncio import gather  # noqa: PLC0415
+
+    from nonebot_plugin_tetris_stats.utils.cache import DiskCache, MemoryCache  # noqa: PLC0415
+    from nonebot_plugin_tetris_stats.utils.render.cache import ImageCache  # noqa: PLC0415
+
+    renders: list[str] = []
+
+    def renderer(payload: str):
+        async def render() -> bytes:
+            renders.append(payload)
+            return payload.encode()
+
+        return render
+
+    monkeypatch.setattr(ImageCache, 'cache', MemoryCache(1024))
+    monkeypatch.setattr(ImageCache, 'disk', DiskCache(tmp_path))
+
+    results = await gather(*(ImageCache.get('v1/tetrio/info', '{"a":1}', renderer('{"a":1}')) for _ in range(3)))
+    other = await ImageCache.get('v1/tetrio/info', '{"a":2}', renderer('{"a":2}'))
+    monkeypatch.setattr(ImageCache, 'cache', MemoryCache(1024))
+    from_disk = await ImageCache.get('v1/tetrio/info', '{"a":1}', renderer('{"a":1}'))
+
+    assert results == [b'{"a":1}'] * 3  # noqa: S101
+    assert other == b'{"a":2}'  # noqa: S101
+    assert from_disk == b'{"a":1}'  # noqa: S101
+    assert renders == ['{"a":1}', '{"a":2}']  # noqa: S101
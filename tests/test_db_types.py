@@ -1,8 +1,10 @@
+import json
 from collections.abc import Generator
 from datetime import datetime, timedelta, timezone
 
 import pytest
-from sqlalchemy import Integer, create_engine, text
+from pydantic import BaseModel
+from sqlalchemy import Integer, create_engine, select, text
 from sqlalchemy.exc import StatementError
 from sqlalchemy.orm import DeclarativeBase, Mapped, Session, mapped_column
 
@@ -83,3 +85,126 @@ def test_utc_datetime_reads_db_naive_as_aware_utc(session_with_model: tuple[Sess
     assert row is not None  # noqa: S101
     assert row.happened_at == expected  # noqa: S101
     assert row.happened_at.tzinfo is UTC  # noqa: S101
+
+
+class Small(BaseModel):
+    value: int
+
+
+class Large(BaseModel):
+    value: int
+    extra: int = 0
+
+
+@pytest.fixture
+def session_with_pydantic_model() -> Generator[tuple[Session, type]]:
+    from nonebot_plugin_tetris_stats.db.models import PydanticType  # noqa: PLC0415
+
+    class Base(DeclarativeBase):
+        pass
+
+    class PydanticRow(Base):
+        __tablename__ = 'pydantic_row'
+
+        id: Mapped[int] = mapped_column(Integer, primary_key=True)
+        data: Mapped[BaseModel] = mapped_column(PydanticType([], {Small, Large}))
+
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session, PydanticRow
+    engine.dispose()
+
+
+def test_pydantic_type_decodes_with_stored_model_type(session_with_pydantic_model: tuple[Session, type]) -> None:
+    from nonebot_plugin_tetris_stats.db.models import DISCRIMINATOR, model_key  # noqa: PLC0415
+
+    session, pydantic_row = session_with_pydantic_model
+    # 两个模型都能验证同样的数据, 只有类型标识能区分
+    session.add_all([pydantic_row(id=1, data=Small(value=1)), pydantic_row(id=2, data=Large(value=2))])
+    session.commit()
+    session.expire_all()
+
+    raw = session.execute(text('SELECT data FROM pydantic_row WHERE id = 1')).scalar_one()
+    assert json.loads(raw)[DISCRIMINATOR] == model_key(Small)  # noqa: S101
+    assert type(session.get(pydantic_row, 1).data) is Small  # noqa: S101
+    assert type(session.get(pydantic_row, 2).data) is Large  # noqa: S101
+
+
+def test_pydantic_type_falls_back_without_model_type(session_with_pydantic_model: tuple[Session, type]) -> None:
+    session, pydantic_row = session_with_pydantic_model
+    session.execute(
+        text('INSERT INTO pydantic_row (id, data) VALUES (:id, :data)'),
+        {'id': 1, 'data': json.dumps({'value': 1})},
+    )
+    session.commit()
+
+    row = session.get(pydantic_row, 1)
+
+    assert row is not None  # noqa: S101
+    assert row.data.value == 1  # noqa: S101
+
+
+def test_lazy_pydantic_type_decodes_on_attribute_access() -> None:
+    from nonebot_plugin_tetris_stats.db.models import LazyModel, LazyPydanticType, project  # noqa: PLC0415
+
+    class Base(DeclarativeBase):
+        pass
+
+    class LazyRow(Base):
+        __tablename__ = 'lazy_row'
+
+        id: Mapped[int] = mapped_column(Integer, primary_key=True)
+        data: Mapped[BaseModel] = mapped_column(LazyPydanticType([], {Small, Large}))
+
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(LazyRow(id=1, data=Large(value=1, extra=2)))
+        session.commit()
+        session.expire_all()
+
+        data = session.get(LazyRow, 1).data
+        assert type(data) is LazyModel  # noqa: S101
+        # 类型来自类型标识, 不需要验证
+        assert isinstance(data, Large)  # noqa: S101
+        assert data._value is None  # noqa: S101, SLF001
+        assert data.extra == 2  # noqa: S101, PLR2004
+        assert data == Large(value=1, extra=2)  # noqa: S101
+
+        extra = project(engine.dialect, LazyRow.data, 'extra')
+        assert extra is not None  # noqa: S101
+        assert session.execute(select(extra)).scalar_one() == '2'  # noqa: S101
+    engine.dispose()
+
+
+def test_model_key_uses_type_key_of_the_class_itself() -> None:
+    from typing import ClassVar  # noqa: PLC0415
+
+    from nonebot_plugin_tetris_stats.db.models import model_key  # noqa: PLC0415
+
+    class Keyed(BaseModel):
+        __type_key__: ClassVar[str] = 'keyed'
+
+        value: int
+
+    class Derived(Keyed):
+        pass
+
+    assert model_key(Keyed) == 'keyed'  # noqa: S101
+    # 子类不继承类型标识, 否则两个模型会共用同一个标识
+    assert model_key(Derived) != 'keyed'  # noqa: S101
+
+
+def test_historical_models_have_unique_type_keys() -> None:
+    from nonebot_plugin_tetris_stats.db.models import TYPE_KEY, PydanticType, model_key  # noqa: PLC0415
+    from nonebot_plugin_tetris_stats.games.tetrio.api.models import TETRIOHistoricalData  # noqa: PLC0415
+    from nonebot_plugin_tetris_stats.games.tos.api.models import TOSHistoricalData  # noqa: PLC0415
+
+    for column in (TETRIOHistoricalData.data, TOSHistoricalData.data):
+        column_type = column.type
+        assert isinstance(column_type, PydanticType)  # noqa: S101
+        models = column_type.models
+        # 写入类型标识的列中每个模型都需要显式的 TYPE_KEY, 移动模块后已写入的数据仍然可以找到模型
+        assert all(TYPE_KEY in i.__dict__ for i in models), models  # noqa: S101
+        assert len({model_key(i) for i in models}) == len(models)  # noqa: S101
@@ -0,0 +1,185 @@
+# ruff: noqa: PLC0415, PLR2004, ANN401
+
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Any
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+UTC = timezone.utc
+
+
+@pytest.mark.asyncio
+async def test_historical_queue_batches_and_deduplicates(monkeypatch: pytest.MonkeyPatch) -> None:
+    import nonebot_plugin_tetris_stats.db as db_module
+    from nonebot_plugin_tetris_stats.config.config import config
+    from nonebot_plugin_tetris_stats.db import HistoricalQueue, anti_duplicate_add
+    from nonebot_plugin_tetris_stats.games.top.api.models import TOPHistoricalData
+    from nonebot_plugin_tetris_stats.games.top.api.schemas.user_profile import Data, UserProfile
+
+    engine = create_async_engine('sqlite+aiosqlite:///:memory:')
+    async with engine.begin() as conn:
+        await conn.run_sync(
+            lambda sync_conn: TOPHistoricalData.metadata.create_all(sync_conn, tables=[TOPHistoricalData.__table__])
+        )
+    sessionmaker = async_sessionmaker(engine)
+    sessions = 0
+
+    @asynccontextmanager
+    async def fake_get_session() -> AsyncIterator[AsyncSession]:
+        nonlocal sessions
+        sessions += 1
+        async with sessionmaker() as session:
+            yield session
+
+    monkeypatch.setattr(db_module, 'get_session', fake_get_session)
+    monkeypatch.setattr(config.tetris.historical_queue, 'max_batch', 3)
+    monkeypatch.setattr(config.tetris.historical_queue, 'flush_interval', 3600)
+    update_time = datetime(2026, 6, 30, 12, tzinfo=UTC)
+
+    def profile(lpm: float) -> TOPHistoricalData:
+        return TOPHistoricalData(
+            user_unique_identifier='alice',
+            api_type='User Profile',
+            data=UserProfile(user_name='alice', today=Data(lpm=lpm, apm=lpm), total=None),
+            update_time=update_time,
+        )
+
+    async def stored() -> list[float]:
+        async with sessionmaker() as session:
+            return sorted(
+                i.today.lpm for i in await session.scalars(select(TOPHistoricalData.data)) if i.today is not None
+            )
+
+    # 没有 content_hash 的旧数据
+    async with sessionmaker() as session:
+        session.add(profile(1))
+        await session.commit()
+
+    await anti_duplicate_add(profile(1))
+    await anti_duplicate_add(profile(2))
+    await anti_duplicate_add(profile(2))
+    assert await stored() == [1]  # noqa: S101
+    assert sessions == 0  # noqa: S101
+
+    # 达到 max_batch 后在同一个 session 中写入
+    await anti_duplicate_add(profile(3))
+    assert await stored() == [1, 2, 3]  # noqa: S101
+    assert sessions == 1  # noqa: S101
+
+    # 已经入库的数据通过 content_hash 去重, 关闭时写入剩余数据
+    await anti_duplicate_add(profile(3))
+    await anti_duplicate_add(profile(4))
+    await HistoricalQueue.close()
+    assert await stored() == [1, 2, 3, 4]  # noqa: S101
+    async with sessionmaker() as session:
+        hashes = (await session.scalars(select(TOPHistoricalData.content_hash))).all()
+    assert hashes.count(None) == 1  # noqa: S101
+    await engine.dispose()
+
+
+@pytest.fixture
+async def top_sessionmaker(monkeypatch: pytest.MonkeyPatch) -> AsyncIterator[async_sessionmaker[AsyncSession]]:
+    import nonebot_plugin_tetris_stats.db as db_module
+    from nonebot_plugin_tetris_stats.config.config import config
+    from nonebot_plugin_tetris_stats.games.top.api.models import TOPHistoricalData
+
+    engine = create_async_engine('sqlite+aiosqlite:///:memory:')
+    async with engine.begin() as conn:
+        await conn.run_sync(
+            lambda sync_conn: TOPHistoricalData.metadata.create_all(sync_conn, tables=[TOPHistoricalData.__table__])
+        )
+    sessionmaker = async_sessionmaker(engine)
+
+    @asynccontextmanager
+    async def fake_get_session() -> AsyncIterator[AsyncSession]:
+        async with sessionmaker() as session:
+            yield session
+
+    monkeypatch.setattr(db_module, 'get_session', fake_get_session)
+    monkeypatch.setattr(config.tetris.historical_queue, 'flush_interval', 3600)
+    yield sessionmaker
+    await engine.dispose()
+
+
+def make_profile(user_name: str, lpm: float, update_time: datetime) -> Any:
+    from nonebot_plugin_tetris_stats.games.top.api.models import TOPHistoricalData
+    from nonebot_plugin_tetris_stats.games.top.api.schemas.user_profile import Data, UserProfile
+
+    return TOPHistoricalData(
+        user_unique_identifier=user_name,
+        api_type='User Profile',
+        data=UserProfile(user_name=user_name, today=Data(lpm=lpm, apm=lpm), total=None),
+        update_time=update_time,
+    )
+
+
+@pytest.mark.asyncio
+async def test_historical_queue_is_visible_to_reads(top_sessionmaker: async_sessionmaker[AsyncSession]) -> None:
+    from nonebot_plugin_tetris_stats.db import HistoricalQueue, anti_duplicate_add, get_nearest_data
+    from nonebot_plugin_tetris_stats.games.top.api.models import TOPHistoricalData
+
+    update_time = datetime(2026, 6, 30, 12, tzinfo=UTC)
+    await anti_duplicate_add(make_profile('alice', 1, update_time))
+
+    # 不等待定时器, 查询前会先写入队列中的数据
+    async with top_sessionmaker() as session:
+        nearest = await get_nearest_data(session, TOPHistoricalData, 'alice', 'User Profile', update_time)
+    assert nearest is not None  # noqa: S101
+    assert nearest[0].data.today is not None  # noqa: S101
+    assert nearest[0].data.today.lpm == 1  # noqa: S101
+    assert HistoricalQueue._pending == {}  # noqa: S101, SLF001
+    await HistoricalQueue.close()
+
+
+@pytest.mark.asyncio
+async def test_historical_queue_keeps_rows_on_failure(
+    top_sessionmaker: async_sessionmaker[AsyncSession], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    import nonebot_plugin_tetris_stats.db as db_module
+    from nonebot_plugin_tetris_stats.db import HistoricalQueue, anti_duplicate_add
+    from nonebot_plugin_tetris_stats.games.top.api.models import TOPHistoricalData
+
+    update_time = datetime(2026, 6, 30, 12, tzinfo=UTC)
+    fake_get_session = db_module.get_session
+    selects: list[str] = []
+
+    @asynccontextmanager
+    async def broken_get_session() -> AsyncIterator[AsyncSession]:
+        msg = 'database is down'
+        raise RuntimeError(msg)
+        yield  # pragma: no cover
+
+    @asynccontextmanager
+    async def counting_get_session() -> AsyncIterator[AsyncSession]:
+        async with fake_get_session() as session:
+            original = session.execute
+
+            async def execute(statement: Any, *args: Any, **kwargs: Any) -> Any:
+                selects.append(str(statement))
+                return await original(statement, *args, **kwargs)
+
+            session.execute = execute  # type: ignore[method-assign]
+            yield session
+
+    for lpm, user_name in enumerate(('alice', 'bob', 'carol')):
+        await anti_duplicate_add(make_profile(user_name, lpm, update_time))
+    monkeypatch.setattr(db_module, 'get_session', broken_get_session)
+    with pytest.raises(RuntimeError):
+        await HistoricalQueue.flush()
+    # 失败期间加入的新数据不会被旧数据覆盖
+    newer = make_profile('alice', 0, update_time)
+    await anti_duplicate_add(newer)
+    assert len(HistoricalQueue._pending) == 3  # noqa: S101, SLF001
+    assert newer in HistoricalQueue._pending.values()  # noqa: S101, SLF001
+
+    monkeypatch.setattr(db_module, 'get_session', counting_get_session)
+    await HistoricalQueue.close()
+    # 相同 update_time 的数据只需要一次去重查询
+    assert len(selects) == 1  # noqa: S101
+    async with top_sessionmaker() as session:
+        stored = (await session.scalars(select(TOPHistoricalData.user_unique_identifier))).all()
+    assert sorted(stored) == ['alice', 'bob', 'carol']  # noqa: S101
@@ -0,0 +1,61 @@
+from asyncio import CancelledError, create_task, gather, sleep
+from time import monotonic
+
+import pytest
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_allows_burst_then_spaces_calls() -> None:
+    from nonebot_plugin_tetris_stats.utils.limit import TokenBucket  # noqa: PLC0415
+
+    bucket = TokenBucket(rate=20, burst=2)
+    start = monotonic()
+    waits = [await bucket.acquire() for _ in range(4)]
+
+    assert waits[:2] == [0, 0]  # noqa: S101
+    assert monotonic() - start >= 0.09  # noqa: S101, PLR2004
+    assert bucket.stats.acquired == 4  # noqa: S101, PLR2004
+    assert bucket.stats.queue_depth == 0  # noqa: S101
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_is_fifo_and_cancellation_safe() -> None:
+    from nonebot_plugin_tetris_stats.utils.limit import TokenBucket  # noqa: PLC0415
+
+    bucket = TokenBucket(rate=20, burst=1)
+    order: list[int] = []
+
+    async def worker(index: int) -> None:
+        await bucket.acquire()
+        order.append(index)
+
+    await bucket.acquire()
+    tasks = [create_task(worker(i)) for i in range(4)]
+    await sleep(0)
+    assert bucket.stats.queue_depth == 4  # noqa: S101, PLR2004
+    tasks[1].cancel()
+    results = await gather(*tasks, return_exceptions=True)
+
+    assert isinstance(results[1], CancelledError)  # noqa: S101
+    assert order == [0, 2, 3]  # noqa: S101
+    assert bucket.stats.acquired == 4  # noqa: S101, PLR2004
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_lets_interactive_requests_jump_the_queue() -> None:
+    from nonebot_plugin_tetris_stats.utils.limit import Priority, TokenBucket  # noqa: PLC0415
+
+    bucket = TokenBucket(rate=20, burst=1)
+    order: list[str] = []
+
+    async def worker(name: str, priority: Priority) -> None:
+        await bucket.acquire(priority)
+        order.append(name)
+
+    await bucket.acquire()
+    tasks = [create_task(worker(f'crawl-{i}', Priority.BACKGROUND)) for i in range(3)]
+    await sleep(0)
+    tasks.append(create_task(worker('user', Priority.INTERACTIVE)))
+    await gather(*tasks)
+
+    assert order == ['user', 'crawl-0', 'crawl-1', 'crawl-2']  # noqa: S101
@@ -0,0 +1,293 @@
+from asyncio import Future, get_running_loop
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+from playwright.async_api import Error as PlaywrightError
+
+UTC = timezone.utc
+
+
+class FakeRequest:
+    @staticmethod
+    async def all_headers() -> dict[str, str]:
+        return {'User-Agent': 'a'}
+
+
+class FakeResponse:
+    request = FakeRequest()
+
+    @staticmethod
+    async def body() -> bytes:
+        return b'{}'
+
+
+class FakeResponseInfo:
+    def __init__(self, future: Future[FakeResponse]) -> None:
+        self.value = future
+
+
+class FakeContext:
+    @staticmethod
+    async def cookies() -> list[dict[str, object]]:
+        return [{'name': 'cf_clearance', 'value': '1', 'expires': -1}]
+
+
+class FakeNavigationPage:
+    """goto 总是抛出 error, 导航被打断时响应随后到达"""
+
+    context = FakeContext()
+
+    def __init__(self, error: str) -> None:
+        self.error = error
+        self.response: Future[FakeResponse] = get_running_loop().create_future()
+
+    @asynccontextmanager
+    async def expect_response(self, *_: object, **__: object) -> AsyncIterator[FakeResponseInfo]:
+        try:
+            yield FakeResponseInfo(self.response)
+        except BaseException:
+            self.response.cancel()
+            raise
+        await self.response
+
+    async def goto(self, *_: object, **__: object) -> None:
+        if 'interrupted' in self.error:
+            self.response.set_result(FakeResponse())
+        raise PlaywrightError(self.error)
+
+    @staticmethod
+    async def title() -> str:
+        return ''
+
+
+@pytest.mark.asyncio
+async def test_client_pool_shares_clients_per_origin_and_proxy() -> None:
+    from yarl import URL  # noqa: PLC0415
+
+    from nonebot_plugin_tetris_stats.utils.request import ClientPool  # noqa: PLC0415
+
+    client = ClientPool.get_client(URL('https://ch.tetr.io/api/users/alice'), None)
+
+    assert ClientPool.get_client(URL('https://ch.tetr.io/api/users/bob'), None) is client  # noqa: S101
+    assert ClientPool.get_client(URL('https://tetr.io/user-content/avatars/1.jpg'), None) is not client  # noqa: S101
+    assert ClientPool.get_client(URL('https://ch.tetr.io/api/users/alice'), 'http://127.0.0.1:7890') is not client  # noqa: S101
+
+    await ClientPool.close()
+
+    assert client.is_closed  # noqa: S101
+    assert ClientPool.get_client(URL('https://ch.tetr.io/api/users/alice'), None) is not client  # noqa: S101
+    await ClientPool.close()
+
+
+@pytest.mark.asyncio
+async def test_failover_request_hedges_slow_mirror_and_prefers_fast_one(monkeypatch: pytest.MonkeyPatch) -> None:
+    from asyncio import sleep  # noqa: PLC0415
+
+    from yarl import URL  # noqa: PLC0415
+
+    from nonebot_plugin_tetris_stats.utils import request as request_module  # noqa: PLC0415
+    from nonebot_plugin_tetris_stats.utils.exception import RequestError  # noqa: PLC0415
+
+    slow = URL('https://slow.example/api')
+    fast = URL('https://fast.example/api')
+    broken = URL('https://broken.example/api')
+    calls: list[URL] = []
+    cancelled: list[URL] = []
+
+    async def fake_request(url: URL, *_: object, **__: object) -> bytes:
+        calls.append(url)
+        if url == broken:
+            msg = 'bad gateway'
+            raise RequestError(msg, status_code=502)
+        if url == slow:
+            try:
+                await sleep(10)
+            except BaseException:
+                cancelled.append(url)
+                raise
+        return url.host.encode()  # type: ignore[union-attr]
+
+    monkeypatch.setattr(request_module, 'mirrors', {})
+    monkeypatch.setattr(request_module.config.tetris.failover, 'hedged', True)
+    monkeypatch.setattr(request_module.config.tetris.failover, 'hedge_delay', 0.05)
+    request = request_module.Request(None)
+    monkeypatch.setattr(request, 'request', fake_request)
+
+    result = await request.failover_request([slow, broken, fast], failover_code=[502], failover_exc=())
+
+    assert result == b'fast.example'  # noqa: S101
+    assert calls == [slow, broken, fast]  # noqa: S101
+    assert cancelled == [slow]  # noqa: S101
+    stats = request_module.get_mirror_stats()
+    assert stats[str(broken.origin())].failures == 1  # noqa: S101
+    assert stats[str(fast.origin())].latency is not None  # noqa: S101
+
+    calls.clear()
+    assert await request.failover_request([slow, broken, fast], failover_code=[502], failover_exc=()) == b'fast.example'  # noqa: S101
+    assert calls == [fast]  # noqa: S101
+
+
+@pytest.mark.asyncio
+async def test_request_fails_fast_on_open_circuit_and_failover_skips_it(monkeypatch: pytest.MonkeyPatch) -> None:
+    from yarl import URL  # noqa: PLC0415
+
+    from nonebot_plugin_tetris_stats.utils import request as request_module  # noqa: PLC0415
+    from nonebot_plugin_tetris_stats.utils.exception import CircuitOpenError, RequestError  # noqa: PLC0415
+
+    dead = URL('https://dead.example/api')
+    alive = URL('https://alive.example/api')
+    calls: list[URL] = []
+
+    async def fake_request(url: URL, *_: object, **__: object) -> bytes:
+        calls.append(url)
+        if url == dead:
+            msg = 'timeout'
+            raise RequestError(msg)
+        return b'ok'
+
+    monkeypatch.setattr(request_module, 'mirrors', {})
+    monkeypatch.setattr(request_module, 'breakers', {})
+    monkeypatch.setattr(request_module.config.tetris.failover, 'hedged', False)
+    request = request_module.Request(None)
+    monkeypatch.setattr(request, '_request', fake_request)
+
+    for _ in range(request_module.config.tetris.breaker.failure_threshold):
+        with pytest.raises(RequestError):
+            await request.request(dead)
+    calls.clear()
+    with pytest.raises(CircuitOpenError):
+        await request.request(dead)
+
+    assert await request.failover_request([dead, alive], failover_code=[], failover_exc=()) == b'ok'  # noqa: S101
+    assert calls == [alive]  # noqa: S101
+    assert request_module.get_breaker_stats()['dead.example'].state == 'open'  # noqa: S101
+
+
+@pytest.mark.asyncio
+async def test_anti_cloudflare_persists_clearance_in_background(tmp_path: Path) -> None:
+    from nonebot_plugin_tetris_stats.utils.request import AntiCloudflare  # noqa: PLC0415
+
+    anti_cloudflare = AntiCloudflare('ch.tetr.io')
+    anti_cloudflare.cache_path = tmp_path / 'ch.tetr.io_cloudflare_cache.json'
+    await anti_cloudflare.load()
+    anti_cloudflare.update({'User-Agent': 'a'}, {'cf_clearance': '1'}, datetime.now(UTC) + timedelta(seconds=10))
+    anti_cloudflare.update({'User-Agent': 'b'}, {'cf_clearance': '2'}, datetime.now(UTC) + timedelta(hours=1))
+    assert anti_cloudflare._write_task is not None  # noqa: S101, SLF001
+    await anti_cloudflare._write_task  # noqa: SLF001
+
+    restored = AntiCloudflare('ch.tetr.io')
+    restored.cache_path = anti_cloudflare.cache_path
+    await restored.load()
+
+    assert restored.credentials == ({'User-Agent': 'b'}, {'cf_clearance': '2'})  # noqa: S101
+    assert not restored.expiring  # noqa: S101
+    restored.expires_at = datetime.now(UTC) - timedelta(seconds=1)
+    assert restored.expiring  # noqa: S101
+    assert restored.credentials == ({}, None)  # noqa: S101
+    assert list(tmp_path.glob('*.tmp')) == []  # noqa: S101, ASYNC240
+
+
+@pytest.mark.asyncio
+async def test_anti_cloudflare_refresh_acquires_background_token(monkeypatch: pytest.MonkeyPatch) -> None:
+    from nonebot_plugin_tetris_stats.utils import request as request_module  # noqa: PLC0415
+    from nonebot_plugin_tetris_stats.utils.limit import TokenBucket  # noqa: PLC0415
+
+    limiter = TokenBucket(1, 1)
+    monkeypatch.setitem(request_module.limiters, 'ch.tetr.io', limiter)
+    calls: list[bool] = []
+
+    async def fake_call(_: object, url: str, proxy: str | None = None, *, renew: bool = False) -> bytes:  # noqa: ARG001
+        calls.append(renew)
+        return b'{}'
+
+    monkeypatch.setattr(request_module.AntiCloudflare, '__call__', fake_call)
+    anti_cloudflare = request_module.AntiCloudflare('ch.tetr.io')
+    anti_cloudflare.refresh('https://ch.tetr.io/api/users/test')
+    assert anti_cloudflare._refresh_task is not None  # noqa: S101, SLF001
+    await anti_cloudflare._refresh_task  # noqa: SLF001
+
+    assert calls == [True]  # noqa: S101
+    assert limiter.stats.acquired == 1  # noqa: S101
+
+
+@pytest.mark.asyncio
+async def test_anti_cloudflare_concurrent_load_waits_for_cache(tmp_path: Path) -> None:
+    from asyncio import gather  # noqa: PLC0415
+
+    from msgspec import json  # noqa: PLC0415
+
+    from nonebot_plugin_tetris_stats.utils.request import AntiCloudflare, CloudflareCache  # noqa: PLC0415
+
+    anti_cloudflare = AntiCloudflare('ch.tetr.io')
+    anti_cloudflare.cache_path = tmp_path / 'ch.tetr.io_cloudflare_cache.json'
+    anti_cloudflare.cache_path.write_bytes(json.encode(CloudflareCache(headers={'User-Agent': 'a'}, cookies={})))
+
+    async def load() -> tuple[dict, dict | None]:
+        await anti_cloudflare.load()
+        return anti_cloudflare.credentials
+
+    # 第二次调用不能在第一次读取完成之前返回空的 credentials
+    assert await gather(load(), load()) == [({'User-Agent': 'a'}, {})] * 2  # noqa: S101
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_prefers_success_completed_together(monkeypatch: pytest.MonkeyPatch) -> None:
+    from asyncio import Event  # noqa: PLC0415
+
+    from yarl import URL  # noqa: PLC0415
+
+    from nonebot_plugin_tetris_stats.utils import request as request_module  # noqa: PLC0415
+    from nonebot_plugin_tetris_stats.utils.exception import RequestError  # noqa: PLC0415
+
+    missing = URL('https://missing.example/api')
+    alive = URL('https://alive.example/api')
+    released = Event()
+
+    async def fake_request(url: URL, *_: object, **__: object) -> bytes:
+        if url == missing:
+            await released.wait()
+            msg = 'not found'
+            raise RequestError(msg, status_code=404)
+        # 对冲请求与第一个请求在同一轮事件循环中完成
+        released.set()
+        return b'ok'
+
+    monkeypatch.setattr(request_module, 'mirrors', {})
+    monkeypatch.setattr(request_module.config.tetris.failover, 'hedged', True)
+    monkeypatch.setattr(request_module.config.tetris.failover, 'hedge_delay', 0.01)
+    request = request_module.Request(None)
+    monkeypatch.setattr(request, 'request', fake_request)
+
+    # done 是集合, 多运行几次以覆盖不同的迭代顺序
+    for _ in range(10):
+        request_module.mirrors.clear()
+        released.clear()
+        assert await request.failover_request([missing, alive], failover_code=[502], failover_exc=()) == b'ok'  # noqa: S101
+
+
+@pytest.mark.asyncio
+async def test_anti_cloudflare_fails_fast_on_navigation_error(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    from asyncio import wait_for  # noqa: PLC0415
+
+    from nonebot_plugin_tetris_stats.utils.exception import RequestError  # noqa: PLC0415
+    from nonebot_plugin_tetris_stats.utils.request import AntiCloudflare  # noqa: PLC0415
+
+    anti_cloudflare = AntiCloudflare('ch.tetr.io')
+    anti_cloudflare.cache_path = tmp_path / 'ch.tetr.io_cloudflare_cache.json'
+    page = FakeNavigationPage('Navigation to "https://ch.tetr.io/" is interrupted by another navigation')
+
+    async def get_page(_: str | None) -> FakeNavigationPage:
+        return page
+
+    monkeypatch.setattr(anti_cloudflare, '_get_page', get_page)
+    # 通过验证后的导航打断了首次导航, 仍然等待 api 的响应
+    assert await anti_cloudflare('https://ch.tetr.io/api/users/test') == b'{}'  # noqa: S101
+
+    # 其余的导航错误直接失败, 不会等到 expect_response 超时
+    page = FakeNavigationPage('NS_ERROR_UNKNOWN_HOST')
+    with pytest.raises(RequestError):
+        await wait_for(anti_cloudflare('https://ch.tetr.io/api/users/test'), 1)
+    assert page.response.cancelled()  # noqa: S101
@@ -0,0 +1,106 @@
+# ruff: noqa: PLC0415, PLR2004
+
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+UTC = timezone.utc
+
+
+def test_downsampler_keeps_latest_point_per_tier_bucket(monkeypatch: pytest.MonkeyPatch) -> None:
+    from nonebot_plugin_tetris_stats.config.config import config
+    from nonebot_plugin_tetris_stats.db.retention import Downsampler
+
+    monkeypatch.setattr(config.tetris.retention, 'full_days', 7)
+    monkeypatch.setattr(config.tetris.retention, 'daily_days', 30)
+    now = datetime(2026, 6, 30, 12, tzinfo=UTC)
+    sampler = Downsampler(now)
+    times = [
+        now - timedelta(days=1),  # 完整保留
+        now - timedelta(days=1, hours=1),
+        now - timedelta(days=10, hours=1),  # 每天保留最新的一条
+        now - timedelta(days=10, hours=2),
+        now - timedelta(days=11),
+        datetime(2026, 5, 20, 12, tzinfo=UTC),  # 每周保留最新的一条 (同一个 ISO 周)
+        datetime(2026, 5, 18, 12, tzinfo=UTC),
+        datetime(2026, 5, 17, 12, tzinfo=UTC),  # 上一周
+    ]
+
+    assert [sampler.drop('alice', i) for i in times] == [  # noqa: S101
+        False,
+        False,
+        False,
+        True,
+        False,
+        False,
+        True,
+        False,
+    ]
+    # 不同的 key 互不影响
+    assert sampler.drop('bob', times[3]) is False  # noqa: S101
+
+
+@pytest.mark.asyncio
+async def test_compact_historical_dry_run_then_delete(monkeypatch: pytest.MonkeyPatch) -> None:
+    import nonebot_plugin_tetris_stats.db.retention as retention_module
+    from nonebot_plugin_tetris_stats.config.config import config
+    from nonebot_plugin_tetris_stats.games.top.api.models import TOPHistoricalData
+    from nonebot_plugin_tetris_stats.games.top.api.schemas.user_profile import Data, UserProfile
+    from nonebot_plugin_tetris_stats.games.top.query import get_compare_profile
+
+    engine = create_async_engine('sqlite+aiosqlite:///:memory:')
+    async with engine.begin() as conn:
+        await conn.run_sync(
+            lambda sync_conn: TOPHistoricalData.metadata.create_all(sync_conn, tables=[TOPHistoricalData.__table__])
+        )
+    sessionmaker = async_sessionmaker(engine)
+
+    @asynccontextmanager
+    async def fake_get_session() -> AsyncIterator[AsyncSession]:
+        async with sessionmaker() as session:
+            yield session
+
+    monkeypatch.setattr(retention_module, 'get_session', fake_get_session)
+    monkeypatch.setattr(config.tetris.retention, 'full_days', 7)
+    monkeypatch.setattr(config.tetris.retention, 'daily_days', 30)
+    now = datetime.now(UTC)
+    day = (now - timedelta(days=10)).replace(hour=12, minute=0, second=0, microsecond=0)
+    async with sessionmaker() as session:
+        session.add_all(
+            TOPHistoricalData(
+                user_unique_identifier='alice',
+                api_type='User Profile',
+                data=UserProfile(user_name='alice', today=Data(lpm=hour, apm=hour), total=None),
+                update_time=day + timedelta(hours=hour),
+            )
+            for hour in range(6)
+        )
+        session.add(
+            TOPHistoricalData(
+                user_unique_identifier='alice',
+                api_type='User Profile',
+                data=UserProfile(user_name='alice', today=Data(lpm=99, apm=99), total=None),
+                update_time=now - timedelta(hours=1),
+            )
+        )
+        await session.commit()
+
+    report = await retention_module.compact_historical(TOPHistoricalData, now, dry_run=True)
+    assert report.rows == 5  # noqa: S101
+    assert report.size > 0  # noqa: S101
+    async with sessionmaker() as session:
+        assert len((await session.scalars(select(TOPHistoricalData))).all()) == 7  # noqa: S101
+
+    assert await retention_module.compact_historical(TOPHistoricalData, now, dry_run=False) == report  # noqa: S101
+    async with sessionmaker() as session:
+        assert len((await session.scalars(select(TOPHistoricalData))).all()) == 2  # noqa: S101
+        # 那一天只剩最后一条, 按时间查找仍然落在同一天内
+        profile = await get_compare_profile(session, 'alice', day)
+    assert profile is not None  # noqa: S101
+    assert profile.today is not None  # noqa: S101
+    assert profile.today.lpm == 5  # noqa: S101
+    await engine.dispose()
@@ -0,0 +1,169 @@
+from asyncio import Event, Semaphore, create_task, sleep
+
+import pytest
+
+
+class FakePage:
+    def __init__(self) -> None:
+        self.closed = False
+
+    def is_closed(self) -> bool:
+        return self.closed
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+@pytest.mark.asyncio
+async def test_page_pool_reuses_pages_and_rejects_when_queue_is_full(monkeypatch: pytest.MonkeyPatch) -> None:
+    from nonebot_plugin_tetris_stats.utils import screenshot  # noqa: PLC0415
+    from nonebot_plugin_tetris_stats.utils.exception import RenderQueueFullError  # noqa: PLC0415
+
+    created: list[FakePage] = []
+
+    async def new_page() -> FakePage:
+        created.append(FakePage())
+        return created[-1]
+
+    monkeypatch.setattr(screenshot.PagePool, '_new_page', new_page)
+    monkeypatch.setattr(screenshot.PagePool, '_semaphore', Semaphore(1))
+    monkeypatch.setattr(screenshot.PagePool, '_idle', [])
+    monkeypatch.setattr(screenshot.config.tetris.screenshot, 'queue_size', 1)
+    release = Event()
+
+    async def render() -> None:
+        async with screenshot.PagePool.acquire():
+            await release.wait()
+
+    holder = create_task(render())
+    waiter = create_task(render())
+    await sleep(0)
+    with pytest.raises(RenderQueueFullError):
+        async with screenshot.PagePool.acquire():
+            ...
+    release.set()
+    await holder
+    await waiter
+
+    with pytest.raises(RuntimeError):
+        async with screenshot.PagePool.acquire():
+            raise RuntimeError
+
+    assert len(created) == 1  # noqa: S101
+    assert created[0].closed  # noqa: S101
+    assert screenshot.PagePool._idle == []  # noqa: S101, SLF001
+
+
+class FakeLocator:
+    def __init__(self, page: 'FakeRenderPage') -> None:
+        self.page = page
+
+    async def screenshot(self, **_: object) -> bytes:
+        return f'{self.page.viewport_size["width"]}x{self.page.viewport_size["height"]}'.encode()
+
+
+class FakeRenderPage(FakePage):
+    """#content 的宽度不会超过视口, 与真实的块级元素一致"""
+
+    def __init__(self, sizes: dict[str, tuple[int, int]]) -> None:
+        super().__init__()
+        self.sizes = sizes
+        self.url = ''
+        self.viewport_size = {'width': 1280, 'height': 720}
+
+    async def goto(self, url: str) -> None:
+        self.url = url
+
+    async def wait_for_selector(self, _: str) -> None: ...
+
+    async def evaluate(self, script: str, *_: object) -> object:
+        if 'typeof' in script:
+            return False
+        width, height = self.sizes[self.url]
+        return {'width': min(width, self.viewport_size['width']), 'height': height}
+
+    async def set_viewport_size(self, size: dict[str, int]) -> None:
+        self.viewport_size = size
+
+    def locator(self, _: str) -> FakeLocator:
+        return FakeLocator(self)
+
+
+@pytest.mark.asyncio
+async def test_screenshot_resets_viewport_of_reused_page(monkeypatch: pytest.MonkeyPatch) -> None:
+    from nonebot_plugin_tetris_stats.utils import screenshot  # noqa: PLC0415
+
+    page = FakeRenderPage({'small': (600, 300), 'large': (1000, 800)})
+    monkeypatch.setattr(screenshot.PagePool, '_semaphore', Semaphore(1))
+    monkeypatch.setattr(screenshot.PagePool, '_idle', [page])
+
+    assert await screenshot.screenshot('small') == b'600x300'  # noqa: S101
+    # 同一个页面, 不恢复视口时会在 600 宽度下测量
+    assert await screenshot.screenshot('large') == b'1000x800'  # noqa: S101
+    assert screenshot.PagePool._idle == [page]  # noqa: S101, SLF001
+
+
+class FakeClientSidePage(FakeRenderPage):
+    """提供 window.__TETRIS_STATS_RENDER__ 的页面, 客户端渲染时以 path 作为当前路由"""
+
+    def __init__(self, sizes: dict[str, tuple[int, int]]) -> None:
+        super().__init__(sizes)
+        self.navigations: list[str] = []
+        self.rendered: list[str] = []
+        self.fail = False
+
+    async def goto(self, url: str) -> None:
+        self.navigations.append(url)
+        await super().goto(url)
+
+    async def evaluate(self, script: str, *args: object) -> object:
+        from playwright.async_api import Error as PlaywrightError  # noqa: PLC0415
+
+        if 'typeof' in script:
+            return True
+        if '__TETRIS_STATS_RENDER__' in script:
+            if self.fail:
+                msg = 'render failed'
+                raise PlaywrightError(msg)
+            path = args[0]['path']  # type: ignore[index]
+            self.rendered.append(path)
+            self.url = path
+            return None
+        return await super().evaluate(script, *args)
+
+
+@pytest.mark.asyncio
+async def test_screenshot_renders_on_client_side_and_falls_back(monkeypatch: pytest.MonkeyPatch) -> None:
+    from nonebot_plugin_tetris_stats.utils import screenshot  # noqa: PLC0415
+
+    page = FakeClientSidePage({'small': (600, 300), 'large': (1000, 800)})
+    version = 'v1'
+    monkeypatch.setattr(screenshot.PagePool, '_semaphore', Semaphore(1))
+    monkeypatch.setattr(screenshot.PagePool, '_idle', [page])
+    monkeypatch.setattr(screenshot.config.tetris.screenshot, 'client_side_render', True)
+    monkeypatch.setattr(screenshot, 'template_version', lambda: version)
+
+    # 第一次使用页面时需要加载模板
+    assert await screenshot.screenshot('small', path='small', data='{}') == b'600x300'  # noqa: S101
+    assert page.navigations == ['small']  # noqa: S101
+    assert screenshot.client_side_pages[page] == 'v1'  # noqa: S101
+
+    # 模板版本一致时直接在页面中渲染, 不会重新导航
+    assert await screenshot.screenshot('large', path='large', data='{}') == b'1000x800'  # noqa: S101
+    assert page.navigations == ['small']  # noqa: S101
+    assert page.rendered == ['large']  # noqa: S101
+
+    # 模板更新后回退到重新加载页面
+    version = 'v2'
+    assert await screenshot.screenshot('small', path='small', data='{}') == b'600x300'  # noqa: S101
+    assert page.navigations == ['small', 'small']  # noqa: S101
+    assert page.rendered == ['large']  # noqa: S101
+    assert screenshot.client_side_pages[page] == 'v2'  # noqa: S101
+
+    # 客户端渲染失败时页面不再被视为支持客户端渲染, 并回退到重新加载页面
+    page.fail = True
+    assert not await screenshot.client_side_render(page, 'large', '{}')  # noqa: S101
+    assert page not in screenshot.client_side_pages  # noqa: S101
+    screenshot.client_side_pages[page] = version
+    assert await screenshot.screenshot('large', path='large', data='{}') == b'1000x800'  # noqa: S101
+    assert page.navigations == ['small', 'small', 'large']  # noqa: S101
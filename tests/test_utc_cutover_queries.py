@@ -20,9 +20,11 @@ async def utc_sessionmaker() -> AsyncIterator[tuple[async_sessionmaker[AsyncSess
     from nonebot_plugin_tetris_stats.db.models import TriggerHistoricalDataV2
     from nonebot_plugin_tetris_stats.games.tetrio.api.models import TETRIOHistoricalData
     from nonebot_plugin_tetris_stats.games.tetrio.models import (
+        TETRIOLeagueEntry,
         TETRIOLeagueHistorical,
+        TETRIOLeagueMetrics,
+        TETRIOLeagueSnapshot,
         TETRIOLeagueStats,
-        TETRIOLeagueUserMap,
         TETRIOUserUniqueIdentifier,
     )
     from nonebot_plugin_tetris_stats.games.top.api.models import TOPHistoricalData
@@ -40,7 +42,9 @@ async def utc_sessionmaker() -> AsyncIterator[tuple[async_sessionmaker[AsyncSess
                     TETRIOLeagueStats.__table__,
                     TETRIOLeagueHistorical.__table__,
                     TETRIOUserUniqueIdentifier.__table__,
-                    TETRIOLeagueUserMap.__table__,
+                    TETRIOLeagueSnapshot.__table__,
+                    TETRIOLeagueMetrics.__table__,
+                    TETRIOLeagueEntry.__table__,
                     TriggerHistoricalDataV2.__table__,
                 ],
             )
@@ -50,9 +54,9 @@ async def utc_sessionmaker() -> AsyncIterator[tuple[async_sessionmaker[AsyncSess
         {
             'TriggerHistoricalDataV2': TriggerHistoricalDataV2,
             'TETRIOHistoricalData': TETRIOHistoricalData,
+            'TETRIOLeagueEntry': TETRIOLeagueEntry,
             'TETRIOLeagueHistorical': TETRIOLeagueHistorical,
             'TETRIOLeagueStats': TETRIOLeagueStats,
-            'TETRIOLeagueUserMap': TETRIOLeagueUserMap,
             'TETRIOUserUniqueIdentifier': TETRIOUserUniqueIdentifier,
             'TOPHistoricalData': TOPHistoricalData,
             'TOSHistoricalData': TOSHistoricalData,
@@ -386,8 +390,19 @@ async def test_tetrio_nearest_historical_accepts_aware_utc(
         await session.flush()
         session.add_all(
             [
-                models['TETRIOLeagueUserMap'](stats_id=stats.id, uid_id=uid.id, hist_id=before_hist.id, entry_index=0),
-                models['TETRIOLeagueUserMap'](stats_id=stats.id, uid_id=uid.id, hist_id=after_hist.id, entry_index=0),
+                *(
+                    models['TETRIOLeagueEntry'](
+                        stats_id=stats.id,
+                        uid_id=uid.id,
+                        update_time=hist.update_time,
+                        tr=(league := hist.data.data.entries[0].league).tr,
+                        pps=league.pps,
+                        apm=league.apm,
+                        vs=league.vs,
+                        rank=league.rank,
+                    )
+                    for hist in (before_hist, after_hist)
+                ),
             ]
         )
         await session.commit()
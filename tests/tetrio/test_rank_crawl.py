@@ -0,0 +1,518 @@
+# ruff: noqa: PLC0415, PLR2004, ANN401
+
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+UTC = timezone.utc
+
+
+def make_page(players: list[tuple[str, str, float, float]], *, offset: int = 0) -> Any:
+    """players: (id, rank, tr, pps), apm / vs 由 pps 推导"""
+    from nonebot_plugin_tetris_stats.games.tetrio.api.schemas.base import ArCounts, Cache, P
+    from nonebot_plugin_tetris_stats.games.tetrio.api.schemas.leaderboards.by import (
+        BySuccessModel,
+        Data,
+        Entry,
+        League,
+    )
+
+    now = datetime.now(UTC)
+    return BySuccessModel(
+        success=True,
+        cache=Cache(status='cached', cached_at=now, cached_until=now + timedelta(minutes=5)),
+        data=Data(
+            entries=[
+                Entry(
+                    _id=player_id,
+                    username=player_id,
+                    role='user',
+                    xp=0.0,
+                    gamesplayed=10,
+                    gameswon=5,
+                    gametime=1.0,
+                    ar=0,
+                    ar_counts=ArCounts(),
+                    p=P(pri=tr, sec=float(offset + index), ter=0.0),
+                    league=League(
+                        gamesplayed=10,
+                        gameswon=5,
+                        tr=tr,
+                        gxe=50.0,
+                        rank=rank,
+                        bestrank=rank,
+                        glicko=1500.0,
+                        rd=60.0,
+                        decaying=False,
+                        pps=pps,
+                        apm=pps * 20,
+                        vs=pps * 40,
+                    ),
+                )
+                for index, (player_id, rank, tr, pps) in enumerate(players)
+            ]
+        ),
+    )
+
+
+def make_players() -> list[tuple[str, str, float, float]]:
+    from nonebot_plugin_tetris_stats.games.tetrio.constant import RANK_PERCENTILE
+
+    # 每个段位两名玩家, TR 从高到低
+    return [
+        (f'{rank}-{i}', rank, 25000 - index * 100 - i, 1 + (index + i) % 5)
+        for index, rank in enumerate(RANK_PERCENTILE)
+        for i in range(2)
+    ]
+
+
+def test_league_aggregate_matches_full_list_statistics() -> None:
+    from math import floor
+    from statistics import mean
+
+    from nonebot_plugin_tetris_stats.games.tetrio.constant import RANK_PERCENTILE
+    from nonebot_plugin_tetris_stats.games.tetrio.models import TETRIOLeagueStats
+    from nonebot_plugin_tetris_stats.games.tetrio.rank.aggregate import LeagueAggregate, build_fields, holders
+
+    players = make_players()
+    aggregate = LeagueAggregate()
+    pages = [make_page(players[start : start + 7], offset=start) for start in range(0, len(players), 7)]
+    for key, page in enumerate(pages):
+        aggregate.add_page(page, key)
+    summaries = aggregate.summarize()
+    entries = {(key, index): pages[key].data.entries[index] for key, index in holders(summaries)}
+    stats = TETRIOLeagueStats(raw=[], fields=[], update_time=datetime.now(UTC))
+    fields = {i.rank: i for i in build_fields(stats, summaries, entries)}
+
+    trs = sorted((i[2] for i in players), reverse=True)
+    for rank, percentile in RANK_PERCENTILE.items():
+        rank_players = [i for i in players if i[1] == rank]
+        field = fields[rank]
+        assert field.tr_line == trs[floor(percentile / 100 * len(trs)) - 1]  # noqa: S101
+        assert field.player_count == 2  # noqa: S101
+        assert field.avg_pps == pytest.approx(mean(i[3] for i in rank_players))  # noqa: S101
+        assert field.low_apm.id == min(rank_players, key=lambda i: i[3])[0]  # noqa: S101
+        assert field.high_vs.id == max(rank_players, key=lambda i: i[3])[0]  # noqa: S101
+    assert aggregate.tr_lines([50, 100]) == [trs[len(trs) // 2 - 1], trs[-1]]  # noqa: S101
+
+
+@pytest.fixture
+async def sessionmaker() -> AsyncIterator[async_sessionmaker[AsyncSession]]:
+    from nonebot_plugin_tetris_stats.games.tetrio.models import (
+        TETRIOLeagueEntry,
+        TETRIOLeagueHistorical,
+        TETRIOLeagueSnapshot,
+        TETRIOLeagueStats,
+        TETRIOLeagueStatsField,
+        TETRIOUserUniqueIdentifier,
+    )
+
+    engine = create_async_engine('sqlite+aiosqlite:///:memory:')
+    async with engine.begin() as conn:
+        await conn.run_sync(
+            lambda sync_conn: TETRIOLeagueStats.metadata.create_all(
+                sync_conn,
+                tables=[
+                    TETRIOLeagueStats.__table__,
+                    TETRIOLeagueHistorical.__table__,
+                    TETRIOLeagueStatsField.__table__,
+                    TETRIOUserUniqueIdentifier.__table__,
+                    TETRIOLeagueSnapshot.__table__,
+                    TETRIOLeagueEntry.__table__,
+                ],
+            )
+        )
+    yield async_sessionmaker(engine)
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_league_crawl_resumes_from_last_persisted_page(
+    sessionmaker: async_sessionmaker[AsyncSession], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    import nonebot_plugin_tetris_stats.games.tetrio.rank as rank_module
+    from nonebot_plugin_tetris_stats.games.tetrio.models import (
+        TETRIOLeagueEntry,
+        TETRIOLeagueHistorical,
+        TETRIOLeagueSnapshot,
+        TETRIOLeagueStats,
+        TETRIOLeagueStatsField,
+        TETRIOUserUniqueIdentifier,
+    )
+    from nonebot_plugin_tetris_stats.games.tetrio.snapshot import LeagueSnapshot
+
+    players = make_players()
+    pages = [make_page(players[start : start + 10], offset=start) for start in range(0, len(players), 10)]
+    calls: list[tuple[str, Any]] = []
+    fail = True
+
+    async def fake_by(_by_type: str, parameter: Any, x_session_id: Any, *_: Any) -> Any:
+        calls.append((parameter.after, x_session_id))
+        if len(calls) == 2 and fail:
+            msg = 'crawler killed'
+            raise RuntimeError(msg)
+        return pages[len(calls) - 1 if fail else len(calls) - 2]
+
+    async def noop() -> None:
+        pass
+
+    @asynccontextmanager
+    async def fake_get_session() -> AsyncIterator[AsyncSession]:
+        async with sessionmaker() as session:
+            yield session
+
+    monkeypatch.setattr(rank_module, 'by', fake_by)
+    monkeypatch.setattr(rank_module, 'get_session', fake_get_session)
+    monkeypatch.setattr(rank_module, 'prerender_images', noop)
+    monkeypatch.setattr(rank_module, 'PAGE_SIZE', 10)
+
+    with pytest.raises(RuntimeError):
+        await rank_module.get_tetra_league_data()
+    async with sessionmaker() as session:
+        assert len((await session.scalars(select(TETRIOLeagueHistorical))).all()) == 1  # noqa: S101
+        assert (await session.scalars(select(TETRIOLeagueStatsField))).all() == []  # noqa: S101
+
+    fail = False
+    await rank_module.get_tetra_league_data()
+
+    # 第二次运行从第一页的最后一名玩家之后继续, 并沿用同一个 session id
+    assert calls[2] == (pages[0].data.entries[-1].p.to_prisecter(), calls[0][1])  # noqa: S101
+    async with sessionmaker() as session:
+        assert len((await session.scalars(select(TETRIOLeagueStats))).all()) == 1  # noqa: S101
+        # 快照写入后原始页面被删除
+        assert (await session.scalars(select(TETRIOLeagueHistorical))).all() == []  # noqa: S101
+        assert len((await session.scalars(select(TETRIOLeagueEntry))).all()) == len(players)  # noqa: S101
+        fields = (await session.scalars(select(TETRIOLeagueStatsField))).all()
+        snapshot = (await session.scalars(select(TETRIOLeagueSnapshot))).one()
+        uid_id = await session.scalar(
+            select(TETRIOUserUniqueIdentifier.id).where(TETRIOUserUniqueIdentifier.user_unique_identifier == 'x-1')
+        )
+    assert len(fields) == 18  # noqa: S101
+    assert sum(i.player_count for i in fields) == len(players)  # noqa: S101
+    # 中断前保存的页面同样被写入快照
+    assert snapshot.player_count == len(players)  # noqa: S101
+    assert uid_id is not None  # noqa: S101
+    row = LeagueSnapshot(snapshot.data).get(uid_id)
+    assert row is not None  # noqa: S101
+    assert row.rank == 'x'  # noqa: S101
+    assert row.tr == next(i[2] for i in players if i[0] == 'x-1')  # noqa: S101
+
+
+@pytest.mark.asyncio
+async def test_league_compaction_keeps_nearest_snapshot(
+    sessionmaker: async_sessionmaker[AsyncSession], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    import nonebot_plugin_tetris_stats.games.tetrio.rank as rank_module
+    import nonebot_plugin_tetris_stats.games.tetrio.rank.retention as retention_module
+    from nonebot_plugin_tetris_stats.config.config import config
+    from nonebot_plugin_tetris_stats.games.tetrio.models import (
+        TETRIOLeagueEntry,
+        TETRIOLeagueHistorical,
+        TETRIOLeagueSnapshot,
+        TETRIOLeagueStats,
+        TETRIOLeagueStatsField,
+    )
+    from nonebot_plugin_tetris_stats.games.tetrio.query.v1 import get_nearest_league_historical
+
+    players = make_players()
+    pages = [make_page(players[start : start + 10], offset=start) for start in range(0, len(players), 10)]
+    calls = 0
+
+    async def fake_by(*_: Any) -> Any:
+        nonlocal calls
+        calls += 1
+        return pages[(calls - 1) % len(pages)]
+
+    async def noop() -> None:
+        pass
+
+    @asynccontextmanager
+    async def fake_get_session() -> AsyncIterator[AsyncSession]:
+        async with sessionmaker() as session:
+            yield session
+
+    monkeypatch.setattr(rank_module, 'by', fake_by)
+    monkeypatch.setattr(rank_module, 'get_session', fake_get_session)
+    monkeypatch.setattr(rank_module, 'prerender_images', noop)
+    monkeypatch.setattr(rank_module, 'PAGE_SIZE', 10)
+    monkeypatch.setattr(retention_module, 'get_session', fake_get_session)
+    monkeypatch.setattr(config.tetris.retention, 'full_days', 0)
+
+    await rank_module.get_tetra_league_data()
+    await rank_module.get_tetra_league_data()
+    async with sessionmaker() as session:
+        first, second = (await session.scalars(select(TETRIOLeagueStats.id).order_by(TETRIOLeagueStats.id))).all()
+        # 模拟在快照出现之前完成的抓取, 压缩时需要从原始页面生成快照
+        await session.execute(delete(TETRIOLeagueSnapshot).where(TETRIOLeagueSnapshot.stats_id == second))
+        stats = await session.get_one(TETRIOLeagueStats, second)
+        session.add_all(
+            TETRIOLeagueHistorical(request_id=uuid4(), data=page, update_time=stats.update_time, stats=stats)
+            for page in pages
+        )
+        await session.commit()
+
+    now = datetime.now(UTC) + timedelta(seconds=1)
+    reports = {i.table: i for i in await retention_module.compact_league(now, dry_run=True)}
+    assert reports['nb_t_io_tl_hist'].rows == len(pages)  # noqa: S101
+    assert reports['nb_t_io_tl_hist'].size > 0  # noqa: S101
+    assert reports['nb_t_io_tl_stats_field'].rows == 18  # noqa: S101
+    assert reports['nb_t_io_tl_snap'].rows == 1  # noqa: S101
+    assert reports['nb_t_io_tl_stats'].rows == 1  # noqa: S101
+    async with sessionmaker() as session:
+        assert len((await session.scalars(select(TETRIOLeagueHistorical))).all()) == len(pages)  # noqa: S101
+
+    await retention_module.compact_league(now, dry_run=False)
+    async with sessionmaker() as session:
+        # 同一天内只保留最新的抓取, 原始页面被快照替代
+        assert (await session.scalars(select(TETRIOLeagueStats.id))).all() == [second]  # noqa: S101
+        assert (await session.scalars(select(TETRIOLeagueSnapshot.stats_id))).all() == [second]  # noqa: S101
+        assert (await session.scalars(select(TETRIOLeagueHistorical))).all() == []  # noqa: S101
+        assert len((await session.scalars(select(TETRIOLeagueStatsField))).all()) == 18  # noqa: S101
+        # 保留下来的抓取的玩家数值仍然可以直接查询
+        assert set((await session.scalars(select(TETRIOLeagueEntry.stats_id))).all()) == {second}  # noqa: S101
+        assert first != second  # noqa: S101
+
+        historical = await get_nearest_league_historical(session, 'x-1', now)
+    assert historical is not None  # noqa: S101
+    assert historical.metrics.pps == next(i[3] for i in players if i[0] == 'x-1')  # noqa: S101
+
+
+@pytest.mark.asyncio
+async def test_league_entries_are_pruned_to_snapshots(
+    sessionmaker: async_sessionmaker[AsyncSession], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    import nonebot_plugin_tetris_stats.games.tetrio.rank as rank_module
+    from nonebot_plugin_tetris_stats.config.config import config
+    from nonebot_plugin_tetris_stats.games.tetrio.models import (
+        TETRIOLeagueEntry,
+        TETRIOLeagueSnapshot,
+        TETRIOLeagueStats,
+    )
+    from nonebot_plugin_tetris_stats.games.tetrio.query.v1 import get_nearest_league_historical
+
+    old_players = make_players()
+    new_players = [(player_id, rank, tr, pps + 1) for player_id, rank, tr, pps in old_players]
+    crawls = [
+        [make_page(players[start : start + 10], offset=start) for start in range(0, len(players), 10)]
+        for players in (old_players, new_players)
+    ]
+    calls = 0
+
+    async def fake_by(*_: Any) -> Any:
+        nonlocal calls
+        calls += 1
+        pages = crawls[0] if calls <= len(crawls[0]) else crawls[1]
+        return pages[(calls - 1) % len(pages)]
+
+    async def noop() -> None:
+        pass
+
+    @asynccontextmanager
+    async def fake_get_session() -> AsyncIterator[AsyncSession]:
+        async with sessionmaker() as session:
+            yield session
+
+    monkeypatch.setattr(rank_module, 'by', fake_by)
+    monkeypatch.setattr(rank_module, 'get_session', fake_get_session)
+    monkeypatch.setattr(rank_module, 'prerender_images', noop)
+    monkeypatch.setattr(rank_module, 'PAGE_SIZE', 10)
+    monkeypatch.setattr(config.tetris, 'league_entry_days', 7)
+
+    await rank_module.get_tetra_league_data()
+    old_time = datetime.now(UTC) - timedelta(days=30)
+    async with sessionmaker() as session:
+        # 模拟一个月前的抓取
+        await session.execute(update(TETRIOLeagueEntry).values(update_time=old_time))
+        await session.execute(update(TETRIOLeagueSnapshot).values(update_time=old_time))
+        await session.commit()
+    await rank_module.get_tetra_league_data()
+
+    async with sessionmaker() as session:
+        _, second = (await session.scalars(select(TETRIOLeagueStats.id).order_by(TETRIOLeagueStats.id))).all()
+        # 超过 league_entry_days 的玩家数值只保留在快照中
+        assert set((await session.scalars(select(TETRIOLeagueEntry.stats_id))).all()) == {second}  # noqa: S101
+        old = await get_nearest_league_historical(session, 'x-1', old_time)
+        new = await get_nearest_league_historical(session, 'x-1', datetime.now(UTC))
+    pps = next(i[3] for i in old_players if i[0] == 'x-1')
+    assert old is not None  # noqa: S101
+    assert old.metrics.pps == pps  # noqa: S101
+    assert old.delta == timedelta(0)  # noqa: S101
+    assert new is not None  # noqa: S101
+    assert new.metrics.pps == pps + 1  # noqa: S101
+
+
+@pytest.mark.asyncio
+async def test_overlapping_league_crawls_run_once(
+    sessionmaker: async_sessionmaker[AsyncSession], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    from asyncio import Event, create_task, wait_for
+
+    import nonebot_plugin_tetris_stats.games.tetrio.rank as rank_module
+    from nonebot_plugin_tetris_stats.games.tetrio.models import (
+        TETRIOLeagueEntry,
+        TETRIOLeagueSnapshot,
+        TETRIOLeagueStats,
+        TETRIOLeagueStatsField,
+    )
+
+    players = make_players()
+    pages = [make_page(players[start : start + 10], offset=start) for start in range(0, len(players), 10)]
+    calls = 0
+    started = Event()
+    released = Event()
+
+    async def fake_by(*_: Any) -> Any:
+        nonlocal calls
+        calls += 1
+        started.set()
+        await released.wait()
+        return pages[calls - 1]
+
+    async def noop() -> None:
+        pass
+
+    @asynccontextmanager
+    async def fake_get_session() -> AsyncIterator[AsyncSession]:
+        async with sessionmaker() as session:
+            yield session
+
+    monkeypatch.setattr(rank_module, 'by', fake_by)
+    monkeypatch.setattr(rank_module, 'get_session', fake_get_session)
+    monkeypatch.setattr(rank_module, 'prerender_images', noop)
+    monkeypatch.setattr(rank_module, 'PAGE_SIZE', 10)
+
+    # 启动时的抓取还没有完成时定时抓取开始运行
+    startup = create_task(rank_module.get_tetra_league_data(prerender=False))
+    await started.wait()
+    # 重叠的抓取直接返回, 不会等待正在进行的抓取
+    await wait_for(rank_module.get_tetra_league_data(), 1)
+    assert calls == 1  # noqa: S101
+    released.set()
+    await startup
+
+    assert calls == len(pages)  # noqa: S101
+    async with sessionmaker() as session:
+        assert len((await session.scalars(select(TETRIOLeagueStats))).all()) == 1  # noqa: S101
+        assert len((await session.scalars(select(TETRIOLeagueSnapshot))).all()) == 1  # noqa: S101
+        assert len((await session.scalars(select(TETRIOLeagueStatsField))).all()) == 18  # noqa: S101
+        assert len((await session.scalars(select(TETRIOLeagueEntry))).all()) == len(players)  # noqa: S101
+
+
+@pytest.mark.asyncio
+async def test_league_crawl_waits_out_open_circuit(
+    sessionmaker: async_sessionmaker[AsyncSession], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    import nonebot_plugin_tetris_stats.games.tetrio.rank as rank_module
+    from nonebot_plugin_tetris_stats.games.tetrio.models import TETRIOLeagueSnapshot
+    from nonebot_plugin_tetris_stats.utils.exception import CircuitOpenError
+
+    players = make_players()
+    pages = [make_page(players[start : start + 10], offset=start) for start in range(0, len(players), 10)]
+    # 熔断持续的次数超过 retry 的最大重试次数
+    open_calls = 20
+    calls = 0
+    waits: list[float] = []
+
+    async def fake_by(*_: Any) -> Any:
+        nonlocal calls
+        calls += 1
+        if calls <= open_calls:
+            msg = 'circuit open'
+            raise CircuitOpenError(msg, retry_after=0 if calls % 2 else 30)
+        return pages[calls - open_calls - 1]
+
+    async def fake_sleep(delay: float) -> None:
+        waits.append(delay)
+
+    async def noop() -> None:
+        pass
+
+    @asynccontextmanager
+    async def fake_get_session() -> AsyncIterator[AsyncSession]:
+        async with sessionmaker() as session:
+            yield session
+
+    monkeypatch.setattr(rank_module, 'by', fake_by)
+    monkeypatch.setattr(rank_module, 'sleep', fake_sleep)
+    monkeypatch.setattr(rank_module, 'get_session', fake_get_session)
+    monkeypatch.setattr(rank_module, 'prerender_images', noop)
+    monkeypatch.setattr(rank_module, 'PAGE_SIZE', 10)
+
+    await rank_module.get_tetra_league_data()
+
+    # 每次熔断都等待冷却结束, retry_after 为 0 时也会等待
+    assert waits == [rank_module.CIRCUIT_MIN_WAIT, 30] * (open_calls // 2)  # noqa: S101
+    async with sessionmaker() as session:
+        assert len((await session.scalars(select(TETRIOLeagueSnapshot))).all()) == 1  # noqa: S101
+
+
+@pytest.mark.asyncio
+async def test_prerendered_rank_images_are_cache_hits(
+    sessionmaker: async_sessionmaker[AsyncSession], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    from time import monotonic
+
+    from jinja2 import DictLoader, Environment
+
+    import nonebot_plugin_tetris_stats.games.tetrio.rank as rank_module
+    import nonebot_plugin_tetris_stats.utils.render as render_module
+    from nonebot_plugin_tetris_stats.config.config import config
+    from nonebot_plugin_tetris_stats.games.tetrio.constant import RANK_PERCENTILE
+    from nonebot_plugin_tetris_stats.games.tetrio.rank.all import make_image_v1, make_image_v2
+    from nonebot_plugin_tetris_stats.games.tetrio.rank.data import get_latest_and_compare
+    from nonebot_plugin_tetris_stats.games.tetrio.rank.detail import make_image
+    from nonebot_plugin_tetris_stats.utils.cache import MemoryCache
+    from nonebot_plugin_tetris_stats.utils.render.cache import ImageCache
+
+    players = make_players()
+    pages = [make_page(players[start : start + 10], offset=start) for start in range(0, len(players), 10)]
+    calls = 0
+    screenshots: list[str] = []
+
+    async def fake_by(*_: Any) -> Any:
+        nonlocal calls
+        calls += 1
+        return pages[calls - 1]
+
+    async def fake_screenshot(url: str, **_: Any) -> bytes:
+        screenshots.append(url)
+        return url.encode()
+
+    @asynccontextmanager
+    async def fake_get_session() -> AsyncIterator[AsyncSession]:
+        async with sessionmaker() as session:
+            yield session
+
+    monkeypatch.setattr(rank_module, 'by', fake_by)
+    monkeypatch.setattr(rank_module, 'get_session', fake_get_session)
+    monkeypatch.setattr(rank_module, 'PAGE_SIZE', 10)
+    monkeypatch.setattr(render_module, 'screenshot', fake_screenshot)
+    monkeypatch.setattr(
+        render_module,
+        'env',
+        Environment(loader=DictLoader({'index.html': '{{ data }}'}), autoescape=True, enable_async=True),
+    )
+    monkeypatch.setattr(config.tetris.render_cache, 'enabled', True)
+    monkeypatch.setattr(config.tetris.dev, 'enabled', False)
+    monkeypatch.setattr(ImageCache, 'cache', MemoryCache(1024 * 1024))
+    monkeypatch.setattr(ImageCache, 'disk', None)
+
+    await rank_module.get_tetra_league_data()
+    assert len(screenshots) == 2 + len(RANK_PERCENTILE)  # noqa: S101
+    # 预渲染的图片保留到下一次抓取完成, 而不是默认的 render_cache.ttl
+    deadline = monotonic() + rank_module.PRERENDER_TTL - 60
+    assert all(i.expires_at > deadline for i in ImageCache.cache._entries.values())  # noqa: S101, SLF001
+
+    # 与 rank --all / rank --detail 相同的数据与参数, 全部命中渲染缓存
+    async with sessionmaker() as session:
+        latest, compare = await get_latest_and_compare(session)
+    images = [await make_image_v1(latest, compare), await make_image_v2(latest, compare)]
+    images.extend([await make_image(rank, latest, compare) for rank in RANK_PERCENTILE])
+    assert len(screenshots) == 2 + len(RANK_PERCENTILE)  # noqa: S101
+    assert images == [i.encode() for i in screenshots]  # noqa: S101
@@ -0,0 +1,105 @@
+# ruff: noqa: PLC0415, PLR2004, ANN401
+
+from datetime import datetime, timezone
+from math import isnan
+from typing import Any
+
+import pytest
+
+UTC = timezone.utc
+
+
+def make_page(count: int) -> Any:
+    from nonebot_plugin_tetris_stats.games.tetrio.api.schemas.base import ArCounts, Cache, P
+    from nonebot_plugin_tetris_stats.games.tetrio.api.schemas.leaderboards.by import (
+        BySuccessModel,
+        Data,
+        Entry,
+        InvalidEntry,
+        InvalidLeague,
+        League,
+    )
+
+    now = datetime.now(UTC)
+    base = {
+        'username': 'player',
+        'role': 'user',
+        'xp': 1.0,
+        'gamesplayed': 10,
+        'gameswon': 5,
+        'gametime': 1.0,
+        'ar': 0,
+        'ar_counts': ArCounts(),
+    }
+    league = {'gamesplayed': 10, 'gameswon': 5, 'gxe': 50.0, 'glicko': 1500.0, 'rd': 60.0, 'decaying': False}
+    entries: list[Entry | InvalidEntry] = [
+        Entry(
+            _id=f'{i:024x}',
+            p=P(pri=20000.0 - i, sec=0.0, ter=0.0),
+            league=League(tr=20000.0 - i, rank='x', bestrank='x', pps=2.5, apm=60.0 + i, vs=120.0, **league),
+            **base,
+        )
+        for i in range(count)
+    ]
+    entries.append(
+        InvalidEntry(
+            _id=f'{count:024x}',
+            p=P(pri=0.0, sec=0.0, ter=0.0),
+            league=InvalidLeague(tr=-1.0, rank='z', bestrank='z', pps=None, apm=None, vs=None, **league),
+            **base,
+        )
+    )
+    return BySuccessModel(
+        success=True,
+        cache=Cache(status='cached', cached_at=now, cached_until=now),
+        data=Data(entries=entries),
+    )
+
+
+def test_snapshot_round_trip_and_lookup() -> None:
+    from nonebot_plugin_tetris_stats.games.tetrio.snapshot import LeagueSnapshot, SnapshotBuilder
+
+    page = make_page(99)
+    builder = SnapshotBuilder()
+    # uid 与排行榜顺序相反, 快照内部按 uid 排序
+    builder.add_page(page, list(range(1000, 900, -1)))
+    snapshot = LeagueSnapshot(builder.to_bytes())
+
+    assert len(snapshot) == 100  # noqa: S101
+    assert list(snapshot.uid_ids) == sorted(range(1000, 900, -1))  # noqa: S101
+    row = snapshot.get(1000)
+    assert row is not None  # noqa: S101
+    assert (row.tr, row.glicko, row.rd, row.pps, row.apm, row.vs, row.rank) == (  # noqa: S101
+        20000.0,
+        1500.0,
+        60.0,
+        2.5,
+        60.0,
+        120.0,
+        'x',
+    )
+    invalid = snapshot.get(901)
+    assert invalid is not None  # noqa: S101
+    assert invalid.rank == 'z'  # noqa: S101
+    assert isnan(invalid.pps)  # noqa: S101
+    assert isnan(invalid.apm)  # noqa: S101
+    assert snapshot.get(42) is None  # noqa: S101
+
+
+def test_snapshot_is_much_smaller_than_json() -> None:
+    from nonebot_plugin_tetris_stats.games.tetrio.snapshot import SnapshotBuilder
+
+    page = make_page(99)
+    builder = SnapshotBuilder()
+    builder.add_page(page, list(range(100)))
+
+    assert len(builder.to_bytes()) * 10 < len(page.model_dump_json(by_alias=True))  # noqa: S101
+
+
+def test_snapshot_rejects_unknown_format() -> None:
+    from zlib import compress
+
+    from nonebot_plugin_tetris_stats.games.tetrio.snapshot import LeagueSnapshot
+
+    with pytest.raises(ValueError, match='不支持的快照格式'):
+        LeagueSnapshot(compress(b'JSON' + bytes(12)))